@@ -20,6 +20,7 @@ SERVICE_FILE="/etc/systemd/system/StatusOpenVPN.service"
 LOGS_SERVICE="/etc/systemd/system/logs.service"
 LOGS_TIMER="/etc/systemd/system/logs.timer"
 WG_STATS="/etc/systemd/system/wg_stats.service"
+SYSTEM_STATS="/etc/systemd/system/system_stats.service"
 BOT_SERVICE="/etc/systemd/system/telegram-bot.service"
 SETUP_FILE="$TARGET_DIR/setup"
 SSL_SCRIPT="$TARGET_DIR/scripts/ssl.sh"
@@ -217,29 +218,31 @@ EOF
 create_logs_units() {
     cat <<EOF | run_as_root tee $LOGS_SERVICE >/dev/null
 [Unit]
-Description=Run logs.py script
+Description=OpenVPN Traffic Statistics Collector
+After=network.target
 
 [Service]
-Type=oneshot
+Type=simple
+User=root
 Environment=PYTHONIOENCODING=utf-8
 Environment=LANG=C.UTF-8
-ExecStart=$TARGET_DIR/venv/bin/python $TARGET_DIR/src/logs.py
-EOF
-
-    cat <<EOF | run_as_root tee $LOGS_TIMER >/dev/null
-[Unit]
-Description=Run logs.py every 30 seconds
-
-[Timer]
-OnBootSec=30s
-OnUnitActiveSec=30s
-Unit=logs.service
+ExecStart=$TARGET_DIR/venv/bin/python $TARGET_DIR/src/logs.py --daemon
+Restart=always
+RestartSec=5
 
 [Install]
-WantedBy=timers.target
+WantedBy=multi-user.target
 EOF
 }
 
+remove_logs_timer() {
+    if [ -f "$LOGS_TIMER" ]; then
+        echo "Removing legacy logs.timer..."
+        run_as_root systemctl disable --now logs.timer 2>/dev/null || true
+        run_as_root rm -f "$LOGS_TIMER"
+    fi
+}
+
 create_wg_stats_service() {
     cat <<EOF | run_as_root tee $WG_STATS >/dev/null
 [Unit]
@@ -260,6 +263,27 @@ WantedBy=multi-user.target
 EOF
 }
 
+create_system_stats_service() {
+    cat <<EOF | run_as_root tee $SYSTEM_STATS >/dev/null
+[Unit]
+Description=StatusOpenVPN System Metrics Collector
+After=network.target
+
+[Service]
+Type=simple
+User=root
+WorkingDirectory=$TARGET_DIR
+Environment="PATH=$TARGET_DIR/venv/bin"
+Environment=PYTHONIOENCODING=utf-8
+ExecStart=$TARGET_DIR/venv/bin/python $TARGET_DIR/src/system_stats.py
+Restart=always
+RestartSec=5
+
+[Install]
+WantedBy=multi-user.target
+EOF
+}
+
 create_bot_service() {
     cat <<EOF | run_as_root tee $BOT_SERVICE >/dev/null
 [Unit]
@@ -546,6 +570,7 @@ install_flow() {
     create_main_service "$SECRET_KEY"
     create_logs_units
     create_wg_stats_service
+    create_system_stats_service
 
     setup_telegram_bot
 
@@ -566,8 +591,8 @@ install_flow() {
 
     restart_vnstat_if_needed
 
-    run_as_root systemctl enable StatusOpenVPN wg_stats logs.timer
-    run_as_root systemctl start StatusOpenVPN wg_stats logs.timer
+    run_as_root systemctl enable StatusOpenVPN wg_stats logs system_stats
+    run_as_root systemctl start StatusOpenVPN wg_stats logs system_stats
 
     if [[ "$BOT_ENABLED" -eq 1 ]]; then
         run_as_root systemctl enable telegram-bot
@@ -647,8 +672,12 @@ update_flow() {
         run_as_root systemctl restart StatusOpenVPN.service
     fi
 
-    [ ! -f "$LOGS_SERVICE" ] || [ ! -f "$LOGS_TIMER" ] && create_logs_units
+    if [ ! -f "$LOGS_SERVICE" ] || [ -f "$LOGS_TIMER" ] || ! grep -q -- '--daemon' "$LOGS_SERVICE"; then
+        remove_logs_timer
+        create_logs_units
+    fi
     [ ! -f "$WG_STATS" ] && create_wg_stats_service
+    [ ! -f "$SYSTEM_STATS" ] && create_system_stats_service
 
     setup_https
     refresh_nginx_location
@@ -665,10 +694,10 @@ update_flow() {
 
     if compgen -G "$SRC/*.db" > /dev/null; then
         echo "Migrating database files..."
-        run_as_root systemctl stop wg_stats logs.timer StatusOpenVPN 2>/dev/null || true
+        run_as_root systemctl stop wg_stats logs system_stats StatusOpenVPN 2>/dev/null || true
         mkdir -p "$DST"
         mv "$SRC"/*.db "$DST"/ 2>/dev/null || true
-        run_as_root systemctl start wg_stats logs.timer StatusOpenVPN 2>/dev/null || true
+        run_as_root systemctl start wg_stats logs system_stats StatusOpenVPN 2>/dev/null || true
     fi
 
     echo "Reloading systemd daemon..."
@@ -683,8 +712,10 @@ update_flow() {
     fi
     run_as_root systemctl enable wg_stats
     run_as_root systemctl restart wg_stats
-    run_as_root systemctl enable --now logs.timer
-    run_as_root systemctl restart logs.timer logs.service
+    run_as_root systemctl enable logs
+    run_as_root systemctl restart logs
+    run_as_root systemctl enable system_stats
+    run_as_root systemctl restart system_stats
 
     echo "--------------------------------------------"
     echo -e "${GREEN}✅ Update completed successfully${RESET}"
@@ -138,6 +138,10 @@ info_status "Stopping and disabling logs.service and logs.timer"
 run_as_root systemctl stop logs.service logs.timer
 run_as_root systemctl disable logs.service logs.timer
 
+info_status "Stopping and disabling system_stats.service"
+run_as_root systemctl stop system_stats.service
+run_as_root systemctl disable system_stats.service
+
 # === Удаление systemd unit файлов ===
 SYSTEMD_UNITS=(
     "StatusOpenVPN.service"
@@ -145,6 +149,7 @@ SYSTEMD_UNITS=(
     "logs.service"
     "logs.timer"
     "wg_stats.service"
+    "system_stats.service"
 )
 
 for unit in "${SYSTEMD_UNITS[@]}"; do
@@ -0,0 +1,1365 @@
+"""Нагрузочные замеры горячих путей сбора статистики.
+
+Запуск: python src/benchmarks.py [ingest|plans|rollups|concurrency|schema|status|wg|cpu|tiers|certs|systemd]
+"""
+
+import asyncio
+import base64
+import csv
+import errno
+import hashlib
+import json
+import multiprocessing
+import os
+import queue
+import shutil
+import socket
+import struct
+import subprocess
+import sys
+import sqlite3
+import tempfile
+import time
+import tracemalloc
+
+from datetime import datetime, timedelta, timezone
+
+from tzlocal import get_localzone
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+for _path in (BASE_DIR, os.path.dirname(BASE_DIR)):
+    if _path not in sys.path:
+        sys.path.insert(0, _path)
+
+import logs  # noqa: E402
+from src import (  # noqa: E402
+    runtime_state,
+    stats_tiers,
+    storage,
+    systemd_watch,
+    wg_collector,
+    wg_netlink,
+)
+from src.metric_history import MetricHistory  # noqa: E402
+from src.ovpn_status import parse_status  # noqa: E402
+from src.stats_buckets import day_bucket, month_bucket  # noqa: E402
+from src.migrations import (  # noqa: E402
+    AUDIT_MIGRATIONS,
+    OPENVPN_LOGS_MIGRATIONS,
+    SYSTEM_STATS_MIGRATIONS,
+    WG_STATS_MIGRATIONS,
+    migrate,
+)
+
+CLIENT_COUNTS = (100, 1000, 10000)
+
+
+def make_snapshot(count, tick):
+    """Синтетический снимок статуса OpenVPN: count клиентов, счётчики растут с каждым тиком."""
+    started = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    snapshot = []
+    for i in range(count):
+        connected = started + timedelta(seconds=i)
+        snapshot.append(
+            {
+                "client_name": f"client{i}",
+                "real_ip": f"198.51.{i // 256 % 256}.{i % 256}",
+                "local_ip": f"10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}",
+                "bytes_received": (tick + 1) * 1000 + i,
+                "bytes_sent": (tick + 1) * 2000 + i,
+                "connected_since": connected.isoformat(),
+                "connected_at": int(connected.timestamp()),
+                "protocol": "UDP",
+            }
+        )
+    return snapshot
+
+
+def legacy_save(conn, snapshot):
+    """Прежний построчный путь записи в схему v2: SELECT + UPSERT/UPDATE на каждого клиента."""
+    current_hour = datetime.today().strftime("%Y-%m-%d %H:00")
+    cursor = conn.cursor()
+    aggregated = {}
+    for log in snapshot:
+        key = (log["client_name"], log["local_ip"])
+        cursor.execute(
+            """
+            SELECT connected_since, bytes_received, bytes_sent FROM last_client_stats
+            WHERE client_name = ? AND ip_address = ?
+            """,
+            key,
+        )
+        last_state = cursor.fetchone()
+        received, sent = log["bytes_received"], log["bytes_sent"]
+        if last_state and last_state[0] == log["connected_since"]:
+            received = max(0, received - last_state[1])
+            sent = max(0, sent - last_state[2])
+        data = aggregated.setdefault(key, [0, 0, 0, ""])
+        data[0] += received
+        data[1] += sent
+        data[2] += 1
+        data[3] = max(data[3], log["connected_since"])
+        cursor.execute(
+            """
+            INSERT INTO last_client_stats (client_name, ip_address, connected_since, bytes_received, bytes_sent)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(client_name, ip_address) DO UPDATE SET
+            connected_since = excluded.connected_since,
+            bytes_received = excluded.bytes_received,
+            bytes_sent = excluded.bytes_sent
+            """,
+            (*key, log["connected_since"], log["bytes_received"], log["bytes_sent"]),
+        )
+
+    for (client_name, ip_address), (received, sent, connections, last) in aggregated.items():
+        cursor.execute(
+            """
+            SELECT last_connected FROM daily_stats
+            WHERE client_name = ? AND ip_address = ? AND hour = ?
+            """,
+            (client_name, ip_address, current_hour),
+        )
+        existing = cursor.fetchone()
+        if existing:
+            cursor.execute(
+                """
+                UPDATE daily_stats
+                SET total_bytes_received = total_bytes_received + ?,
+                    total_bytes_sent = total_bytes_sent + ?,
+                    total_connections = total_connections + ?,
+                    last_connected = ?
+                WHERE client_name = ? AND ip_address = ? AND hour = ?
+                """,
+                (received, sent, connections, max(existing[0] or "", last),
+                 client_name, ip_address, current_hour),
+            )
+        else:
+            cursor.execute(
+                """
+                INSERT INTO daily_stats (client_name, ip_address, hour, total_bytes_received,
+                    total_bytes_sent, total_connections, last_connected)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (client_name, ip_address, current_hour, received, sent, connections, last),
+            )
+
+    for log in snapshot:
+        cursor.execute(
+            """
+            SELECT id, bytes_received, bytes_sent FROM connection_logs
+            WHERE client_name = ? AND connected_since = ? LIMIT 1
+            """,
+            (log["client_name"], log["connected_since"]),
+        )
+        existing = cursor.fetchone()
+        if existing is None:
+            cursor.execute(
+                """
+                INSERT INTO connection_logs (client_name, local_ip, real_ip, connected_since,
+                    bytes_received, bytes_sent, protocol)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (log["client_name"], log["local_ip"], log["real_ip"], log["connected_since"],
+                 log["bytes_received"], log["bytes_sent"], log["protocol"]),
+            )
+        elif log["bytes_received"] > existing[1] or log["bytes_sent"] > existing[2]:
+            cursor.execute(
+                "UPDATE connection_logs SET bytes_received = ?, bytes_sent = ? WHERE id = ?",
+                (log["bytes_received"], log["bytes_sent"], existing[0]),
+            )
+
+
+def batched_save(conn, snapshot):
+    """Текущий путь записи из logs.py: staging-таблица и по одному UPSERT на таблицу."""
+    logs.stage_snapshot(conn, snapshot)
+    logs.save_daily_stats(conn)
+    logs.save_connection_logs(conn)
+
+
+def measure(save, conn, snapshot):
+    """Возвращает (число выполненных SQL-операторов, время в мс) для одного тика."""
+    statements = 0
+
+    def trace(_sql):
+        nonlocal statements
+        statements += 1
+
+    conn.set_trace_callback(trace)
+    started = time.perf_counter()
+    with conn:
+        save(conn, snapshot)
+    elapsed = (time.perf_counter() - started) * 1000
+    conn.set_trace_callback(None)
+    return statements, elapsed
+
+
+def bench_ingest():
+    print("Запись снимка OpenVPN (второй тик, клиенты уже известны)")
+    print(f"{'клиентов':>10} {'путь':>10} {'операторов':>12} {'мс':>10}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for count in CLIENT_COUNTS:
+            for name, save in (("построчно", legacy_save), ("пакетно", batched_save)):
+                logs.DB_PATH = os.path.join(tmp_dir, f"{name}_{count}.db")
+                logs.reset_connection()
+                if save is legacy_save:
+                    conn = storage.connect(logs.DB_PATH)
+                    migrate(conn, OPENVPN_LOGS_MIGRATIONS[:2])
+                else:
+                    conn = logs.get_connection()
+                measure(save, conn, make_snapshot(count, 0))
+                statements, elapsed = measure(save, conn, make_snapshot(count, 1))
+                print(f"{count:>10} {name:>10} {statements:>12} {elapsed:>10.1f}")
+                if save is legacy_save:
+                    conn.close()
+                logs.reset_connection()
+
+
+ROLLUP_DAYS = 120
+# Запуски maintain_stats: первый после обновления (в rollup_state ещё нет
+# retention_days), после смены срока и обычный инкрементальный
+ROLLUP_RETENTIONS = (365, 60, 60)
+
+
+def check_rollup_retention():
+    """Очистка ovpn_daily и пересчёт ovpn_monthly не меняют суммы сохранённых месяцев.
+
+    База как до обновления: схема версии 3, верные суммы в ovpn_monthly за
+    ROLLUP_DAYS дней и ovpn_daily, очищенная прежним посуточным способом.
+    Возвращает число расхождений.
+    """
+    print(f"Суммы ovpn_monthly после очистки ovpn_daily ({ROLLUP_DAYS} дней данных)")
+    failures = 0
+    now = time.time()
+    days = sorted({day_bucket(now - i * 86400) for i in range(ROLLUP_DAYS)})
+    expected = {}
+    for day in days:
+        expected[month_bucket(day)] = expected.get(month_bucket(day), 0) + 1000
+    legacy_cutoff = day_bucket(now - logs.get_retention_windows(365)[1] * 86400)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        logs.DB_PATH = os.path.join(tmp_dir, "rollups.db")
+        logs.SETTINGS_PATH = os.path.join(tmp_dir, "settings.json")
+        conn = storage.connect(logs.DB_PATH)
+        migrate(conn, OPENVPN_LOGS_MIGRATIONS[:3])
+        with conn:
+            conn.execute("INSERT INTO ovpn_clients (id, client_name, ip_address) VALUES (1, 'client', '')")
+            for table, rows in (
+                ("ovpn_daily", [(day, 1000) for day in days if day >= legacy_cutoff]),
+                ("ovpn_monthly", expected.items()),
+            ):
+                conn.executemany(
+                    f"INSERT INTO {table} (bucket, client_id, bytes_received, bytes_sent, connections) "
+                    "VALUES (?, 1, ?, 0, 0)",
+                    rows,
+                )
+        conn.close()
+
+        logs.reset_connection()
+        conn = logs.get_connection()
+        for retention_days in ROLLUP_RETENTIONS:
+            with open(logs.SETTINGS_PATH, "w", encoding="utf-8") as f:
+                json.dump({"stats_retention_days": retention_days}, f)
+            logs.maintain_stats(conn)
+            _, daily_cutoff, monthly_cutoff = logs.get_retention_cutoffs(retention_days, now)
+            stored = dict(conn.execute("SELECT bucket, bytes_received FROM ovpn_monthly").fetchall())
+            kept = {month: total for month, total in expected.items() if month >= monthly_cutoff}
+            status = "ok" if stored == kept else "FAIL"
+            failures += stored != kept
+            wrong = ", ".join(
+                f"{datetime.fromtimestamp(month):%Y-%m} {stored.get(month)} из {total}"
+                for month, total in kept.items()
+                if stored.get(month) != total
+            )
+            print(
+                f"  [{status}] срок {retention_days} дн., ovpn_daily с "
+                f"{datetime.fromtimestamp(daily_cutoff):%Y-%m-%d}, месяцев {len(kept)}"
+                + (f": {wrong}" if wrong else "")
+            )
+        logs.reset_connection()
+    return failures
+
+
+# Горячие запросы веб-интерфейса, бота и сборщиков: ни один не должен сканировать таблицу целиком
+HOT_QUERIES = [
+    (
+        OPENVPN_LOGS_MIGRATIONS,
+        "SELECT c.client_name, SUM(s.rx) FROM ("
+        " SELECT client_id, SUM(bytes_received) AS rx FROM ovpn_hourly"
+        " WHERE bucket >= ? AND bucket < ? GROUP BY client_id) AS s"
+        " JOIN ovpn_clients AS c ON c.id = s.client_id GROUP BY c.client_name",
+    ),
+    (
+        OPENVPN_LOGS_MIGRATIONS,
+        "SELECT bucket FROM ovpn_hourly"
+        " WHERE client_id IN (SELECT id FROM ovpn_clients WHERE client_name = ?)"
+        " AND bucket >= ? AND bucket < ?",
+    ),
+    (OPENVPN_LOGS_MIGRATIONS, "SELECT client_id FROM ovpn_daily WHERE bucket >= ? AND bucket < ?"),
+    (OPENVPN_LOGS_MIGRATIONS, "SELECT client_id FROM ovpn_monthly WHERE bucket >= ?"),
+    (OPENVPN_LOGS_MIGRATIONS, "SELECT * FROM connection_logs ORDER BY connected_since DESC LIMIT 20"),
+    (
+        OPENVPN_LOGS_MIGRATIONS,
+        "SELECT id FROM connection_logs WHERE client_name = ? AND connected_since = ?",
+    ),
+    (OPENVPN_LOGS_MIGRATIONS, "DELETE FROM ovpn_hourly WHERE bucket < ?"),
+    (
+        WG_STATS_MIGRATIONS,
+        "SELECT MAX(bucket) FROM wg_hourly"
+        " WHERE peer_id IN (SELECT id FROM wg_peers WHERE client = ?)"
+        " AND bucket >= ? AND bucket < ?",
+    ),
+    (
+        WG_STATS_MIGRATIONS,
+        "SELECT SUM(received) FROM wg_hourly"
+        " WHERE peer_id = ? AND bucket >= ? AND bucket < ? AND bucket != ?",
+    ),
+    (
+        WG_STATS_MIGRATIONS,
+        "SELECT p.client FROM wg_hourly AS s JOIN wg_peers AS p ON p.id = s.peer_id"
+        " WHERE s.bucket >= ? AND s.bucket < ?",
+    ),
+    (
+        WG_STATS_MIGRATIONS,
+        "SELECT bucket FROM wg_daily"
+        " WHERE peer_id IN (SELECT id FROM wg_peers WHERE client = ?) AND bucket >= ?",
+    ),
+    (WG_STATS_MIGRATIONS, "SELECT id FROM wg_peers WHERE public_key = ? AND interface = ?"),
+    (SYSTEM_STATS_MIGRATIONS, "SELECT cpu_percent FROM system_stats WHERE timestamp >= ? ORDER BY timestamp"),
+    (SYSTEM_STATS_MIGRATIONS, "DELETE FROM system_stats WHERE timestamp < ?"),
+    (AUDIT_MIGRATIONS, "SELECT * FROM admin_log WHERE action = ? ORDER BY id DESC LIMIT 50"),
+    (AUDIT_MIGRATIONS, "SELECT COUNT(*) FROM admin_log WHERE action = ?"),
+]
+
+
+def check_query_plans():
+    """Проверяет EXPLAIN QUERY PLAN горячих запросов. Возвращает число нарушений."""
+    failures = 0
+    connections = {}
+    for migrations, query in HOT_QUERIES:
+        conn = connections.get(id(migrations))
+        if conn is None:
+            conn = sqlite3.connect(":memory:")
+            migrate(conn, migrations)
+            connections[id(migrations)] = conn
+        params = (None,) * query.count("?")
+        plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {query}", params)]
+        # Обход материализованного подзапроса — это уже отобранные по индексу строки
+        derived = {step.split()[-1] for step in plan if step.startswith(("MATERIALIZE", "CO-ROUTINE"))}
+        full_scans = [
+            step
+            for step in plan
+            if step.startswith("SCAN") and "INDEX" not in step and step.split()[1] not in derived
+        ]
+        status = "ok" if not full_scans else "SCAN"
+        failures += bool(full_scans)
+        print(f"[{status}] {query}\n       {'; '.join(plan)}")
+    for conn in connections.values():
+        conn.close()
+    return failures
+
+
+CONCURRENCY_SECONDS = 5
+CONCURRENCY_READERS = 4
+
+
+def _open(db_path, mode, readonly=False):
+    if mode == "storage":
+        return storage.connect(db_path, readonly=readonly)
+    # Прежнее поведение: журнал отката и стандартный таймаут sqlite3
+    return sqlite3.connect(db_path)
+
+
+def _concurrency_writer(db_path, mode, deadline, results):
+    conn = _open(db_path, mode)
+    transactions, errors = 0, 0
+    tick = 0
+    while time.time() < deadline:
+        tick += 1
+        try:
+            with conn:
+                logs.stage_snapshot(conn, make_snapshot(1000, tick))
+                logs.save_daily_stats(conn)
+                logs.save_connection_logs(conn)
+            transactions += 1
+        except sqlite3.OperationalError as e:
+            errors += "locked" in str(e)
+    conn.close()
+    results.put(("writer", transactions, errors, 0.0))
+
+
+def _concurrency_reader(db_path, mode, deadline, results):
+    conn = _open(db_path, mode, readonly=True)
+    queries, errors, worst = 0, 0, 0.0
+    while time.time() < deadline:
+        started = time.perf_counter()
+        try:
+            conn.execute(
+                "SELECT c.client_name, SUM(s.bytes_received) FROM ovpn_hourly AS s"
+                " JOIN ovpn_clients AS c ON c.id = s.client_id"
+                " WHERE s.bucket >= ? GROUP BY c.client_name",
+                (0,),
+            ).fetchall()
+            conn.execute("SELECT * FROM connection_logs ORDER BY connected_since DESC LIMIT 20").fetchall()
+            queries += 1
+        except sqlite3.OperationalError as e:
+            errors += "locked" in str(e)
+        worst = max(worst, time.perf_counter() - started)
+    conn.close()
+    results.put(("reader", queries, errors, worst))
+
+
+def bench_concurrency():
+    """Один процесс-писатель (тик logs.py на 1000 клиентов) и несколько читателей веб-интерфейса."""
+    print(f"Конкурентный доступ: 1 писатель, {CONCURRENCY_READERS} читателя, {CONCURRENCY_SECONDS} с")
+    print(f"{'режим':>9} {'транзакций':>11} {'запросов':>9} {'locked':>7} {'макс. чтение, мс':>17}")
+    total_errors = 0
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for mode in ("legacy", "storage"):
+            db_path = os.path.join(tmp_dir, f"{mode}.db")
+            logs.DB_PATH = db_path
+            logs.reset_connection()
+            logs.get_connection()
+            logs.reset_connection()
+            if mode == "legacy":
+                conn = sqlite3.connect(db_path)
+                conn.execute("PRAGMA journal_mode = DELETE")
+                conn.close()
+
+            results = multiprocessing.Queue()
+            deadline = time.time() + CONCURRENCY_SECONDS
+            processes = [
+                multiprocessing.Process(target=_concurrency_writer, args=(db_path, mode, deadline, results))
+            ] + [
+                multiprocessing.Process(target=_concurrency_reader, args=(db_path, mode, deadline, results))
+                for _ in range(CONCURRENCY_READERS)
+            ]
+            for process in processes:
+                process.start()
+            collected = []
+            try:
+                for _ in processes:
+                    collected.append(results.get(timeout=CONCURRENCY_SECONDS + 30))
+            except queue.Empty:
+                print(f"  {mode}: процесс не вернул результат за {CONCURRENCY_SECONDS + 30} с")
+            for process in processes:
+                process.join(timeout=5)
+                if process.is_alive():
+                    process.terminate()
+                    process.join()
+            failed = [process.exitcode for process in processes if process.exitcode != 0]
+            if failed or len(collected) != len(processes):
+                print(f"  {mode}: процессы завершились с кодами {failed}")
+                total_errors += 1
+                continue
+
+            transactions = sum(r[1] for r in collected if r[0] == "writer")
+            queries = sum(r[1] for r in collected if r[0] == "reader")
+            errors = sum(r[2] for r in collected)
+            worst = max(r[3] for r in collected) * 1000
+            print(f"{mode:>9} {transactions:>11} {queries:>9} {errors:>7} {worst:>17.1f}")
+            if mode == "storage":
+                total_errors += errors
+    return total_errors
+
+
+SCHEMA_CLIENTS = 500
+SCHEMA_DAYS = 30
+
+
+def _timed_query(conn, query, params, repeat=20):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        conn.execute(query, params).fetchall()
+    return (time.perf_counter() - started) * 1000 / repeat
+
+
+def bench_schema():
+    """Размер файла и скорость выборок периода: текстовая схема v2 против корзин epoch."""
+    hours = SCHEMA_DAYS * 24
+    print(f"Схема статистики: {SCHEMA_CLIENTS} клиентов x {hours} часов")
+    now = datetime.now().replace(minute=0, second=0, microsecond=0)
+    day_from = (now - timedelta(days=1)).strftime("%Y-%m-%d %H:00")
+    day_to = now.strftime("%Y-%m-%d %H:00")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        legacy_path = os.path.join(tmp_dir, "legacy.db")
+        conn = storage.connect(legacy_path)
+        migrate(conn, OPENVPN_LOGS_MIGRATIONS[:2])
+        with conn:
+            conn.executemany(
+                """
+                INSERT INTO daily_stats (client_name, ip_address, hour, total_bytes_received,
+                    total_bytes_sent, total_connections, last_connected)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    (
+                        f"client{i}",
+                        f"10.8.{i // 256}.{i % 256}",
+                        (now - timedelta(hours=h)).strftime("%Y-%m-%d %H:00"),
+                        h * 1000 + i,
+                        h * 2000 + i,
+                        120,
+                        (now - timedelta(hours=h)).astimezone(timezone.utc).isoformat(),
+                    )
+                    for h in range(hours)
+                    for i in range(SCHEMA_CLIENTS)
+                ),
+            )
+        conn.execute("VACUUM")
+        legacy_size = os.path.getsize(legacy_path)
+        legacy_day = _timed_query(
+            conn,
+            "SELECT client_name, SUM(total_bytes_received), SUM(total_bytes_sent)"
+            " FROM daily_stats WHERE hour >= ? AND hour < ? GROUP BY client_name",
+            (day_from, day_to),
+        )
+        legacy_chart = _timed_query(
+            conn,
+            "SELECT hour, SUM(total_bytes_received) FROM daily_stats"
+            " WHERE client_name = ? AND hour >= ? AND hour < ? GROUP BY hour",
+            ("client7", day_from, day_to),
+        )
+        conn.close()
+
+        # Тот же файл после миграции v3
+        compact_path = os.path.join(tmp_dir, "compact.db")
+        shutil.copyfile(legacy_path, compact_path)
+        conn = storage.connect(compact_path)
+        started = time.perf_counter()
+        migrate(conn, OPENVPN_LOGS_MIGRATIONS)
+        migrated = (time.perf_counter() - started) * 1000
+        conn.execute("VACUUM")
+        compact_size = os.path.getsize(compact_path)
+        bucket_from = int((now - timedelta(days=1)).timestamp())
+        bucket_to = int(now.timestamp())
+        compact_day = _timed_query(
+            conn,
+            "SELECT c.client_name, SUM(s.rx), SUM(s.tx) FROM ("
+            " SELECT client_id, SUM(bytes_received) AS rx, SUM(bytes_sent) AS tx FROM ovpn_hourly"
+            " WHERE bucket >= ? AND bucket < ? GROUP BY client_id) AS s"
+            " JOIN ovpn_clients AS c ON c.id = s.client_id GROUP BY c.client_name",
+            (bucket_from, bucket_to),
+        )
+        compact_chart = _timed_query(
+            conn,
+            "SELECT bucket, SUM(bytes_received) FROM ovpn_hourly"
+            " WHERE client_id IN (SELECT id FROM ovpn_clients WHERE client_name = ?)"
+            " AND bucket >= ? AND bucket < ? GROUP BY bucket",
+            ("client7", bucket_from, bucket_to),
+        )
+        rows = conn.execute("SELECT COUNT(*) FROM ovpn_hourly").fetchone()[0]
+        conn.close()
+
+    print(f"{'схема':>9} {'размер, КиБ':>12} {'сутки, мс':>10} {'график, мс':>11}")
+    print(f"{'v2':>9} {legacy_size // 1024:>12} {legacy_day:>10.2f} {legacy_chart:>11.2f}")
+    print(f"{'v3':>9} {compact_size // 1024:>12} {compact_day:>10.2f} {compact_chart:>11.2f}")
+    print(f"Миграция {rows} строк: {migrated:.0f} мс")
+    # Потеря строк при переносе — ошибка
+    return int(rows != hours * SCHEMA_CLIENTS)
+
+
+STATUS_HEADER = (
+    "HEADER,CLIENT_LIST,Common Name,Real Address,Virtual Address,Virtual IPv6 Address,"
+    "Bytes Received,Bytes Sent,Connected Since,Connected Since (time_t),Username,"
+    "Client ID,Peer ID,Data Channel Cipher"
+)
+
+
+def make_status_content(count):
+    """Файл статуса status-version 2 на count клиентов; сессии начинаются в пределах часа."""
+    started = int(datetime(2026, 1, 1).timestamp())
+    lines = [
+        "TITLE,OpenVPN 2.6.12 x86_64-pc-linux-gnu",
+        f"TIME,{datetime.now():%Y-%m-%d %H:%M:%S},{int(time.time())}",
+        STATUS_HEADER,
+    ]
+    for i in range(count):
+        connected = started + i % 3600
+        lines.append(
+            f"CLIENT_LIST,client{i},udp4:198.51.{i // 256 % 256}.{i % 256}:{1024 + i % 60000},"
+            f"10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256},,{i * 1000},{i * 2000},"
+            f"{datetime.fromtimestamp(connected):%Y-%m-%d %H:%M:%S},{connected},UNDEF,{i},{i},AES-256-GCM"
+        )
+    lines += ["GLOBAL_STATS,Max bcast/mcast queue length,0", "END"]
+    return "\n".join(lines).encode()
+
+
+def legacy_parse_status(content):
+    """Прежний разбор: csv.reader, strptime и get_localzone() на каждого клиента."""
+    records = []
+    reader = csv.reader(content.decode("utf-8").splitlines())
+    next(reader)
+    for row in reader:
+        if row and row[0] == "CLIENT_LIST":
+            start_date = datetime.strptime(row[7], "%Y-%m-%d %H:%M:%S")
+            connected_since = (
+                start_date.replace(tzinfo=get_localzone()).astimezone(timezone.utc).isoformat()
+            )
+            records.append((row[1], row[2], row[3], int(row[5]), int(row[6]), connected_since))
+    return records
+
+
+def bench_status():
+    """Разбор файла статуса: прежний построчный csv против общего ovpn_status.parse_status."""
+    print("Разбор файла статуса OpenVPN (второй проход, кэш времени подключения прогрет)")
+    print(f"{'клиентов':>10} {'прежний, мс':>12} {'общий, мс':>10}")
+    failures = 0
+    for count in CLIENT_COUNTS:
+        content = make_status_content(count)
+        timings = []
+        for parse in (legacy_parse_status, parse_status):
+            parse(content)
+            started = time.perf_counter()
+            result = parse(content)
+            timings.append((time.perf_counter() - started) * 1000)
+            # Оба разбора должны увидеть всех клиентов
+            failures += len(result) != count
+        print(f"{count:>10} {timings[0]:>12.1f} {timings[1]:>10.1f}")
+    return failures
+
+
+WG_PEER_COUNTS = (100, 1000)
+WG_CALLS = 50
+FAKE_WG_FAMILY = 0x1B
+FAKE_PEERS_PER_MESSAGE = 40  # Пиров в одном сообщении dump, как при заполненном skb
+
+
+def make_wg_devices(count):
+    """Два устройства по count пиров: ключи, endpoint, allowed ips, handshake, счётчики."""
+    now = int(time.time())
+    devices = []
+    for interface in ("antizapret", "vpn"):
+        peers = []
+        for i in range(count):
+            key = hashlib.sha256(f"{interface}{i}".encode()).digest()
+            endpoint = (
+                (socket.AF_INET, f"198.51.{i // 256 % 256}.{i % 256}", 1024 + i)
+                if i % 3
+                else None
+            )
+            allowed = [(socket.AF_INET, f"10.29.{i // 256 % 256}.{i % 256}", 32)]
+            if i % 2:
+                allowed.append((socket.AF_INET6, f"fd00::{i:x}", 128))
+            handshake = now - i % 600 if i % 5 else 0
+            peers.append((key, endpoint, allowed, handshake, i * 1048577, i * 524289))
+        devices.append((interface, hashlib.sha256(interface.encode()).digest(), 51820, peers))
+    return devices
+
+
+def wg_devices_dump(devices):
+    """Те же устройства в формате `wg show all dump`."""
+    lines = []
+    for interface, public_key, port, peers in devices:
+        lines.append(f"{interface}\t(hidden)\t{base64.b64encode(public_key).decode()}\t{port}\toff")
+        for key, endpoint, allowed, handshake, rx, tx in peers:
+            lines.append(
+                "\t".join(
+                    (
+                        interface,
+                        base64.b64encode(key).decode(),
+                        "(none)",
+                        f"{endpoint[1]}:{endpoint[2]}" if endpoint else "(none)",
+                        ",".join(f"{ip}/{cidr}" for _, ip, cidr in allowed) or "(none)",
+                        str(handshake),
+                        str(rx),
+                        str(tx),
+                        "off",
+                    )
+                )
+            )
+    return "\n".join(lines) + "\n"
+
+
+class FakeWireguardNetlink:
+    """Ответчик generic netlink вместо ядра: семейство wireguard и WG_CMD_GET_DEVICE.
+
+    Пиры устройства делятся на сообщения по FAKE_PEERS_PER_MESSAGE; allowed ips
+    последнего пира сообщения переносятся в следующее, как делает ядро.
+    Ответы кодируются заранее, чтобы замер включал только разбор.
+    """
+
+    def __init__(self, devices):
+        self.responses = {}
+        self.queue = []
+        for interface, public_key, port, peers in devices:
+            self.responses[interface] = self._encode_device(interface, public_key, port, peers)
+
+    @staticmethod
+    def _message(msg_type, flags, seq, payload):
+        return wg_netlink.NLMSG_HEADER.pack(
+            wg_netlink.NLMSG_HEADER.size + len(payload), msg_type, flags, seq, 0
+        ) + payload
+
+    @staticmethod
+    def _encode_peer(key, endpoint, allowed, handshake=None, rx=None, tx=None):
+        attr = wg_netlink.encode_attr
+        payload = attr(wg_netlink.WGPEER_A_PUBLIC_KEY, key)
+        if endpoint:
+            family, host, port = endpoint
+            payload += attr(
+                wg_netlink.WGPEER_A_ENDPOINT,
+                struct.pack("=H", family) + struct.pack("!H", port)
+                + socket.inet_pton(family, host) + b"\0" * 8,
+            )
+        if handshake is not None:
+            payload += attr(wg_netlink.WGPEER_A_LAST_HANDSHAKE_TIME, struct.pack("=qq", handshake, 0))
+            payload += attr(wg_netlink.WGPEER_A_RX_BYTES, struct.pack("=Q", rx))
+            payload += attr(wg_netlink.WGPEER_A_TX_BYTES, struct.pack("=Q", tx))
+        allowed_payload = b"".join(
+            attr(
+                0x8000,
+                attr(wg_netlink.WGALLOWEDIP_A_FAMILY, struct.pack("=H", family))
+                + attr(wg_netlink.WGALLOWEDIP_A_IPADDR, socket.inet_pton(family, ip))
+                + attr(wg_netlink.WGALLOWEDIP_A_CIDR_MASK, bytes([cidr])),
+            )
+            for family, ip, cidr in allowed
+        )
+        payload += attr(wg_netlink.WGPEER_A_ALLOWEDIPS | 0x8000, allowed_payload)
+        return attr(0x8000, payload)
+
+    def _encode_device(self, interface, public_key, port, peers):
+        attr = wg_netlink.encode_attr
+        header = (
+            attr(wg_netlink.WGDEVICE_A_IFNAME, interface.encode() + b"\0")
+            + attr(wg_netlink.WGDEVICE_A_PUBLIC_KEY, public_key)
+            + attr(wg_netlink.WGDEVICE_A_LISTEN_PORT, struct.pack("=H", port))
+        )
+        bodies = []
+        carry = b""
+        for start in range(0, len(peers), FAKE_PEERS_PER_MESSAGE):
+            chunk = peers[start:start + FAKE_PEERS_PER_MESSAGE]
+            encoded = [carry]
+            carry = b""
+            for index, (key, endpoint, allowed, handshake, rx, tx) in enumerate(chunk):
+                if index == len(chunk) - 1 and len(allowed) > 1:
+                    encoded.append(self._encode_peer(key, endpoint, allowed[:1], handshake, rx, tx))
+                    carry = self._encode_peer(key, None, allowed[1:])
+                else:
+                    encoded.append(self._encode_peer(key, endpoint, allowed, handshake, rx, tx))
+            bodies.append(header + attr(wg_netlink.WGDEVICE_A_PEERS | 0x8000, b"".join(encoded)))
+        if carry or not bodies:
+            bodies.append(header + attr(wg_netlink.WGDEVICE_A_PEERS | 0x8000, carry))
+        return [wg_netlink.GENL_HEADER.pack(0, 1, 0) + body for body in bodies]
+
+    def send(self, data):
+        _, msg_type, _, seq, _ = wg_netlink.NLMSG_HEADER.unpack_from(data)
+        attrs = dict(wg_netlink.split_attrs(data[wg_netlink.NLMSG_HEADER.size + 4:]))
+        if msg_type == wg_netlink.GENL_ID_CTRL:
+            family = wg_netlink.GENL_HEADER.pack(1, 2, 0) + wg_netlink.encode_attr(
+                wg_netlink.CTRL_ATTR_FAMILY_ID, struct.pack("=H", FAKE_WG_FAMILY)
+            )
+            self.queue.append(self._message(wg_netlink.GENL_ID_CTRL, 0, seq, family))
+            self.queue.append(self._message(wg_netlink.NLMSG_ERROR, 0, seq, struct.pack("=i", 0)))
+            return len(data)
+        name = attrs.get(wg_netlink.WGDEVICE_A_IFNAME, b"").rstrip(b"\0").decode()
+        if name not in self.responses:
+            self.queue.append(
+                self._message(wg_netlink.NLMSG_ERROR, 0, seq, struct.pack("=i", -errno.ENODEV))
+            )
+            return len(data)
+        for body in self.responses[name]:
+            self.queue.append(self._message(FAKE_WG_FAMILY, wg_netlink.NLM_F_MULTI, seq, body))
+        self.queue.append(self._message(wg_netlink.NLMSG_DONE, wg_netlink.NLM_F_MULTI, seq, b"\0" * 4))
+        return len(data)
+
+    def recv(self, bufsize):
+        return self.queue.pop(0)
+
+    def close(self):
+        self.queue.clear()
+
+
+def _cpu_seconds():
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+def _time_calls(func, calls):
+    started, cpu_started = time.perf_counter(), _cpu_seconds()
+    for _ in range(calls):
+        result = func()
+    wall = (time.perf_counter() - started) * 1000 / calls
+    cpu = (_cpu_seconds() - cpu_started) * 1000 / calls
+    return result, wall, cpu
+
+
+def check_wg_changes(devices):
+    """Следующий опрос после make_wg_devices: счётчики, рукопожатия, endpoint и allowed ips.
+
+    Раскладка пира в wg_netlink запоминается между опросами, поэтому снимок
+    после изменений сверяется с разбором dump того же состояния.
+    """
+    changed = []
+    for interface, public_key, port, peers in devices:
+        moved = []
+        for i, (key, endpoint, allowed, handshake, rx, tx) in enumerate(peers):
+            if endpoint and i % 7 == 1:
+                endpoint = (endpoint[0], endpoint[1], endpoint[2] + 1)
+            elif endpoint and i % 7 == 2:
+                endpoint = (endpoint[0], f"203.0.113.{i % 256}", endpoint[2])
+            elif i % 7 == 4:
+                endpoint = None
+            if i % 11 == 3:
+                allowed = allowed[:1]
+            moved.append((key, endpoint, allowed, handshake + 1 if handshake else 0, rx + 1500, tx + 40))
+        changed.append((interface, public_key, port, moved))
+    fake = FakeWireguardNetlink(changed)
+    interfaces, peers = wg_netlink.get_devices([device[0] for device in changed], connect=lambda: fake)
+    netlink = (
+        [wg_collector.Interface._make(item) for item in interfaces],
+        [wg_collector.Peer._make(item) for item in peers],
+    )
+    return netlink == wg_collector.parse_dump(wg_devices_dump(changed))
+
+
+def bench_wg():
+    """Чтение WireGuard: fork `wg show all dump` против разбора ответа generic netlink.
+
+    Вместо `wg` запускается скрипт, печатающий готовый dump (стоимость fork/exec),
+    вместо ядра — FakeWireguardNetlink (стоимость разбора ответа). Оба пути
+    должны вернуть одинаковый снимок, в том числе после изменения пиров.
+    """
+    print(f"Снимок WireGuard, среднее на вызов из {WG_CALLS}")
+    print(f"{'пиров':>7} {'wg, мс':>8} {'wg CPU, мс':>11} {'netlink, мс':>12} {'netlink CPU, мс':>16}")
+    failures = 0
+    saved = (wg_collector.WG_BINARY, wg_collector.NETLINK_ENABLED)
+    wg_collector.NETLINK_ENABLED = False
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for count in WG_PEER_COUNTS:
+                devices = make_wg_devices(count)
+                dump_path = os.path.join(tmp_dir, f"dump{count}")
+                with open(dump_path, "w", encoding="utf-8") as f:
+                    f.write(wg_devices_dump(devices))
+                wg_collector.WG_BINARY = os.path.join(tmp_dir, f"wg{count}")
+                with open(wg_collector.WG_BINARY, "w", encoding="utf-8") as f:
+                    f.write(f"#!/bin/sh\nexec cat {dump_path}\n")
+                os.chmod(wg_collector.WG_BINARY, 0o755)
+
+                fake = FakeWireguardNetlink(devices)
+                names = [device[0] for device in devices]
+                wg_netlink._family_id = None
+                dumped, wg_wall, wg_cpu = _time_calls(wg_collector.collect, WG_CALLS)
+                (interfaces, peers), nl_wall, nl_cpu = _time_calls(
+                    lambda: wg_netlink.get_devices(names, connect=lambda: fake), WG_CALLS
+                )
+                netlink = (
+                    [wg_collector.Interface._make(item) for item in interfaces],
+                    [wg_collector.Peer._make(item) for item in peers],
+                )
+                # Ключ интерфейса и порты совпадают, приватный ключ не читается ни одним путём
+                if netlink != dumped or len(peers) != count * len(devices):
+                    print(f"  расхождение снимков для {count} пиров")
+                    failures += 1
+                print(f"{count * len(devices):>7} {wg_wall:>8.2f} {wg_cpu:>11.2f} {nl_wall:>12.2f} {nl_cpu:>16.2f}")
+                if not check_wg_changes(devices):
+                    print(f"  netlink не увидел изменения пиров для {count} пиров")
+                    failures += 1
+    finally:
+        wg_collector.WG_BINARY, wg_collector.NETLINK_ENABLED = saved
+        wg_netlink._family_id = None
+    return failures
+
+
+CPU_HISTORY_SECONDS = 7 * 24 * 3600  # Прежний MAX_HISTORY_SECONDS
+CPU_SAMPLE_INTERVAL = 10
+CPU_QUERY_CALLS = 20
+# Период /api/cpu: (длительность, группировка прежнего пути, кольцо, число точек)
+CPU_PERIODS = {
+    "live": (None, None, "raw", 60),
+    "hour": (3600, "minute", "minutes", 60),
+    "day": (86400, "hour", "hours", 24),
+    "week": (7 * 86400, "day", "days", 7),
+}
+
+
+def legacy_group_rows(rows, interval):
+    """Прежний stats_service.group_rows: словарь корзин по datetime.replace."""
+    grouped = {}
+    for r in rows:
+        ts = r["timestamp"]
+        if interval == "minute":
+            key = ts.replace(second=0, microsecond=0)
+        elif interval == "hour":
+            key = ts.replace(minute=0, second=0, microsecond=0)
+        else:
+            key = ts.replace(hour=0, minute=0, second=0, microsecond=0)
+        bucket = grouped.setdefault(key, {"cpu": [], "ram": []})
+        bucket["cpu"].append(r["cpu"])
+        bucket["ram"].append(r["ram"])
+    result = [
+        {
+            "timestamp": key,
+            "cpu": sum(values["cpu"]) / len(values["cpu"]),
+            "ram": sum(values["ram"]) / len(values["ram"]),
+        }
+        for key, values in grouped.items()
+    ]
+    return sorted(result, key=lambda x: x["timestamp"])
+
+
+def legacy_resample(data, n):
+    if len(data) <= n:
+        return data
+    step = len(data) / n
+    return [data[min(int(i * step), len(data) - 1)] for i in range(n)]
+
+
+def legacy_cpu_query(history, period, now):
+    """Прежний /api/cpu по памяти: копия списка, фильтр, группировка, прореживание."""
+    duration, interval, _, points = CPU_PERIODS[period]
+    rows = list(history)
+    if duration is None:
+        return rows[-points:]
+    cutoff = now - timedelta(seconds=duration)
+    return legacy_resample(legacy_group_rows([r for r in rows if r["timestamp"] >= cutoff], interval), points)
+
+
+def _traced(build):
+    tracemalloc.start()
+    try:
+        result = build()
+        return result, tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+
+def bench_cpu_history():
+    """История CPU/RAM за неделю: список словарей с datetime против колец array со свёртками."""
+    count = CPU_HISTORY_SECONDS // CPU_SAMPLE_INTERVAL
+    start = time.time() - CPU_HISTORY_SECONDS
+    samples = [(start + i * CPU_SAMPLE_INTERVAL, i % 100 * 0.9, 40 + i % 7) for i in range(count)]
+
+    def build_legacy():
+        return [{"timestamp": datetime.fromtimestamp(ts), "cpu": c, "ram": r} for ts, c, r in samples]
+
+    def build_rings():
+        history = MetricHistory()
+        for sample in samples:
+            history.add(*sample)
+        return history
+
+    legacy, legacy_bytes = _traced(build_legacy)
+    rings, ring_bytes = _traced(build_rings)
+    payload = rings.to_bytes()
+    print(f"История за неделю: {count} образцов по {CPU_SAMPLE_INTERVAL} с")
+    print(f"  память: список {legacy_bytes / 2**20:.1f} МиБ, кольца {ring_bytes / 2**10:.1f} КиБ "
+          f"(публикация {len(payload) / 2**10:.1f} КиБ)")
+
+    # Добавление образца с обрезкой: pop(0) сдвигает весь список
+    now = datetime.fromtimestamp(samples[-1][0])
+    _, legacy_add, _ = _time_calls(
+        lambda: (legacy.append({"timestamp": now, "cpu": 1.0, "ram": 2.0}), legacy.pop(0)), 1000
+    )
+    _, ring_add, _ = _time_calls(lambda: rings.add(samples[-1][0], 1.0, 2.0), 1000)
+    print(f"  добавление: список {legacy_add * 1000:.1f} мкс, кольца {ring_add * 1000:.1f} мкс")
+
+    _, decode, _ = _time_calls(lambda: MetricHistory.from_bytes(payload), CPU_QUERY_CALLS)
+    print(f"  разбор публикации воркером: {decode:.3f} мс")
+    print(f"{'период':>8} {'список, мс':>11} {'кольца, мс':>11} {'точек':>6}")
+    failures = 0
+    for period, (duration, _, ring_name, points) in CPU_PERIODS.items():
+        old, old_ms, _ = _time_calls(lambda: legacy_cpu_query(legacy, period, now), CPU_QUERY_CALLS)
+        cutoff = samples[-1][0] - duration if duration else 0
+        new, new_ms, _ = _time_calls(
+            lambda: getattr(rings, ring_name).since(cutoff, points), CPU_QUERY_CALLS
+        )
+        if not new[0] or len(new[0]) > points:
+            print(f"  пустой или лишний ряд для {period}")
+            failures += 1
+        print(f"{period:>8} {old_ms:>11.2f} {new_ms:>11.3f} {len(new[0]):>6}")
+    return failures
+
+
+# Период /api/cpu из БД: (длительность, группировка прежнего пути, тир, число точек)
+TIER_PERIODS = {
+    "day": (86400, "hour", stats_tiers.HOURLY_TABLE, 24),
+    "week": (7 * 86400, "day", stats_tiers.DAILY_TABLE, 7),
+    "month": (30 * 86400, "day", stats_tiers.DAILY_TABLE, 30),
+    "year": (365 * 86400, "day", stats_tiers.DAILY_TABLE, 365),
+}
+TIER_SAVE_INTERVAL = 300
+TIER_SAVE_SAMPLES = TIER_SAVE_INTERVAL // CPU_SAMPLE_INTERVAL
+
+
+def legacy_tier_query(conn, period, now):
+    """Прежний путь по system_stats: все строки периода, strptime и группировка в Python."""
+    duration, interval, _, points = TIER_PERIODS[period]
+    cutoff = datetime.fromtimestamp(now - duration).strftime("%Y-%m-%d %H:%M:%S")
+    rows = [
+        {"timestamp": datetime.strptime(ts, "%Y-%m-%d %H:%M:%S"), "cpu": cpu, "ram": ram}
+        for ts, cpu, ram in conn.execute(
+            "SELECT timestamp, cpu_percent, ram_percent FROM system_stats "
+            "WHERE timestamp >= ? ORDER BY timestamp",
+            (cutoff,),
+        )
+    ]
+    return legacy_resample(legacy_group_rows(rows, interval), points)
+
+
+def bench_cpu_tiers():
+    """Графики CPU/RAM за сутки–год: группировка пятиминутных строк против тиров stats_tiers."""
+    now = time.time()
+    start = now - 365 * 86400
+    rows = [
+        (start + i * TIER_SAVE_INTERVAL, i % 100 * 0.9, 40 + i % 7)
+        for i in range(365 * 86400 // TIER_SAVE_INTERVAL)
+    ]
+    failures = 0
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        conn = storage.connect(os.path.join(tmp_dir, "system_stats.db"))
+        migrate(conn, SYSTEM_STATS_MIGRATIONS)
+        with conn:
+            conn.executemany(
+                "INSERT INTO system_stats (timestamp, cpu_percent, ram_percent) VALUES (?, ?, ?)",
+                [
+                    (datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S"), cpu, ram)
+                    for ts, cpu, ram in rows
+                ],
+            )
+            stats_tiers.add_samples(conn, rows, weight=TIER_SAVE_SAMPLES)
+        print(f"system_stats за год: {len(rows)} строк по {TIER_SAVE_INTERVAL} с")
+
+        # Сохранение интервала: образцы в часовую и суточную корзины
+        samples = [(now - TIER_SAVE_INTERVAL + i * CPU_SAMPLE_INTERVAL, 50.0, 40.0)
+                   for i in range(TIER_SAVE_SAMPLES)]
+
+        def save():
+            with conn:
+                stats_tiers.add_samples(conn, samples)
+
+        _, save_ms, _ = _time_calls(save, CPU_QUERY_CALLS)
+        print(f"  свёртка {TIER_SAVE_SAMPLES} образцов при сохранении: {save_ms:.2f} мс")
+
+        print(f"{'период':>8} {'строки, мс':>11} {'тир, мс':>9} {'точек':>6}")
+        for period, (duration, _, table, points) in TIER_PERIODS.items():
+            old, old_ms, _ = _time_calls(lambda: legacy_tier_query(conn, period, now), 3)
+            new, new_ms, _ = _time_calls(
+                lambda: stats_tiers.load_tier(conn, table, now - duration), CPU_QUERY_CALLS
+            )
+            if not new or len(new) > points + 1:
+                print(f"  пустой или лишний ряд для {period}")
+                failures += 1
+            print(f"{period:>8} {old_ms:>11.2f} {new_ms:>9.3f} {len(new):>6}")
+        conn.close()
+    return failures
+
+
+CERT_COUNTS = (300, 3000)
+CERT_LEGACY_SHARE = 10  # Каждый десятый клиент — ещё и с .crt в прежнем client/keys
+
+
+def make_client_certs(issued_dir, keys_dir, count):
+    """count клиентских .crt со сроками 1..count дней, подписанных одним ключом EC."""
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    issuer = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "bench-ca")])
+    start = datetime.now(timezone.utc) - timedelta(days=1)
+    for i in range(count):
+        name = f"client{i}"
+        cert = (
+            x509.CertificateBuilder()
+            .subject_name(x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, name)]))
+            .issuer_name(issuer)
+            .public_key(key.public_key())
+            .serial_number(i + 1)
+            .not_valid_before(start)
+            .not_valid_after(start + timedelta(days=i + 2))
+            .sign(key, hashes.SHA256())
+        )
+        pem = cert.public_bytes(serialization.Encoding.PEM)
+        targets = [issued_dir] + ([keys_dir] if i % CERT_LEGACY_SHARE == 0 else [])
+        for directory in targets:
+            with open(os.path.join(directory, f"{name}.crt"), "wb") as f:
+                f.write(pem)
+
+
+def legacy_cert_expiries(names, issued_dir, keys_dirs):
+    """Прежний get_openvpn_client_cert_expiry по каждому клиенту: listdir и разбор PEM."""
+    from src.ui.services.cert_index_service import read_pem_cert_not_after_utc
+
+    result = {}
+    for name in names:
+        paths = []
+        path = os.path.join(issued_dir, f"{name}.crt")
+        if os.path.isfile(path):
+            paths.append(path)
+        for base in keys_dirs:
+            if not os.path.isdir(base):
+                continue
+            for filename in os.listdir(base):
+                if filename.endswith(".crt") and name in filename:
+                    paths.append(os.path.join(base, filename))
+        expiries = [na for na in map(read_pem_cert_not_after_utc, paths) if na is not None]
+        if expiries:
+            result[name] = min(expiries)
+    return result
+
+
+def bench_certs():
+    """Сроки сертификатов OpenVPN: разбор всех PEM на каждый вызов против индекса по mtime.
+
+    «Без изменений» — вызов из обработчика запроса (stat каталогов),
+    «сборщик» — ежечасный refresh_cert_index со stat каждого .crt.
+    """
+    from src.ui.services import cert_index_service
+
+    failures = 0
+    saved = (cert_index_service.CERT_DIRS, runtime_state.RUNTIME_DIR)
+    print(f"{'клиентов':>9} {'прежний, мс':>12} {'индекс с нуля, мс':>18} "
+          f"{'без изменений, мс':>18} {'сборщик, мс':>12} {'после изменения, мс':>20}")
+    try:
+        for count in CERT_COUNTS:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                issued_dir, keys_dir = os.path.join(tmp_dir, "issued"), os.path.join(tmp_dir, "keys")
+                disabled_dir = os.path.join(keys_dir, "disabled")
+                for directory in (issued_dir, keys_dir, disabled_dir):
+                    os.makedirs(directory)
+                make_client_certs(issued_dir, keys_dir, count)
+                cert_index_service.CERT_DIRS = (issued_dir, keys_dir, disabled_dir)
+                runtime_state.RUNTIME_DIR = os.path.join(tmp_dir, "run")
+                cert_index_service._index = None
+
+                names = [f"client{i}" for i in range(count)]
+                # Прежний путь квадратичен по listdir: на 3000 клиентов хватает одного вызова
+                legacy, legacy_ms, _ = _time_calls(
+                    lambda: legacy_cert_expiries(names, issued_dir, (keys_dir, disabled_dir)), 1
+                )
+                cold, cold_ms, _ = _time_calls(cert_index_service.get_cert_expiries, 1)
+                _, warm_ms, _ = _time_calls(cert_index_service.get_cert_expiries, CPU_QUERY_CALLS)
+                _, sweep_ms, _ = _time_calls(cert_index_service.refresh_cert_index, CPU_QUERY_CALLS)
+
+                # Новый файл в issued (клиент переименован): разбирается только он
+                last, renamed = f"client{count - 1}", f"client{count}"
+                os.replace(
+                    os.path.join(issued_dir, f"{last}.crt"), os.path.join(issued_dir, f"{renamed}.crt")
+                )
+                after, renew_ms, _ = _time_calls(cert_index_service.get_cert_expiries, 1)
+
+                # Файл перезаписан на месте, mtime каталога прежний: его находит сборщик
+                with open(os.path.join(issued_dir, "client0.crt"), "rb") as f:
+                    pem = f.read()
+                with open(os.path.join(issued_dir, "client1.crt"), "wb") as f:
+                    f.write(pem)
+                rewritten = cert_index_service.refresh_cert_index()
+
+                if cold != legacy:
+                    print(f"  индекс расходится с прежним путём для {count} клиентов")
+                    failures += 1
+                if after.get(renamed) != legacy[last] or last in after:
+                    print(f"  индекс не увидел переименованный сертификат для {count} клиентов")
+                    failures += 1
+                if rewritten.get("client1") != legacy["client0"]:
+                    print(f"  сборщик не увидел перезаписанный сертификат для {count} клиентов")
+                    failures += 1
+                print(
+                    f"{count:>9} {legacy_ms:>12.1f} {cold_ms:>18.1f} {warm_ms:>18.2f} "
+                    f"{sweep_ms:>12.2f} {renew_ms:>20.2f}"
+                )
+    finally:
+        cert_index_service.CERT_DIRS, runtime_state.RUNTIME_DIR = saved
+        cert_index_service._index = None
+    return failures
+
+
+SYSTEMD_CALLS = 20
+# unit -> (LoadState, ActiveState, SubState); остальные unit фальшивый systemctl не знает
+FAKE_UNITS = {
+    "openvpn-server@antizapret-udp.service": ("loaded", "active", "running"),
+    "openvpn-server@antizapret-tcp.service": ("loaded", "failed", "failed"),
+    "openvpn-server@vpn-udp.service": ("loaded", "active", "running"),
+    "openvpn-server@vpn-tcp.service": ("loaded", "activating", "start"),
+    "wg-quick@antizapret.service": ("loaded", "active", "exited"),
+}
+FAKE_SYSTEMCTL = """\
+import json, sys
+units = json.load(open({states!r}))
+args = sys.argv[1:]
+command = args.pop(0)
+props, value, names = ["LoadState", "ActiveState", "SubState"], False, []
+while args:
+    arg = args.pop(0)
+    if arg == "-p":
+        props = args.pop(0).split(",")
+    elif arg == "--value":
+        value = True
+    else:
+        names.append(arg if "." in arg.rsplit("@", 1)[-1] else arg + ".service")
+fields = ["LoadState", "ActiveState", "SubState"]
+def unit_props(name):
+    return dict(zip(fields, units.get(name, ("not-found", "inactive", "dead"))))
+if command == "is-active":
+    state = unit_props(names[0])["ActiveState"]
+    print(state)
+    sys.exit(0 if state == "active" else 3)
+blocks = []
+for name in names:
+    current = unit_props(name)
+    order = [p for p in fields if p in props]
+    blocks.append("\\n".join(current[p] if value else p + "=" + current[p] for p in order))
+print(("\\n" if value else "\\n\\n").join(blocks))
+"""
+FAKE_BUSCTL = """\
+import json, sys, time
+for path in {paths!r}:
+    print(json.dumps({{"type": "signal", "path": path, "member": "PropertiesChanged"}}), flush=True)
+time.sleep(30)
+"""
+
+
+def legacy_vpn_states(units, systemctl):
+    """Прежний get_vpn_systemd_states: is-active на unit и show LoadState, если вывод пуст."""
+    rows = {}
+    for unit in units:
+        state = "unknown"
+        completed = subprocess.run([systemctl, "is-active", unit], capture_output=True, text=True)
+        st = completed.stdout.strip()
+        if st:
+            state = st
+        else:
+            load = subprocess.run(
+                [systemctl, "show", "-p", "LoadState", "--value", unit], capture_output=True, text=True
+            )
+            if load.stdout.strip() == "not-found":
+                state = "not-found"
+        rows[unit] = state
+    return rows
+
+
+def legacy_bot_states(units, systemctl):
+    """Прежний get_service_state бота: show LoadState и is-active на каждый unit."""
+    states = {}
+    for unit in units:
+        load = subprocess.run(
+            [systemctl, "show", "-p", "LoadState", "--value", unit], capture_output=True, text=True
+        ).stdout.strip()
+        if not load or load == "not-found":
+            states[unit] = "absent"
+            continue
+        state = subprocess.run([systemctl, "is-active", unit], capture_output=True, text=True).stdout.strip()
+        states[unit] = state if state in ("active", "inactive", "failed") else "unknown"
+    return states
+
+
+def _write_script(path, source):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f"#!{sys.executable} -S\n{source}")
+    os.chmod(path, 0o755)
+
+
+async def _watch_fake_bus(units):
+    """Сколько раз watch_bus вызвал on_change на серию сигналов фальшивого busctl."""
+    calls = []
+
+    async def on_change():
+        calls.append(time.monotonic())
+
+    task = asyncio.create_task(systemd_watch.watch_bus(units, on_change))
+    await asyncio.sleep(systemd_watch.BUS_DEBOUNCE * 4)
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    return len(calls)
+
+
+def bench_systemd():
+    """Состояния VPN unit: systemctl на каждый unit против одного systemctl show и снимка."""
+    from src.tg_bot.server import VPN_MONITORED_SERVICES, service_state
+    from src.ui.constants import VPN_SYSTEMD_UNITS
+    from src.ui.services.vpn_service import get_vpn_systemd_states
+
+    failures = 0
+    saved = (systemd_watch.SYSTEMCTL, systemd_watch.BUSCTL, runtime_state.RUNTIME_DIR)
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            states_path = os.path.join(tmp_dir, "units.json")
+            with open(states_path, "w", encoding="utf-8") as f:
+                json.dump(FAKE_UNITS, f)
+            systemctl = os.path.join(tmp_dir, "systemctl")
+            _write_script(systemctl, FAKE_SYSTEMCTL.format(states=states_path))
+            systemd_watch.SYSTEMCTL = systemctl
+            runtime_state.RUNTIME_DIR = os.path.join(tmp_dir, "run")
+
+            web_units = [unit for unit, _, _ in VPN_SYSTEMD_UNITS]
+            bot_units = [unit for _, unit in VPN_MONITORED_SERVICES]
+            legacy_web, legacy_web_ms, _ = _time_calls(
+                lambda: legacy_vpn_states(web_units, systemctl), SYSTEMD_CALLS
+            )
+            rows, web_ms, _ = _time_calls(get_vpn_systemd_states, SYSTEMD_CALLS)
+            legacy_bot, legacy_bot_ms, _ = _time_calls(
+                lambda: legacy_bot_states(bot_units, systemctl), SYSTEMD_CALLS
+            )
+            systemd_watch.publish_unit_states(systemd_watch.query_units(web_units))
+            snapshot, bot_ms, _ = _time_calls(
+                lambda: systemd_watch.read_unit_states(bot_units), SYSTEMD_CALLS
+            )
+
+            print(f"Состояния {len(web_units)} VPN unit, среднее на вызов из {SYSTEMD_CALLS}")
+            print(f"  панель: по unit {legacy_web_ms:.1f} мс, один systemctl show {web_ms:.1f} мс")
+            print(f"  бот: по unit {legacy_bot_ms:.1f} мс, снимок сборщика {bot_ms:.3f} мс")
+
+            new_web = {row["unit"]: row["state"] for row in rows}
+            # Прежний путь не отличал отсутствующий unit: is-active печатает inactive
+            expected_web = dict(legacy_web, **{"wg-quick@vpn.service": "not-found"})
+            if new_web != expected_web:
+                print(f"  панель: {new_web} != {expected_web}")
+                failures += 1
+            new_bot = {unit: service_state(snapshot[unit]) for unit in bot_units}
+            if new_bot != legacy_bot:
+                print(f"  бот: {new_bot} != {legacy_bot}")
+                failures += 1
+
+            busctl = os.path.join(tmp_dir, "busctl")
+            watched = "openvpn-server@vpn-udp"
+            _write_script(
+                busctl,
+                FAKE_BUSCTL.format(
+                    paths=[systemd_watch.unit_object_path(watched)] * 3
+                    + [systemd_watch.unit_object_path("ssh.service")]
+                ),
+            )
+            systemd_watch.BUSCTL = busctl
+            calls = asyncio.run(_watch_fake_bus([watched]))
+            print(f"  busctl monitor: 3 сигнала по unit и 1 чужой -> обновлений {calls}")
+            if calls != 1:
+                failures += 1
+    finally:
+        systemd_watch.SYSTEMCTL, systemd_watch.BUSCTL, runtime_state.RUNTIME_DIR = saved
+    return failures
+
+
+def main():
+    commands = sys.argv[1:] or ["ingest", "plans", "rollups", "concurrency", "schema", "status", "wg", "cpu", "tiers", "certs", "systemd"]
+    failures = 0
+    if "ingest" in commands:
+        bench_ingest()
+    if "plans" in commands:
+        failures += check_query_plans()
+    if "rollups" in commands:
+        failures += check_rollup_retention()
+    if "concurrency" in commands:
+        failures += bench_concurrency()
+    if "schema" in commands:
+        failures += bench_schema()
+    if "status" in commands:
+        failures += bench_status()
+    if "wg" in commands:
+        failures += bench_wg()
+    if "cpu" in commands:
+        failures += bench_cpu_history()
+    if "tiers" in commands:
+        failures += bench_cpu_tiers()
+    if "certs" in commands:
+        failures += bench_certs()
+    if "systemd" in commands:
+        failures += bench_systemd()
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
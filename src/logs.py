@@ -1,10 +1,28 @@
 import os
+import sys
+import time
+import ctypes
+import select
+import struct
 import sqlite3
-import csv
 import json
-
-from datetime import datetime, timedelta, timezone
-from tzlocal import get_localzone
+import hashlib
+
+_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _root not in sys.path:
+    sys.path.insert(0, _root)
+
+from src import storage  # noqa: E402
+from src.migrations import OPENVPN_LOGS_MIGRATIONS, migrate_database  # noqa: E402
+from src.ovpn_mgmt import start_listeners  # noqa: E402
+from src.ovpn_status import IncompleteStatusError, parse_status  # noqa: E402
+from src.stats_buckets import (  # noqa: E402
+    day_bucket,
+    hour_bucket,
+    month_bucket,
+    next_day,
+    next_month,
+)
 
 # Пути к файлам логов OpenVPN
 LOG_FILES = [
@@ -18,8 +36,32 @@ LOG_FILES = [
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DB_PATH = os.path.join(BASE_DIR, "databases", "openvpn_logs.db")
 SETTINGS_PATH = os.path.join(BASE_DIR, "settings.json")
+# Отпечатки файлов статуса с прошлого запуска (нужны и разовому запуску без --daemon)
+FINGERPRINTS_PATH = os.path.join(BASE_DIR, "databases", "openvpn_status_fingerprints.json")
 HISTORY_MAX_RECORDS_DEFAULT = 1000
 
+# Параметры резидентного режима (--daemon)
+STATUS_DIR = "/etc/openvpn/server/logs"
+POLL_INTERVAL = 2  # Интервал опроса mtime, если inotify недоступен, в секундах
+DEBOUNCE_DELAY = 0.3  # Пауза для объединения серии записей в один файл
+IDLE_INTERVAL = 30  # Обработка без событий, в секундах
+MAINTENANCE_INTERVAL = 3600  # Очистка и свёртки, если новых данных нет, в секундах
+BYTECOUNT_FLUSH_INTERVAL = 10  # Запись счётчиков из management bytecount, в секундах
+
+# inotify(7)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+INOTIFY_EVENT_HEADER = struct.Struct("iIII")
+
+# Отпечатки файлов живут всё время работы процесса
+_fingerprints = None
+# time.monotonic() последней очистки и свёртки
+_last_maintenance = None
+
 
 def get_stats_retention_days(default_days=365):
     try:
@@ -58,102 +100,15 @@ def get_retention_windows(total_days):
     return hourly_days, daily_days, monthly_days
 
 
-def initialize_database():
-    """Создаёт таблицы базы данных, если их нет."""
-    conn = sqlite3.connect(DB_PATH)
+def get_connection():
+    """Возвращает общее подключение к БД, при первом вызове применяет миграции."""
+    migrate_database(DB_PATH, OPENVPN_LOGS_MIGRATIONS)
+    return storage.get_connection(DB_PATH)
 
-    # Основная таблица: почасовая статистика (хранение 30 дней)
-    conn.execute(
-        """
-        CREATE TABLE IF NOT EXISTS daily_stats (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            client_name TEXT,
-            ip_address TEXT,
-            hour TEXT,
-            total_bytes_received INTEGER,
-            total_bytes_sent INTEGER,
-            total_connections INTEGER,
-            last_connected TEXT,
-            UNIQUE(client_name, hour, ip_address)
-        )
-        """
-    )
 
-    # Агрегированная дневная статистика (хранение 90 дней)
-    conn.execute(
-        """
-        CREATE TABLE IF NOT EXISTS monthly_stats (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            client_name TEXT,
-            ip_address TEXT,
-            month TEXT,
-            total_bytes_received INTEGER,
-            total_bytes_sent INTEGER,
-            total_connections INTEGER,
-            last_connected TEXT,
-            UNIQUE(client_name, month, ip_address)
-            )
-        """
-    )
-
-    # Агрегированная месячная статистика (хранение 365 дней)
-    conn.execute(
-        """
-        CREATE TABLE IF NOT EXISTS yearly_stats (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            client_name TEXT,
-            ip_address TEXT,
-            month TEXT,
-            total_bytes_received INTEGER,
-            total_bytes_sent INTEGER,
-            total_connections INTEGER,
-            last_connected TEXT,
-            UNIQUE(client_name, month, ip_address)
-        )
-        """
-    )
-
-    # Таблица для журналов подключений
-    conn.execute(
-        """
-        CREATE TABLE IF NOT EXISTS connection_logs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            client_name TEXT,
-            local_ip TEXT,
-            real_ip TEXT,
-            connected_since DATETIME,
-            bytes_received INTEGER,
-            bytes_sent INTEGER,
-            protocol TEXT
-        )
-    """
-    )
-    # Хранит последнее состояние клиентов
-    conn.execute(
-        """
-        CREATE TABLE IF NOT EXISTS last_client_stats (
-            client_name TEXT,
-            ip_address TEXT,
-            connected_since TEXT,
-            bytes_received INTEGER,
-            bytes_sent INTEGER,
-            PRIMARY KEY (client_name, ip_address)
-        )
-    """
-    )
-
-    conn.commit()
-    conn.close()
-
-
-def ensure_column_exists():
-    with sqlite3.connect(DB_PATH) as conn:
-        cursor = conn.cursor()
-        cursor.execute("PRAGMA table_info(monthly_stats)")
-        columns = [row[1] for row in cursor.fetchall()]
-        if "last_connected" not in columns:
-            cursor.execute("ALTER TABLE monthly_stats ADD COLUMN last_connected TEXT")
-            conn.commit()
+def reset_connection():
+    """Закрывает общее подключение."""
+    storage.close_connection(DB_PATH)
 
 
 def mask_ip(ip_address):
@@ -173,37 +128,6 @@ def mask_ip(ip_address):
     return ip_address
 
 
-def format_date(date_string):
-    date_obj = datetime.strptime(date_string, "%Y-%m-%d %H:%M:%S")
-    server_timezone = get_localzone()
-    localized_date = date_obj.replace(tzinfo=server_timezone)
-    utc_date = localized_date.astimezone(timezone.utc)
-    return utc_date.isoformat()
-
-
-def format_duration(start_time):
-    now = datetime.now()  # Текущее время
-    delta = now - start_time  # Разница во времени
-
-    days = delta.days
-    seconds = delta.seconds
-    hours, remainder = divmod(seconds, 3600)
-    minutes, seconds = divmod(remainder, 60)
-
-    if days >= 30:
-        months = days // 30
-        days %= 30
-        return f"{months} мес. {days} дн. {hours} ч. {minutes} мин."
-    elif days > 0:
-        return f"{days} дн. {hours} ч. {minutes} мин."
-    elif hours > 0:
-        return f"{hours} ч. {minutes} мин."
-    elif minutes > 0:
-        return f"{minutes} мин."
-    else:
-        return f"{seconds} сек."
-
-
 def normalize_real_address(addr):
     # OpenVPN 2.7: udp4:IP:PORT или tcp4:IP:PORT
     if addr.startswith(("udp4:", "tcp4:", "tcp4-server:", "udp6:", "tcp6:")):
@@ -213,343 +137,567 @@ def normalize_real_address(addr):
 
 def parse_log_file(log_file, protocol):
     """Читает и парсит файл лога."""
-    logs = []
-    total_received = 0
-    total_sent = 0
-    parse_count = 0
-    skipped_count = 0
     if not os.path.exists(log_file):
         print(f"Файл не найден: {log_file}")
         return []
-    if os.path.getsize(log_file) == 0:
-        return []
+    with open(log_file, "rb") as file:
+        return parse_status_content(file.read(), protocol)
 
-    with open(log_file, newline="", encoding="utf-8") as file:
-        reader = csv.reader(file)
-        try:
-            next(reader)
-        except StopIteration:
-            return []
-
-        for row in reader:
-            if not row:
-                continue
-            if row[0] == "CLIENT_LIST":
-                parse_count += 1
-                client_name = row[1]
-                real_address = normalize_real_address(row[2])
-                received = int(row[5])
-                sent = int(row[6])
-                total_received += received
-                total_sent += sent
-                start_date = datetime.strptime(row[7], "%Y-%m-%d %H:%M:%S")
-                duration = format_duration(start_date)
-                logs.append(
-                    {
-                        "client_name": client_name,
-                        "real_ip": mask_ip(real_address),
-                        "local_ip": row[3],
-                        "bytes_received": received,
-                        "connected_since": format_date(row[7]),
-                        "bytes_sent": sent,
-                        "duration": duration,
-                        "protocol": protocol,
-                    }
-                )
-                print(f"Обработано: {client_name}_{received}/{sent}")
-    return logs
-
-
-def save_daily_stats(logs):
-    """Сохраняет суммарные данные в таблицу daily_stats с почасовой гранулярностью."""
-
-    current_hour = datetime.today().strftime("%Y-%m-%d %H:00")
-
-    with sqlite3.connect(DB_PATH) as conn:
-        cursor = conn.cursor()
 
-        aggregated_data = {}
+def parse_status_content(content, protocol):
+    """Парсит содержимое файла статуса, уже прочитанное в память.
 
-        for log in logs:
-            try:
-                connected_since = datetime.fromisoformat(log["connected_since"])
-            except (ValueError, TypeError):
-                continue
-
-            client_name = log["client_name"]
-            ip_address = log["local_ip"]
-            new_bytes_received = log.get("bytes_received", 0)
-            new_bytes_sent = log.get("bytes_sent", 0)
-
-            cursor.execute(
-                """
-                SELECT connected_since, bytes_received, bytes_sent 
-                FROM last_client_stats 
-                WHERE client_name = ? AND ip_address = ?
-                """,
-                (client_name, ip_address),
+    Недописанный файл (без END) даёт IncompleteStatusError.
+    """
+    if not content:
+        return []
+    return [
+        {
+            "client_name": record.name,
+            "real_ip": mask_ip(normalize_real_address(record.real_address)),
+            "local_ip": record.virtual_address,
+            "bytes_received": record.bytes_received,
+            "bytes_sent": record.bytes_sent,
+            "connected_since": record.connected_iso,
+            "connected_at": record.connected_at,
+            "protocol": protocol,
+        }
+        for record in parse_status(content)
+        if record.connected_iso
+    ]
+
+
+def stage_snapshot(conn, logs):
+    """Загружает снимок клиентов во временную таблицу одним executemany."""
+    conn.execute(
+        """
+        CREATE TEMP TABLE IF NOT EXISTS ovpn_snapshot (
+            client_name TEXT,
+            ip_address TEXT,
+            real_ip TEXT,
+            connected_since TEXT,
+            connected_at INTEGER,
+            bytes_received INTEGER,
+            bytes_sent INTEGER,
+            protocol TEXT
+        )
+        """
+    )
+    conn.execute("DELETE FROM ovpn_snapshot")
+    conn.executemany(
+        """
+        INSERT INTO ovpn_snapshot
+            (client_name, ip_address, real_ip, connected_since, connected_at,
+             bytes_received, bytes_sent, protocol)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        [
+            (
+                log["client_name"],
+                log["local_ip"] or "",
+                log["real_ip"],
+                log["connected_since"],
+                log["connected_at"],
+                log.get("bytes_received", 0),
+                log.get("bytes_sent", 0),
+                log["protocol"],
             )
-            last_state = cursor.fetchone()
-
-            if last_state:
-                last_connected_since, last_bytes_received, last_bytes_sent = last_state
-
-                if last_connected_since != log["connected_since"]:
-                    diff_received = new_bytes_received
-                    diff_sent = new_bytes_sent
-                else:
-                    diff_received = max(0, new_bytes_received - last_bytes_received)
-                    diff_sent = max(0, new_bytes_sent - last_bytes_sent)
-            else:
-                diff_received = new_bytes_received
-                diff_sent = new_bytes_sent
-
-            key = (client_name, ip_address, current_hour)
-            if key not in aggregated_data:
-                aggregated_data[key] = {
-                    "total_bytes_received": 0,
-                    "total_bytes_sent": 0,
-                    "total_connections": 0,
-                }
+            for log in logs
+        ],
+    )
 
-            aggregated_data[key]["total_bytes_received"] += diff_received
-            aggregated_data[key]["total_bytes_sent"] += diff_sent
-            aggregated_data[key]["total_connections"] += 1
 
-            aggregated_data[key]["last_connected"] = max(
-                aggregated_data[key].get("last_connected", connected_since),
-                connected_since,
-            )
+def save_daily_stats(conn):
+    """Сохраняет суммарные данные снимка в ovpn_hourly (корзина — час UTC).
 
-            cursor.execute(
-                """
-                INSERT INTO last_client_stats (client_name, ip_address, connected_since, bytes_received, bytes_sent)
-                VALUES (?, ?, ?, ?, ?)
-                ON CONFLICT(client_name, ip_address) DO UPDATE SET
-                connected_since = excluded.connected_since,
-                bytes_received = excluded.bytes_received,
-                bytes_sent = excluded.bytes_sent
-                """,
-                (
-                    client_name,
-                    ip_address,
-                    log["connected_since"],
-                    new_bytes_received,
-                    new_bytes_sent,
-                ),
-            )
+    Приращения считаются одним соединением снимка с last_client_stats:
+    если сессия сменилась (другой connected_since), учитывается весь счётчик.
+    В пределах сессии last_client_stats хранит максимум счётчиков, поэтому
+    более старый снимок из файла статуса после свежего bytecount не даёт
+    повторного учёта трафика. connections — число новых сессий, поэтому
+    частые записи bytecount и повторные снимки его не увеличивают.
+    """
+    current_hour = hour_bucket(time.time())
 
-        for (client_name, ip_address, hour), data in aggregated_data.items():
-            cursor.execute(
-                """
-                SELECT total_bytes_received, total_bytes_sent, total_connections, last_connected 
-                FROM daily_stats WHERE client_name = ? AND ip_address = ? AND hour = ?
-                """,
-                (client_name, ip_address, hour),
-            )
-            existing_log = cursor.fetchone()
-
-            if existing_log:
-                (
-                    existing_bytes_received,
-                    existing_bytes_sent,
-                    existing_connections,
-                    existing_last_connected,
-                ) = existing_log
-                last_connected = max(
-                    existing_last_connected or "", data["last_connected"].isoformat()
-                )
-
-                cursor.execute(
-                    """
-                    UPDATE daily_stats
-                    SET total_bytes_received = total_bytes_received + ?, 
-                        total_bytes_sent = total_bytes_sent + ?, 
-                        total_connections = total_connections + ?,
-                        last_connected = ?
-                    WHERE client_name = ? AND ip_address = ? AND hour = ?
-                    """,
-                    (
-                        data["total_bytes_received"],
-                        data["total_bytes_sent"],
-                        data["total_connections"],
-                        last_connected,
-                        client_name,
-                        ip_address,
-                        hour,
-                    ),
-                )
-            else:
-                cursor.execute(
-                    """
-                    INSERT INTO daily_stats (client_name, ip_address, hour, total_bytes_received, total_bytes_sent, total_connections, last_connected)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                    """,
-                    (
-                        client_name,
-                        ip_address,
-                        hour,
-                        data["total_bytes_received"],
-                        data["total_bytes_sent"],
-                        data["total_connections"],
-                        data["last_connected"].isoformat(),
-                    ),
-                )
-        conn.commit()
-
-
-def aggregate_to_monthly():
-    """Агрегирует почасовые данные из daily_stats в дневные данные в monthly_stats."""
-    with sqlite3.connect(DB_PATH) as conn:
-        cursor = conn.cursor()
-        cursor.execute(
-            """
-            INSERT INTO monthly_stats
-                (client_name, ip_address, month,
-                 total_bytes_received, total_bytes_sent,
-                 total_connections, last_connected)
-            SELECT client_name, ip_address, substr(hour, 1, 10),
-                   SUM(total_bytes_received), SUM(total_bytes_sent),
-                   SUM(total_connections), MAX(last_connected)
-            FROM daily_stats
-            GROUP BY client_name, ip_address, substr(hour, 1, 10)
-            ON CONFLICT(client_name, month, ip_address) DO UPDATE SET
-                total_bytes_received = excluded.total_bytes_received,
-                total_bytes_sent = excluded.total_bytes_sent,
-                total_connections = excluded.total_connections,
+    conn.execute(
+        """
+        INSERT OR IGNORE INTO ovpn_clients (client_name, ip_address)
+        SELECT DISTINCT client_name, ip_address FROM ovpn_snapshot
+        """
+    )
+    conn.execute(
+        """
+        INSERT INTO ovpn_hourly
+            (bucket, client_id, bytes_received, bytes_sent, connections, last_connected)
+        SELECT ?, c.id,
+               SUM(CASE WHEN l.connected_since = s.connected_since
+                        THEN MAX(0, s.bytes_received - l.bytes_received)
+                        ELSE s.bytes_received END),
+               SUM(CASE WHEN l.connected_since = s.connected_since
+                        THEN MAX(0, s.bytes_sent - l.bytes_sent)
+                        ELSE s.bytes_sent END),
+               SUM(l.connected_since IS NOT s.connected_since), MAX(s.connected_at)
+        FROM ovpn_snapshot AS s
+        JOIN ovpn_clients AS c
+            ON c.client_name = s.client_name AND c.ip_address = s.ip_address
+        LEFT JOIN last_client_stats AS l
+            ON l.client_name = s.client_name AND l.ip_address = s.ip_address
+        WHERE true
+        GROUP BY c.id
+        ON CONFLICT(bucket, client_id) DO UPDATE SET
+            bytes_received = bytes_received + excluded.bytes_received,
+            bytes_sent = bytes_sent + excluded.bytes_sent,
+            connections = connections + excluded.connections,
+            last_connected = MAX(COALESCE(last_connected, 0), excluded.last_connected)
+        """,
+        (current_hour,),
+    )
+
+    conn.execute(
+        """
+        INSERT INTO last_client_stats
+            (client_name, ip_address, connected_since, bytes_received, bytes_sent)
+        SELECT client_name, ip_address, connected_since, bytes_received, bytes_sent
+        FROM ovpn_snapshot
+        WHERE true
+        ON CONFLICT(client_name, ip_address) DO UPDATE SET
+            connected_since = excluded.connected_since,
+            bytes_received = CASE WHEN connected_since = excluded.connected_since
+                THEN MAX(bytes_received, excluded.bytes_received)
+                ELSE excluded.bytes_received END,
+            bytes_sent = CASE WHEN connected_since = excluded.connected_since
+                THEN MAX(bytes_sent, excluded.bytes_sent)
+                ELSE excluded.bytes_sent END
+        """
+    )
+
+
+def get_rollup_state(conn, name):
+    row = conn.execute("SELECT value FROM rollup_state WHERE name = ?", (name,)).fetchone()
+    return row[0] if row else None
+
+
+def set_rollup_state(conn, name, value):
+    conn.execute(
+        """
+        INSERT INTO rollup_state (name, value) VALUES (?, ?)
+        ON CONFLICT(name) DO UPDATE SET value = excluded.value
+        """,
+        (name, str(value)),
+    )
+
+
+def rollup_series(conn, source, target, start, period_end, next_period):
+    """Пересчитывает периоды target из source, начиная с корзины start.
+
+    Каждый период — диапазон по первичному ключу source [bucket, next_period(bucket)).
+    """
+    now = int(time.time())
+    bucket = start
+    while bucket <= now:
+        end = next_period(bucket)
+        conn.execute(
+            f"""
+            INSERT INTO {target}
+                (bucket, client_id, bytes_received, bytes_sent, connections, last_connected)
+            SELECT ?, client_id, SUM(bytes_received), SUM(bytes_sent),
+                   SUM(connections), MAX(last_connected)
+            FROM {source}
+            WHERE bucket >= ? AND bucket < ?
+            GROUP BY client_id
+            ON CONFLICT(bucket, client_id) DO UPDATE SET
+                bytes_received = excluded.bytes_received,
+                bytes_sent = excluded.bytes_sent,
+                connections = excluded.connections,
                 last_connected = excluded.last_connected
-            """
+            """,
+            (bucket, bucket, end),
         )
-        conn.commit()
+        bucket = end
+    return period_end(now)
 
 
-def aggregate_to_yearly():
-    """Агрегирует дневные данные из monthly_stats в месячные данные в yearly_stats."""
-    with sqlite3.connect(DB_PATH) as conn:
-        cursor = conn.cursor()
-        cursor.execute(
-            """
-            INSERT INTO yearly_stats
-                (client_name, ip_address, month,
-                 total_bytes_received, total_bytes_sent,
-                 total_connections, last_connected)
-            SELECT client_name, ip_address, substr(month, 1, 7),
-                   SUM(total_bytes_received), SUM(total_bytes_sent),
-                   SUM(total_connections), MAX(last_connected)
-            FROM monthly_stats
-            GROUP BY client_name, ip_address, substr(month, 1, 7)
-            ON CONFLICT(client_name, month, ip_address) DO UPDATE SET
-                total_bytes_received = excluded.total_bytes_received,
-                total_bytes_sent = excluded.total_bytes_sent,
-                total_connections = excluded.total_connections,
-                last_connected = excluded.last_connected
-            """
+def aggregate_to_monthly(full=False):
+    """Агрегирует почасовые данные ovpn_hourly в дневные данные ovpn_daily.
+
+    Пересчитываются только дни начиная с водяной отметки прошлого запуска;
+    при full=True или без отметки — вся таблица.
+    """
+    conn = get_connection()
+    with conn:
+        since_day = None if full else get_rollup_state(conn, "ovpn_daily")
+        if since_day is None:
+            first = conn.execute("SELECT MIN(bucket) FROM ovpn_hourly").fetchone()[0]
+            if first is None:
+                return
+            since_day = day_bucket(first)
+        # Следующий запуск пересчитает текущий день (и вчерашний, если сутки сменились)
+        today = rollup_series(
+            conn, "ovpn_hourly", "ovpn_daily", int(since_day), day_bucket, next_day
+        )
+        set_rollup_state(conn, "ovpn_daily", today)
+
+
+def aggregate_to_yearly(full=False):
+    """Агрегирует дневные данные ovpn_daily в месячные данные ovpn_monthly.
+
+    Пересчитываются только месяцы начиная с водяной отметки прошлого запуска;
+    при full=True или без отметки — вся таблица. ovpn_daily очищается целыми
+    месяцами, поэтому пересчёт месяца всегда видит все его дни.
+    """
+    conn = get_connection()
+    with conn:
+        since_month = None if full else get_rollup_state(conn, "ovpn_monthly")
+        if since_month is None:
+            first = conn.execute("SELECT MIN(bucket) FROM ovpn_daily").fetchone()[0]
+            if first is None:
+                return
+            since_month = month_bucket(first)
+        current_month = rollup_series(
+            conn, "ovpn_daily", "ovpn_monthly", int(since_month), month_bucket, next_month
         )
-        conn.commit()
+        set_rollup_state(conn, "ovpn_monthly", current_month)
+
+
+def rebuild_rollups():
+    """Полный пересчёт ovpn_daily и ovpn_monthly по запросу."""
+    aggregate_to_monthly(full=True)
+    aggregate_to_yearly(full=True)
+    print("Агрегаты ovpn_daily и ovpn_monthly пересчитаны полностью")
+
+
+def get_retention_cutoffs(total_days, now):
+    """Границы хранения (ovpn_hourly, ovpn_daily, ovpn_monthly): корзины раньше удаляются.
+
+    ovpn_daily хранится целыми месяцами: месяц без первых дней пересчитался бы
+    в ovpn_monthly с заниженной суммой.
+    """
+    hourly_days, daily_days, monthly_days = get_retention_windows(total_days)
+    return (
+        day_bucket(now - hourly_days * 86400),
+        month_bucket(now - daily_days * 86400),
+        month_bucket(now - monthly_days * 86400),
+    )
 
 
 def cleanup_old_stats(total_days=None):
     """Очищает устаревшие записи из всех таблиц статистики."""
     retention_days = total_days or get_stats_retention_days(default_days=365)
-    hourly_days, daily_days, monthly_days = get_retention_windows(retention_days)
+    hourly_cutoff, daily_cutoff, monthly_cutoff = get_retention_cutoffs(retention_days, time.time())
 
-    with sqlite3.connect(DB_PATH) as conn:
+    conn = get_connection()
+    with conn:
         cursor = conn.cursor()
+        cursor.execute("DELETE FROM ovpn_hourly WHERE bucket < ?", (hourly_cutoff,))
+        cursor.execute("DELETE FROM ovpn_daily WHERE bucket < ?", (daily_cutoff,))
+        cursor.execute("DELETE FROM ovpn_monthly WHERE bucket < ?", (monthly_cutoff,))
+
 
-        hourly_cutoff = (datetime.today() - timedelta(days=hourly_days)).strftime("%Y-%m-%d")
-        cursor.execute("DELETE FROM daily_stats WHERE hour < ?", (hourly_cutoff,))
+def save_connection_logs(conn):
+    """Сохраняет сессии снимка в connection_logs: новые добавляет, у известных обновляет трафик."""
+    # Сессия определяется парой client_name + connected_since
+    conn.execute(
+        """
+        UPDATE connection_logs
+        SET bytes_received = s.bytes_received, bytes_sent = s.bytes_sent
+        FROM ovpn_snapshot AS s
+        WHERE connection_logs.client_name = s.client_name
+          AND connection_logs.connected_since = s.connected_since
+          AND (s.bytes_received > connection_logs.bytes_received
+               OR s.bytes_sent > connection_logs.bytes_sent)
+        """
+    )
+    conn.execute(
+        """
+        INSERT INTO connection_logs
+            (client_name, local_ip, real_ip, connected_since,
+             bytes_received, bytes_sent, protocol)
+        SELECT client_name, ip_address, real_ip, connected_since,
+               bytes_received, bytes_sent, protocol
+        FROM ovpn_snapshot AS s
+        WHERE NOT EXISTS (
+            SELECT 1 FROM connection_logs AS c
+            WHERE c.client_name = s.client_name
+              AND c.connected_since = s.connected_since
+        )
+        ORDER BY s.rowid
+        """
+    )
 
-        daily_cutoff = (datetime.today() - timedelta(days=daily_days)).strftime("%Y-%m-%d")
-        cursor.execute(
-            "DELETE FROM monthly_stats WHERE month < ? OR length(month) != 10",
-            (daily_cutoff,),
+    max_records = get_history_max_records()
+    conn.execute(
+        """
+        DELETE FROM connection_logs
+        WHERE id NOT IN (
+            SELECT id FROM connection_logs ORDER BY id DESC LIMIT ?
         )
+        """,
+        (max_records,),
+    )
 
-        monthly_cutoff = (datetime.today() - timedelta(days=monthly_days)).strftime("%Y-%m")
-        cursor.execute("DELETE FROM yearly_stats WHERE month < ?", (monthly_cutoff,))
 
-        conn.commit()
+def get_fingerprints():
+    """Отпечатки файлов статуса: {путь: [inode, size, mtime_ns, hash]} или None для отсутствующих."""
+    global _fingerprints
+    if _fingerprints is None:
+        try:
+            with open(FINGERPRINTS_PATH, "r", encoding="utf-8") as f:
+                _fingerprints = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError, ValueError):
+            _fingerprints = {}
+    return _fingerprints
 
 
-def save_connection_logs(logs):
-    """Сохраняет данные подключений в таблицу connection_logs, избегая повторных записей и добавляя только разницу в трафике."""
-    with sqlite3.connect(DB_PATH) as conn:
-        cursor = conn.cursor()
+def save_fingerprints(changes):
+    fingerprints = get_fingerprints()
+    fingerprints.update(changes)
+    tmp_path = f"{FINGERPRINTS_PATH}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(fingerprints, f)
+        os.replace(tmp_path, FINGERPRINTS_PATH)
+    except OSError as e:
+        print(f"Не удалось сохранить отпечатки файлов статуса: {e}")
 
-        for log in logs:
-            # Проверяем, существует ли уже запись с такими же client_name и connected_since
-            cursor.execute(
-                """
-                SELECT id, bytes_received, bytes_sent FROM connection_logs 
-                WHERE client_name = ? AND connected_since = ?
-                LIMIT 1
-                """,
-                (log["client_name"], log["connected_since"]),
-            )
-            existing_log = cursor.fetchone()
-
-            if existing_log is None:
-                # Если записи нет, добавляем новую
-                cursor.execute(
-                    """
-                    INSERT INTO connection_logs (client_name, local_ip, real_ip, connected_since, bytes_received, bytes_sent, protocol)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                    """,
-                    (
-                        log["client_name"],
-                        log["local_ip"],
-                        log["real_ip"],
-                        log["connected_since"],
-                        log["bytes_received"],
-                        log["bytes_sent"],
-                        log["protocol"],
-                    ),
-                )
-            else:
-                # Если запись существует, вычисляем разницу в трафике
-                existing_id, existing_bytes_received, existing_bytes_sent = existing_log
-
-                # Вычисляем разницу
-                diff_received = log["bytes_received"] - existing_bytes_received
-                diff_sent = log["bytes_sent"] - existing_bytes_sent
-
-                # Если разница больше нуля, обновляем данные
-                if diff_received > 0 or diff_sent > 0:
-                    cursor.execute(
-                        """
-                        UPDATE connection_logs
-                        SET bytes_received = bytes_received + ?, bytes_sent = bytes_sent + ?
-                        WHERE id = ?
-                        """,
-                        (diff_received, diff_sent, existing_id),
-                    )
-
-        max_records = get_history_max_records()
-        cursor.execute(
-            """
-            DELETE FROM connection_logs
-            WHERE id NOT IN (
-                SELECT id FROM connection_logs ORDER BY id DESC LIMIT ?
-            )
-            """,
-            (max_records,),
-        )
-        conn.commit()
 
+def collect_changed_logs(counters):
+    """Парсит только изменившиеся файлы статуса.
 
-def process_logs():
-    """Основная функция для обработки логов."""
-    initialize_database()
-    ensure_column_exists()
+    Неизменный файл стоит одного stat(): совпали inode, размер и mtime.
+    Если stat отличается, но хэш содержимого прежний, файл тоже пропускается.
+    Возвращает записи клиентов и новые отпечатки, которые нужно сохранить
+    после успешной записи в БД.
+    """
+    fingerprints = get_fingerprints()
+    changes = {}
     all_logs = []
     for log_file, protocol in LOG_FILES:
-        all_logs.extend(parse_log_file(log_file, protocol))
-    save_daily_stats(all_logs)
-    save_connection_logs(all_logs)
-    aggregate_to_monthly()
-    aggregate_to_yearly()
-    cleanup_old_stats()
+        previous = fingerprints.get(log_file)
+        try:
+            st = os.stat(log_file)
+        except FileNotFoundError:
+            if log_file not in fingerprints or previous is not None:
+                print(f"Файл не найден: {log_file}")
+                changes[log_file] = None
+            counters["skipped"] += 1
+            continue
+
+        stat_key = [st.st_ino, st.st_size, st.st_mtime_ns]
+        if previous is not None and previous[:3] == stat_key:
+            counters["skipped"] += 1
+            continue
+
+        with open(log_file, "rb") as file:
+            content = file.read()
+        content_hash = hashlib.blake2b(content, digest_size=16).hexdigest()
+        if previous is not None and previous[3] == content_hash:
+            changes[log_file] = stat_key + [content_hash]
+            counters["skipped"] += 1
+            continue
+
+        try:
+            all_logs.extend(parse_status_content(content, protocol))
+        except IncompleteStatusError:
+            # OpenVPN ещё пишет файл: отпечаток не сохраняем, дочитаем при следующем событии
+            print(f"Файл статуса записан не полностью: {log_file}")
+            counters["skipped"] += 1
+            continue
+        changes[log_file] = stat_key + [content_hash]
+        counters["parsed"] += 1
+    return all_logs, changes
+
+
+def process_logs():
+    """Основная функция для обработки логов.
+
+    Возвращает счётчики запуска: parsed, skipped (файлы) и rows_written (строки БД).
+    """
+    counters = {"parsed": 0, "skipped": 0, "rows_written": 0}
+    all_logs, changes = collect_changed_logs(counters)
+    if counters["parsed"]:
+        conn = get_connection()
+        with conn:
+            stage_snapshot(conn, all_logs)
+            changes_before = conn.total_changes
+            save_daily_stats(conn)
+            save_connection_logs(conn)
+        maintain_stats(conn)
+        counters["rows_written"] = conn.total_changes - changes_before
+    elif _last_maintenance is None or time.monotonic() - _last_maintenance >= MAINTENANCE_INTERVAL:
+        # Новых данных нет, но срок хранения и свёртки по водяным знакам
+        # продвигаются и без них
+        conn = get_connection()
+        changes_before = conn.total_changes
+        maintain_stats(conn)
+        counters["rows_written"] = conn.total_changes - changes_before
+    # Иначе ничего не изменилось — SQLite даже не открываем
+
+    if changes:
+        save_fingerprints(changes)
+    print_counters(counters)
+    return counters
+
+
+def maintain_stats(conn):
+    """Очистка по сроку хранения и свёртки в помесячную и годовую статистику."""
+    global _last_maintenance
+    with conn:
+        # Смена срока хранения меняет набор строк-источников — пересчитываем всё
+        retention_days = get_stats_retention_days(default_days=365)
+        full_rebuild = get_rollup_state(conn, "retention_days") != str(retention_days)
+        set_rollup_state(conn, "retention_days", retention_days)
+    cleanup_old_stats(retention_days)
+    aggregate_to_monthly(full=full_rebuild)
+    aggregate_to_yearly(full=full_rebuild)
+    _last_maintenance = time.monotonic()
+
+
+def print_counters(counters):
+    print(
+        f"Файлов разобрано: {counters['parsed']}, пропущено: {counters['skipped']}, "
+        f"записано строк: {counters['rows_written']}"
+    )
+
+
+def flush_bytecount(listeners):
+    """Записывает счётчики из потока bytecount в почасовую статистику."""
+    all_logs = []
+    for listener in listeners:
+        for client in listener.take_changed():
+            all_logs.append(
+                {
+                    "client_name": client["client_name"],
+                    "real_ip": mask_ip(normalize_real_address(client["real_address"])),
+                    "local_ip": client["local_ip"],
+                    "bytes_received": client["bytes_received"],
+                    "bytes_sent": client["bytes_sent"],
+                    "connected_since": client["connected_since"],
+                    "connected_at": client["connected_at"],
+                    "protocol": listener.protocol,
+                }
+            )
+    if not all_logs:
+        return 0
+
+    conn = get_connection()
+    with conn:
+        stage_snapshot(conn, all_logs)
+        save_daily_stats(conn)
+        save_connection_logs(conn)
+    return len(all_logs)
+
+
+class InotifyWatcher:
+    """Ожидание перезаписи файлов статуса через inotify."""
+
+    def __init__(self, directory, file_names):
+        self.file_names = {name.encode() for name in file_names}
+        libc = ctypes.CDLL(None, use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1")
+        mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+        if libc.inotify_add_watch(self.fd, directory.encode(), mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f"inotify_add_watch {directory}")
+
+    def _read_events(self):
+        changed = False
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return changed
+            offset = 0
+            while offset + INOTIFY_EVENT_HEADER.size <= len(data):
+                _, _, _, name_len = INOTIFY_EVENT_HEADER.unpack_from(data, offset)
+                offset += INOTIFY_EVENT_HEADER.size
+                name = data[offset : offset + name_len].rstrip(b"\0")
+                offset += name_len
+                if name in self.file_names:
+                    changed = True
+
+    def wait(self, timeout):
+        """True, если файлы статуса изменились за время ожидания."""
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            readable, _, _ = select.select([self.fd], [], [], remaining)
+            if readable and self._read_events():
+                break
+        # OpenVPN пишет файл несколькими вызовами write() — ждём окончания записи
+        while select.select([self.fd], [], [], DEBOUNCE_DELAY)[0]:
+            self._read_events()
+        return True
+
+
+class PollingWatcher:
+    """Запасной вариант: опрос mtime файлов статуса."""
+
+    def __init__(self, paths):
+        self.paths = paths
+        self.fingerprints = self._snapshot()
+
+    def _snapshot(self):
+        fingerprints = {}
+        for path in self.paths:
+            try:
+                st = os.stat(path)
+                fingerprints[path] = (st.st_ino, st.st_size, st.st_mtime_ns)
+            except OSError:
+                fingerprints[path] = None
+        return fingerprints
+
+    def wait(self, timeout):
+        """True, если файлы статуса изменились за время ожидания."""
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(POLL_INTERVAL, remaining))
+            current = self._snapshot()
+            if current != self.fingerprints:
+                self.fingerprints = current
+                time.sleep(DEBOUNCE_DELAY)
+                return True
+
+
+def create_watcher():
+    paths = [log_file for log_file, _ in LOG_FILES]
+    try:
+        watcher = InotifyWatcher(STATUS_DIR, [os.path.basename(p) for p in paths])
+        print(f"Отслеживание {STATUS_DIR} через inotify")
+        return watcher
+    except (OSError, AttributeError) as e:
+        print(f"inotify недоступен ({e}), используется опрос каждые {POLL_INTERVAL} с")
+        return PollingWatcher(paths)
+
+
+def run_daemon():
+    """Резидентный режим: обработка логов сразу после перезаписи файлов статуса."""
+    print("Сбор статистики OpenVPN запущен!")
+    watcher = create_watcher()
+    listeners = [] if "--no-bytecount" in sys.argv[1:] else start_listeners()
+    wait_interval = BYTECOUNT_FLUSH_INTERVAL if listeners else IDLE_INTERVAL
+
+    while True:
+        try:
+            process_logs()
+            flush_bytecount(listeners)
+        except (sqlite3.Error, OSError) as e:
+            print(f"Ошибка при обработке логов: {e}")
+            reset_connection()
+        watcher.wait(wait_interval)
 
 
 if __name__ == "__main__":
-    process_logs()
+    if "--rebuild-rollups" in sys.argv[1:]:
+        rebuild_rollups()
+    elif "--daemon" in sys.argv[1:]:
+        run_daemon()
+    else:
+        process_logs()
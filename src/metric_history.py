@@ -0,0 +1,196 @@
+"""История загрузки CPU/RAM в кольцевых буферах фиксированного размера.
+
+Каждое кольцо хранит время (epoch, int64) и значения CPU/RAM (float32) в
+array без объектов на образец: добавление O(1), выборка периода —
+двоичный поиск и срез. Кроме сырых образцов поддерживаются свёртки по
+минутам, часам и суткам (сутки — по серверному поясу, как в stats_buckets),
+поэтому график любого периода /api/cpu — срез готового ряда без пересчёта.
+Незакрытая корзина свёртки (сумма и число образцов) входит в выборку
+последней точкой.
+
+Сборщик (src/system_stats.py) публикует историю через runtime_state.write_blob
+в двоичном виде (to_bytes); веб-воркеры разбирают её from_bytes без JSON.
+"""
+
+import struct
+from array import array
+
+from src.stats_buckets import day_bucket, hour_bucket, next_day
+
+RAW_CAPACITY = 360  # 1 ч образцов по 10 с
+MINUTE_CAPACITY = 24 * 60
+HOUR_CAPACITY = 31 * 24
+DAY_CAPACITY = 366
+
+RING_HEADER = struct.Struct("=IIIqqddI")  # capacity, head, count, корзина, конец, суммы, n
+FORMAT_VERSION = 1
+
+
+def minute_span(ts):
+    start = int(ts) - int(ts) % 60
+    return start, start + 60
+
+
+def hour_span(ts):
+    start = hour_bucket(ts)
+    return start, start + 3600
+
+
+def day_span(ts):
+    start = day_bucket(ts)
+    return start, next_day(start)
+
+
+class Ring:
+    """Кольцо последних capacity точек (время, cpu, ram) в порядке добавления."""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.times = array("q", bytes(8 * capacity))
+        self.cpu = array("f", bytes(4 * capacity))
+        self.ram = array("f", bytes(4 * capacity))
+        self.head = 0  # Позиция следующей записи
+        self.count = 0
+
+    def append(self, ts, cpu, ram):
+        i = self.head
+        self.times[i] = int(ts)
+        self.cpu[i] = cpu
+        self.ram[i] = ram
+        self.head = (i + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def _index(self, position):
+        """Индекс в массивах для position-й по старшинству точки."""
+        return (self.head - self.count + position) % self.capacity
+
+    def _slice(self, values, start, stop):
+        """Копия values точек с позициями [start, stop) по старшинству."""
+        if stop <= start:
+            return values[:0]
+        first, last = self._index(start), self._index(stop - 1) + 1
+        if first < last:
+            return values[first:last]
+        return values[first:] + values[:last]
+
+    def since(self, cutoff, limit=None):
+        """(время, cpu, ram) точек с временем >= cutoff, не больше limit последних."""
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.times[self._index(mid)] < cutoff:
+                lo = mid + 1
+            else:
+                hi = mid
+        if limit is not None:
+            lo = max(lo, self.count - limit)
+        return tuple(self._slice(values, lo, self.count) for values in (self.times, self.cpu, self.ram))
+
+
+class Rollup(Ring):
+    """Кольцо средних по корзинам; span(ts) -> (начало, конец) корзины."""
+
+    def __init__(self, capacity, span):
+        super().__init__(capacity)
+        self.span = span
+        self.bucket = self.bucket_end = 0
+        self.cpu_sum = self.ram_sum = 0.0
+        self.samples = 0
+
+    def add(self, ts, cpu, ram, weight=1):
+        """Образец в корзину; weight — сколько исходных образцов он представляет."""
+        if self.samples and not self.bucket <= ts < self.bucket_end:
+            self.flush()
+        if not self.samples:
+            self.bucket, self.bucket_end = self.span(ts)
+        self.cpu_sum += cpu * weight
+        self.ram_sum += ram * weight
+        self.samples += weight
+
+    def flush(self):
+        if self.samples:
+            self.append(self.bucket, self.cpu_sum / self.samples, self.ram_sum / self.samples)
+        self.cpu_sum = self.ram_sum = 0.0
+        self.samples = 0
+
+    def since(self, cutoff, limit=None):
+        """Как Ring.since, с незакрытой корзиной последней точкой."""
+        if not self.samples or self.bucket_end <= cutoff:
+            return super().since(cutoff, limit)
+        if limit is not None and limit <= 1:
+            times, cpu, ram = array("q"), array("f"), array("f")
+        else:
+            times, cpu, ram = super().since(cutoff, None if limit is None else limit - 1)
+        times.append(self.bucket)
+        cpu.append(self.cpu_sum / self.samples)
+        ram.append(self.ram_sum / self.samples)
+        return times, cpu, ram
+
+
+class MetricHistory:
+    """Сырые образцы и свёртки по минутам, часам и суткам."""
+
+    def __init__(self):
+        self.raw = Ring(RAW_CAPACITY)
+        self.minutes = Rollup(MINUTE_CAPACITY, minute_span)
+        self.hours = Rollup(HOUR_CAPACITY, hour_span)
+        self.days = Rollup(DAY_CAPACITY, day_span)
+
+    @property
+    def rings(self):
+        return (self.raw, self.minutes, self.hours, self.days)
+
+    def add(self, ts, cpu, ram, raw=True, weight=1):
+        """Образец во все кольца; raw=False — только в свёртки (восстановление из БД),
+        weight — вес образца в свёртках (для сохранённых средних)."""
+        if raw:
+            self.raw.append(ts, cpu, ram)
+        for rollup in self.rings[1:]:
+            rollup.add(ts, cpu, ram, weight)
+
+    def to_bytes(self):
+        parts = [struct.pack("=I", FORMAT_VERSION)]
+        for ring in self.rings:
+            rollup = ring if isinstance(ring, Rollup) else None
+            parts.append(
+                RING_HEADER.pack(
+                    ring.capacity,
+                    ring.head,
+                    ring.count,
+                    rollup.bucket if rollup else 0,
+                    rollup.bucket_end if rollup else 0,
+                    rollup.cpu_sum if rollup else 0.0,
+                    rollup.ram_sum if rollup else 0.0,
+                    rollup.samples if rollup else 0,
+                )
+            )
+            parts.extend((ring.times.tobytes(), ring.cpu.tobytes(), ring.ram.tobytes()))
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """История из to_bytes; ValueError, если формат или размеры не совпадают."""
+        history = cls()
+        view = memoryview(data)
+        if len(view) < 4 or struct.unpack_from("=I", view)[0] != FORMAT_VERSION:
+            raise ValueError("неизвестный формат истории")
+        offset = 4
+        for ring in history.rings:
+            if len(view) < offset + RING_HEADER.size:
+                raise ValueError("история обрезана")
+            capacity, head, count, bucket, bucket_end, cpu_sum, ram_sum, samples = (
+                RING_HEADER.unpack_from(view, offset)
+            )
+            offset += RING_HEADER.size
+            if capacity != ring.capacity or len(view) < offset + 16 * capacity:
+                raise ValueError("размер кольца не совпадает")
+            for name, size in (("times", 8), ("cpu", 4), ("ram", 4)):
+                values = array(getattr(ring, name).typecode)
+                values.frombytes(view[offset:offset + size * capacity])
+                setattr(ring, name, values)
+                offset += size * capacity
+            ring.head, ring.count = head, count
+            if isinstance(ring, Rollup):
+                ring.bucket, ring.bucket_end = bucket, bucket_end
+                ring.cpu_sum, ring.ram_sum, ring.samples = cpu_sum, ram_sum, samples
+        return history
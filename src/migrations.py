@@ -0,0 +1,524 @@
+"""Версионные миграции схем баз данных статистики.
+
+Номер применённой миграции хранится в PRAGMA user_version. Миграция —
+список SQL-операторов или функций conn -> None; уже применённые шаги
+не выполняются повторно, поэтому схема не пересоздаётся на каждый вызов.
+"""
+
+from datetime import datetime
+
+from src.stats_buckets import iso_to_epoch, month_bucket, next_month, server_tz
+from src.stats_tiers import DAILY_TABLE, HOURLY_TABLE, add_samples
+from src.storage import connect
+
+# Базы, уже приведённые к последней версии в этом процессе
+_migrated = set()
+
+# После миграции с переносом данных файл сжимается, если освободилось больше страниц
+VACUUM_FREE_PAGES = 1024
+
+# Строка system_stats — среднее DB_SAVE_INTERVAL / SAMPLE_INTERVAL образцов
+SAVED_AVERAGE_WEIGHT = 30
+
+
+def _add_column_if_missing(table, column, column_type):
+    def step(conn):
+        columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+        if column not in columns:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+
+    return step
+
+
+def _register_time_functions(conn):
+    """SQL-функции перевода текстовых меток времени прежней схемы в epoch."""
+    tz = server_tz()
+    # Меток немного (по одной на час), а строк — на каждого клиента: разбираем один раз
+    cache = {}
+
+    def local_epoch(value, fmt):
+        key = (value, fmt)
+        if key not in cache:
+            try:
+                cache[key] = int(datetime.strptime(value, fmt).replace(tzinfo=tz).timestamp())
+            except (TypeError, ValueError):
+                cache[key] = None
+        return cache[key]
+
+    conn.create_function("local_epoch", 2, local_epoch, deterministic=True)
+    conn.create_function("iso_epoch", 1, iso_to_epoch, deterministic=True)
+
+
+def _copy_openvpn_stats(conn):
+    _register_time_functions(conn)
+    for table in ("daily_stats", "monthly_stats", "yearly_stats"):
+        conn.execute(
+            f"""
+            INSERT OR IGNORE INTO ovpn_clients (client_name, ip_address)
+            SELECT DISTINCT client_name, COALESCE(ip_address, '') FROM {table}
+            WHERE client_name IS NOT NULL
+            """
+        )
+    for old_table, key, fmt, new_table in (
+        ("daily_stats", "hour", "%Y-%m-%d %H:00", "ovpn_hourly"),
+        ("monthly_stats", "month", "%Y-%m-%d", "ovpn_daily"),
+        ("yearly_stats", "month", "%Y-%m", "ovpn_monthly"),
+    ):
+        conn.execute(
+            f"""
+            INSERT INTO {new_table}
+                (bucket, client_id, bytes_received, bytes_sent, connections, last_connected)
+            SELECT local_epoch(o.{key}, ?) AS bucket, c.id,
+                   SUM(COALESCE(o.total_bytes_received, 0)),
+                   SUM(COALESCE(o.total_bytes_sent, 0)),
+                   SUM(COALESCE(o.total_connections, 0)),
+                   MAX(iso_epoch(o.last_connected))
+            FROM {old_table} AS o
+            JOIN ovpn_clients AS c
+                ON c.client_name = o.client_name
+               AND c.ip_address = COALESCE(o.ip_address, '')
+            WHERE bucket IS NOT NULL
+            GROUP BY bucket, c.id
+            """,
+            (fmt,),
+        )
+
+
+def _copy_wg_stats(conn):
+    _register_time_functions(conn)
+    # Первой вставляется самая свежая запись пира — её имя клиента и остаётся
+    for table, key in (
+        ("wg_daily_stats", "date"),
+        ("wg_hourly_stats", "hour"),
+        ("wg_monthly_stats", "month"),
+    ):
+        conn.execute(
+            f"""
+            INSERT OR IGNORE INTO wg_peers (public_key, interface, client)
+            SELECT peer, interface, client FROM {table}
+            ORDER BY {key} DESC
+            """
+        )
+    for old_table, key, fmt, new_table in (
+        ("wg_hourly_stats", "hour", "%Y-%m-%d %H:00", "wg_hourly"),
+        ("wg_daily_stats", "date", "%Y-%m-%d", "wg_daily"),
+        ("wg_monthly_stats", "month", "%Y-%m", "wg_monthly"),
+    ):
+        conn.execute(
+            f"""
+            INSERT INTO {new_table} (bucket, peer_id, received, sent)
+            SELECT local_epoch(o.{key}, ?) AS bucket, p.id, SUM(o.received), SUM(o.sent)
+            FROM {old_table} AS o
+            JOIN wg_peers AS p ON p.public_key = o.peer AND p.interface = o.interface
+            WHERE bucket IS NOT NULL
+            GROUP BY bucket, p.id
+            """,
+            (fmt,),
+        )
+
+
+def _complete_oldest_openvpn_month(conn):
+    """Дополняет самый старый месяц ovpn_daily строкой-остатком на его первые сутки.
+
+    Прежняя очистка удаляла ovpn_daily посуточно, и пересчёт ovpn_monthly
+    из оставшихся дней занижал сумму этого месяца. Остаток по клиенту —
+    разница ovpn_monthly и оставшихся дней.
+    """
+    first = conn.execute("SELECT MIN(bucket) FROM ovpn_daily").fetchone()[0]
+    if first is None or month_bucket(first) == first:
+        return
+    month = month_bucket(first)
+    conn.execute(
+        """
+        INSERT INTO ovpn_daily
+            (bucket, client_id, bytes_received, bytes_sent, connections, last_connected)
+        SELECT m.bucket, m.client_id,
+               MAX(0, m.bytes_received - COALESCE(d.bytes_received, 0)),
+               MAX(0, m.bytes_sent - COALESCE(d.bytes_sent, 0)),
+               MAX(0, m.connections - COALESCE(d.connections, 0)),
+               NULL
+        FROM ovpn_monthly AS m
+        LEFT JOIN (
+            SELECT client_id, SUM(bytes_received) AS bytes_received,
+                   SUM(bytes_sent) AS bytes_sent, SUM(connections) AS connections
+            FROM ovpn_daily
+            WHERE bucket >= ? AND bucket < ?
+            GROUP BY client_id
+        ) AS d ON d.client_id = m.client_id
+        WHERE m.bucket = ?
+          AND (m.bytes_received > COALESCE(d.bytes_received, 0)
+               OR m.bytes_sent > COALESCE(d.bytes_sent, 0)
+               OR m.connections > COALESCE(d.connections, 0))
+        """,
+        (month, next_month(month), month),
+    )
+
+
+def _openvpn_series_table(name):
+    return f"""
+        CREATE TABLE IF NOT EXISTS {name} (
+            bucket INTEGER NOT NULL,
+            client_id INTEGER NOT NULL,
+            bytes_received INTEGER NOT NULL DEFAULT 0,
+            bytes_sent INTEGER NOT NULL DEFAULT 0,
+            connections INTEGER NOT NULL DEFAULT 0,
+            last_connected INTEGER,
+            PRIMARY KEY (bucket, client_id)
+        ) WITHOUT ROWID
+        """
+
+
+def _wg_series_table(name):
+    return f"""
+        CREATE TABLE IF NOT EXISTS {name} (
+            bucket INTEGER NOT NULL,
+            peer_id INTEGER NOT NULL,
+            received INTEGER NOT NULL DEFAULT 0,
+            sent INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (bucket, peer_id)
+        ) WITHOUT ROWID
+        """
+
+
+OPENVPN_LOGS_MIGRATIONS = [
+    # 1: исходная схема
+    [
+        # Основная таблица: почасовая статистика (хранение 30 дней)
+        """
+        CREATE TABLE IF NOT EXISTS daily_stats (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            client_name TEXT,
+            ip_address TEXT,
+            hour TEXT,
+            total_bytes_received INTEGER,
+            total_bytes_sent INTEGER,
+            total_connections INTEGER,
+            last_connected TEXT,
+            UNIQUE(client_name, hour, ip_address)
+        )
+        """,
+        # Агрегированная дневная статистика (хранение 90 дней)
+        """
+        CREATE TABLE IF NOT EXISTS monthly_stats (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            client_name TEXT,
+            ip_address TEXT,
+            month TEXT,
+            total_bytes_received INTEGER,
+            total_bytes_sent INTEGER,
+            total_connections INTEGER,
+            last_connected TEXT,
+            UNIQUE(client_name, month, ip_address)
+        )
+        """,
+        # Агрегированная месячная статистика (хранение 365 дней)
+        """
+        CREATE TABLE IF NOT EXISTS yearly_stats (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            client_name TEXT,
+            ip_address TEXT,
+            month TEXT,
+            total_bytes_received INTEGER,
+            total_bytes_sent INTEGER,
+            total_connections INTEGER,
+            last_connected TEXT,
+            UNIQUE(client_name, month, ip_address)
+        )
+        """,
+        # Журнал подключений
+        """
+        CREATE TABLE IF NOT EXISTS connection_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            client_name TEXT,
+            local_ip TEXT,
+            real_ip TEXT,
+            connected_since DATETIME,
+            bytes_received INTEGER,
+            bytes_sent INTEGER,
+            protocol TEXT
+        )
+        """,
+        # Последнее состояние клиентов
+        """
+        CREATE TABLE IF NOT EXISTS last_client_stats (
+            client_name TEXT,
+            ip_address TEXT,
+            connected_since TEXT,
+            bytes_received INTEGER,
+            bytes_sent INTEGER,
+            PRIMARY KEY (client_name, ip_address)
+        )
+        """,
+        # Водяные отметки инкрементальной агрегации
+        """
+        CREATE TABLE IF NOT EXISTS rollup_state (
+            name TEXT PRIMARY KEY,
+            value TEXT
+        )
+        """,
+        _add_column_if_missing("monthly_stats", "last_connected", "TEXT"),
+    ],
+    # 2: индексы под запросы веб-интерфейса, бота и очистки
+    [
+        "CREATE INDEX IF NOT EXISTS idx_daily_stats_hour ON daily_stats(hour)",
+        "CREATE INDEX IF NOT EXISTS idx_monthly_stats_month ON monthly_stats(month)",
+        "CREATE INDEX IF NOT EXISTS idx_yearly_stats_month ON yearly_stats(month)",
+        "CREATE INDEX IF NOT EXISTS idx_connection_logs_connected_since"
+        " ON connection_logs(connected_since)",
+        "CREATE INDEX IF NOT EXISTS idx_connection_logs_client_since"
+        " ON connection_logs(client_name, connected_since)",
+        # Раньше очистка удаляла такие строки на каждом запуске полным сканированием
+        "DELETE FROM monthly_stats WHERE length(month) != 10",
+    ],
+    # 3: словарь клиентов и целочисленные корзины UTC epoch вместо текстовых ключей.
+    # ovpn_hourly/ovpn_daily/ovpn_monthly заменяют daily_stats/monthly_stats/yearly_stats
+    [
+        """
+        CREATE TABLE IF NOT EXISTS ovpn_clients (
+            id INTEGER PRIMARY KEY,
+            client_name TEXT NOT NULL,
+            ip_address TEXT NOT NULL DEFAULT '',
+            UNIQUE (client_name, ip_address)
+        )
+        """,
+        _openvpn_series_table("ovpn_hourly"),
+        _openvpn_series_table("ovpn_daily"),
+        _openvpn_series_table("ovpn_monthly"),
+        "CREATE INDEX IF NOT EXISTS idx_ovpn_hourly_client ON ovpn_hourly(client_id, bucket)",
+        "CREATE INDEX IF NOT EXISTS idx_ovpn_daily_client ON ovpn_daily(client_id, bucket)",
+        "CREATE INDEX IF NOT EXISTS idx_ovpn_monthly_client ON ovpn_monthly(client_id, bucket)",
+        _copy_openvpn_stats,
+        "DROP TABLE daily_stats",
+        "DROP TABLE monthly_stats",
+        "DROP TABLE yearly_stats",
+        # Водяные отметки прежних таблиц хранили текстовые даты
+        "DELETE FROM rollup_state WHERE name IN ('monthly_stats', 'yearly_stats')",
+    ],
+    # 4: ovpn_daily очищается целыми месяцами; начало самого старого месяца,
+    # удалённое прежней посуточной очисткой, восстанавливается из ovpn_monthly
+    [
+        _complete_oldest_openvpn_month,
+    ],
+]
+
+WG_STATS_MIGRATIONS = [
+    # 1: исходная схема
+    [
+        """
+        CREATE TABLE IF NOT EXISTS wg_daily_stats (
+            date TEXT NOT NULL,
+            peer TEXT NOT NULL,
+            client TEXT NOT NULL,
+            received INTEGER NOT NULL,
+            sent INTEGER NOT NULL,
+            interface TEXT NOT NULL,
+            PRIMARY KEY (date, peer, interface)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS wg_intermediate (
+            peer TEXT NOT NULL,
+            interface TEXT NOT NULL,
+            last_received INTEGER NOT NULL,
+            last_sent INTEGER NOT NULL,
+            date TEXT NOT NULL,
+            PRIMARY KEY (peer, interface)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS wg_total_stats (
+            peer TEXT NOT NULL,
+            client TEXT NOT NULL,
+            total_received INTEGER NOT NULL,
+            total_sent INTEGER NOT NULL,
+            interface TEXT NOT NULL,
+            PRIMARY KEY (peer, interface)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS wg_hourly_stats (
+            hour TEXT NOT NULL,
+            peer TEXT NOT NULL,
+            client TEXT NOT NULL,
+            received INTEGER NOT NULL,
+            sent INTEGER NOT NULL,
+            interface TEXT NOT NULL,
+            PRIMARY KEY (hour, peer, interface)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS wg_monthly_stats (
+            month TEXT NOT NULL,
+            peer TEXT NOT NULL,
+            client TEXT NOT NULL,
+            received INTEGER NOT NULL,
+            sent INTEGER NOT NULL,
+            interface TEXT NOT NULL,
+            PRIMARY KEY (month, peer, interface)
+        )
+        """,
+    ],
+    # 2: индексы для выборок по клиенту и по пиру
+    [
+        "CREATE INDEX IF NOT EXISTS idx_wg_hourly_client_hour ON wg_hourly_stats(client, hour)",
+        "CREATE INDEX IF NOT EXISTS idx_wg_hourly_peer_hour"
+        " ON wg_hourly_stats(peer, interface, hour)",
+        "CREATE INDEX IF NOT EXISTS idx_wg_daily_client_date ON wg_daily_stats(client, date)",
+        "CREATE INDEX IF NOT EXISTS idx_wg_monthly_client_month"
+        " ON wg_monthly_stats(client, month)",
+    ],
+    # 3: словарь пиров и целочисленные корзины UTC epoch вместо текстовых ключей
+    [
+        """
+        CREATE TABLE IF NOT EXISTS wg_peers (
+            id INTEGER PRIMARY KEY,
+            public_key TEXT NOT NULL,
+            interface TEXT NOT NULL,
+            client TEXT NOT NULL DEFAULT 'N/A',
+            UNIQUE (public_key, interface)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_wg_peers_client ON wg_peers(client)",
+        _wg_series_table("wg_hourly"),
+        _wg_series_table("wg_daily"),
+        _wg_series_table("wg_monthly"),
+        "CREATE INDEX IF NOT EXISTS idx_wg_hourly_peer ON wg_hourly(peer_id, bucket)",
+        "CREATE INDEX IF NOT EXISTS idx_wg_daily_peer ON wg_daily(peer_id, bucket)",
+        "CREATE INDEX IF NOT EXISTS idx_wg_monthly_peer ON wg_monthly(peer_id, bucket)",
+        _copy_wg_stats,
+        "DROP TABLE wg_hourly_stats",
+        "DROP TABLE wg_daily_stats",
+        "DROP TABLE wg_monthly_stats",
+    ],
+    # 4: приращения счётчиков от wg_total_stats вместо полуночного снимка wg_intermediate;
+    # счётчики прежнего разбора округлены ("1.23 GiB") и могут превышать настоящие —
+    # первый тик после обновления задаёт точку отсчёта заново
+    [
+        "DROP TABLE IF EXISTS wg_intermediate",
+        "DELETE FROM wg_total_stats",
+    ],
+]
+
+
+def _backfill_system_stats_tiers(conn):
+    tz = server_tz()
+    rows = conn.execute(
+        "SELECT timestamp, cpu_percent, ram_percent FROM system_stats ORDER BY timestamp"
+    ).fetchall()
+    samples = []
+    for ts, cpu, ram in rows:
+        try:
+            epoch = datetime.strptime(ts, "%Y-%m-%d %H:%M:%S").replace(tzinfo=tz).timestamp()
+        except (TypeError, ValueError):
+            continue
+        if cpu is not None and ram is not None:
+            samples.append((epoch, cpu, ram))
+    if samples:
+        add_samples(conn, samples, weight=SAVED_AVERAGE_WEIGHT)
+
+
+SYSTEM_STATS_MIGRATIONS = [
+    # 1: исходная схема
+    [
+        """
+        CREATE TABLE IF NOT EXISTS system_stats (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp DATETIME,
+            cpu_percent REAL,
+            ram_percent REAL
+        )
+        """,
+    ],
+    # 2: выборки графиков и очистка идут по диапазону времени
+    [
+        "CREATE INDEX IF NOT EXISTS idx_system_stats_timestamp ON system_stats(timestamp)",
+    ],
+    # 3: часовые и суточные свёртки (stats_tiers) из уже сохранённых средних
+    [
+        *(
+            f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                bucket INTEGER PRIMARY KEY,
+                samples INTEGER NOT NULL,
+                cpu_min REAL,
+                cpu_sum REAL,
+                cpu_max REAL,
+                cpu_p95 REAL,
+                cpu_hist BLOB,
+                ram_min REAL,
+                ram_sum REAL,
+                ram_max REAL,
+                ram_p95 REAL,
+                ram_hist BLOB
+            )
+            """
+            for table in (HOURLY_TABLE, DAILY_TABLE)
+        ),
+        _backfill_system_stats_tiers,
+    ],
+]
+
+AUDIT_MIGRATIONS = [
+    # 1: исходная схема
+    [
+        """
+        CREATE TABLE IF NOT EXISTS admin_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT NOT NULL,
+            source TEXT NOT NULL,
+            admin_id TEXT NOT NULL,
+            admin_name TEXT NOT NULL,
+            action TEXT NOT NULL,
+            details TEXT DEFAULT '',
+            ip_address TEXT DEFAULT ''
+        )
+        """,
+    ],
+    # 2: фильтр по действию с сортировкой по id и очистка по времени
+    [
+        "CREATE INDEX IF NOT EXISTS idx_admin_log_action_id ON admin_log(action, id)",
+        "CREATE INDEX IF NOT EXISTS idx_admin_log_timestamp ON admin_log(timestamp)",
+    ],
+]
+
+
+def migrate(conn, migrations):
+    """Применяет к подключению миграции, которых ещё нет. Возвращает итоговую версию."""
+    target_version = len(migrations)
+    if conn.execute("PRAGMA user_version").fetchone()[0] >= target_version:
+        return target_version
+
+    # IMMEDIATE: параллельные процессы (воркеры gunicorn, службы) ждут друг друга
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for number, steps in enumerate(migrations, start=1):
+            if number <= version:
+                continue
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(step)
+            conn.execute(f"PRAGMA user_version = {number}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return target_version
+
+
+def migrate_database(db_path, migrations):
+    """Приводит файл БД к последней версии схемы один раз за процесс."""
+    if db_path in _migrated:
+        return
+    conn = connect(db_path)
+    try:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if migrate(conn, migrations) != version:
+            # Перенос данных оставляет свободные страницы старых таблиц
+            if conn.execute("PRAGMA freelist_count").fetchone()[0] > VACUUM_FREE_PAGES:
+                conn.execute("VACUUM")
+    finally:
+        conn.close()
+    _migrated.add(db_path)
@@ -0,0 +1,297 @@
+"""Подписка на поток bytecount management-интерфейса OpenVPN.
+
+OpenVPN принимает только одного клиента management-сокета, поэтому
+подписчик держит соединение сам и пробрасывает разовые команды
+веб-интерфейса и бота через свой прокси-сокет (см. send_openvpn_command).
+"""
+
+import os
+import socket
+import threading
+import time
+
+from src.ovpn_status import IncompleteStatusError, parse_status
+from src.runtime_state import runtime_path, write_state
+from src.ui.constants import OPENVPN_SOCKETS, PROTOCOL_TO_SOCKET
+
+BYTECOUNT_INTERVAL = 2  # Период уведомлений >BYTECOUNT_CLI, в секундах
+STATUS_REFRESH_INTERVAL = 60  # Полное обновление списка клиентов (status 2)
+RATES_PUBLISH_INTERVAL = 1
+RECONNECT_DELAY = 5
+COMMAND_TIMEOUT = 5
+PROXY_GREETING = b">INFO:OpenVPN Management Interface proxy (StatusOpenVPN)\r\n"
+
+
+def get_proxy_path(socket_name):
+    return runtime_path(f"mgmt-{socket_name}.sock")
+
+
+def get_rates_state_name(socket_name):
+    return f"openvpn_rates_{socket_name}.json"
+
+
+class ManagementListener:
+    """Соединение с одним management-сокетом: bytecount, status 2 и прокси команд."""
+
+    def __init__(self, socket_name, protocol):
+        self.socket_name = socket_name
+        self.protocol = protocol
+        self.socket_path = OPENVPN_SOCKETS[socket_name]
+        self.proxy_path = get_proxy_path(socket_name)
+
+        self.sock = None
+        self.connected = threading.Event()
+        self.command_lock = threading.Lock()
+        self.response_done = threading.Event()
+        self.response_lines = []
+        self.refresh_needed = threading.Event()
+
+        # Client ID -> сведения о сессии и последние счётчики
+        self.state_lock = threading.Lock()
+        self.clients = {}
+        self.dirty = set()
+        self.last_publish = 0
+
+    def start(self):
+        threading.Thread(target=self.read_loop, name=f"mgmt-{self.socket_name}", daemon=True).start()
+        threading.Thread(target=self.proxy_loop, name=f"mgmt-proxy-{self.socket_name}", daemon=True).start()
+
+    # --- Соединение с OpenVPN ---
+
+    def read_loop(self):
+        while True:
+            try:
+                self.connect()
+                self.read_notifications()
+            except OSError as e:
+                print(f"Management {self.socket_name}: {e}")
+            self.disconnect()
+            time.sleep(RECONNECT_DELAY)
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(self.socket_path)
+        sock.settimeout(None)
+        self.sock = sock
+        with self.state_lock:
+            self.clients.clear()
+            self.dirty.clear()
+        self.connected.set()
+        self.refresh_needed.set()
+        print(f"Management {self.socket_name}: подключено, bytecount {BYTECOUNT_INTERVAL} с")
+
+    def disconnect(self):
+        self.connected.clear()
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+        self.sock = None
+        # Разбудить ожидающую команду, ответа уже не будет
+        self.response_done.set()
+
+    def read_notifications(self):
+        buffer = b""
+        sock = self.sock
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                raise ConnectionError("соединение закрыто OpenVPN")
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for raw in lines:
+                self.handle_line(raw.rstrip(b"\r").decode("utf-8", errors="replace"))
+            self.publish_rates()
+
+    def handle_line(self, line):
+        if line.startswith(">BYTECOUNT_CLI:"):
+            self.handle_bytecount(line[len(">BYTECOUNT_CLI:"):])
+        elif line.startswith(">"):
+            # >INFO, >CLIENT, >HOLD и прочие асинхронные уведомления
+            return
+        else:
+            self.response_lines.append(line)
+            if line == "END" or line.startswith(("SUCCESS:", "ERROR:")):
+                self.response_done.set()
+
+    def command(self, command):
+        """Выполняет команду management-интерфейса и возвращает ответ целиком."""
+        with self.command_lock:
+            if not self.connected.is_set():
+                return None
+            self.response_lines = []
+            self.response_done.clear()
+            try:
+                self.sock.sendall((command.strip() + "\n").encode())
+            except OSError:
+                return None
+            if not self.response_done.wait(COMMAND_TIMEOUT) or not self.connected.is_set():
+                return None
+            return "\r\n".join(self.response_lines) + "\r\n"
+
+    # --- Учёт трафика ---
+
+    def handle_bytecount(self, payload):
+        parts = payload.split(",")
+        if len(parts) < 3:
+            return
+        try:
+            client_id = int(parts[0])
+            received = int(parts[1])
+            sent = int(parts[2])
+        except ValueError:
+            return
+        now = time.monotonic()
+        with self.state_lock:
+            client = self.clients.get(client_id)
+            if client is None:
+                # Новая сессия: имя и адреса придут с ближайшим status 2
+                self.refresh_needed.set()
+                return
+            elapsed = now - client["sampled_at"] if client["sampled_at"] else 0
+            if elapsed > 0:
+                client["rx_rate"] = max(0, received - client["bytes_received"]) / elapsed
+                client["tx_rate"] = max(0, sent - client["bytes_sent"]) / elapsed
+            if received != client["bytes_received"] or sent != client["bytes_sent"]:
+                self.dirty.add(client_id)
+            client["bytes_received"] = received
+            client["bytes_sent"] = sent
+            client["sampled_at"] = now
+
+    def refresh_clients(self):
+        response = self.command("status 2")
+        if response is None:
+            return
+        try:
+            records = parse_status(response)
+        except IncompleteStatusError:
+            return
+        seen = {}
+        for record in records:
+            if record.client_id is None or not record.connected_iso:
+                continue
+            seen[record.client_id] = {
+                "client_name": record.name,
+                "real_address": record.real_address,
+                "local_ip": record.virtual_address,
+                "connected_since": record.connected_iso,
+                "connected_at": record.connected_at,
+                "bytes_received": record.bytes_received,
+                "bytes_sent": record.bytes_sent,
+            }
+        with self.state_lock:
+            for client_id in list(self.clients):
+                if client_id not in seen:
+                    del self.clients[client_id]
+                    self.dirty.discard(client_id)
+            for client_id, info in seen.items():
+                client = self.clients.get(client_id)
+                if client is None:
+                    self.clients[client_id] = {**info, "rx_rate": 0, "tx_rate": 0, "sampled_at": 0}
+                    self.dirty.add(client_id)
+        self.publish_rates(force=True)
+
+    def publish_rates(self, force=False):
+        now = time.monotonic()
+        if not force and now - self.last_publish < RATES_PUBLISH_INTERVAL:
+            return
+        self.last_publish = now
+        rates = {}
+        with self.state_lock:
+            for client in self.clients.values():
+                rx_rate, tx_rate = rates.get(client["client_name"], (0, 0))
+                rates[client["client_name"]] = (rx_rate + client["rx_rate"], tx_rate + client["tx_rate"])
+        write_state(
+            get_rates_state_name(self.socket_name),
+            {"updated": time.time(), "protocol": self.protocol, "clients": rates},
+        )
+
+    def take_changed(self):
+        """Сессии, чьи счётчики изменились с прошлого вызова."""
+        with self.state_lock:
+            changed = [dict(self.clients[client_id]) for client_id in self.dirty if client_id in self.clients]
+            self.dirty.clear()
+        return changed
+
+    # --- Прокси команд ---
+
+    def proxy_loop(self):
+        # Прокси-сокет существует, только пока есть соединение с OpenVPN:
+        # иначе send_openvpn_command обращается к management-сокету напрямую
+        while True:
+            self.connected.wait()
+            server = self.open_proxy()
+            try:
+                self.serve_proxy(server)
+            except OSError as e:
+                print(f"Прокси {self.socket_name}: {e}")
+            finally:
+                server.close()
+                try:
+                    os.unlink(self.proxy_path)
+                except FileNotFoundError:
+                    pass
+
+    def open_proxy(self):
+        try:
+            os.unlink(self.proxy_path)
+        except FileNotFoundError:
+            pass
+        os.makedirs(os.path.dirname(self.proxy_path), exist_ok=True)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(self.proxy_path)
+        os.chmod(self.proxy_path, 0o600)
+        server.listen(8)
+        # Короткий таймаут: между командами успеваем обновлять список клиентов
+        server.settimeout(BYTECOUNT_INTERVAL)
+        return server
+
+    def serve_proxy(self, server):
+        self.command(f"bytecount {BYTECOUNT_INTERVAL}")
+        last_refresh = 0
+        while self.connected.is_set():
+            now = time.monotonic()
+            if self.refresh_needed.is_set() or now - last_refresh >= STATUS_REFRESH_INTERVAL:
+                self.refresh_needed.clear()
+                last_refresh = now
+                self.refresh_clients()
+            try:
+                conn, _ = server.accept()
+            except socket.timeout:
+                continue
+            self.serve_proxy_client(conn)
+
+    def serve_proxy_client(self, conn):
+        try:
+            conn.settimeout(COMMAND_TIMEOUT)
+            conn.sendall(PROXY_GREETING)
+            request = b""
+            while b"\n" not in request:
+                chunk = conn.recv(4096)
+                if not chunk:
+                    return
+                request += chunk
+            command = request.split(b"\n", 1)[0].decode("utf-8", errors="replace").strip()
+            if command.startswith("bytecount"):
+                # Интервал bytecount принадлежит подписчику
+                response = "ERROR: bytecount is managed by StatusOpenVPN\r\n"
+            else:
+                response = self.command(command) or "ERROR: management interface unavailable\r\n"
+            conn.sendall(response.encode())
+        except OSError:
+            pass
+        finally:
+            conn.close()
+
+
+def start_listeners():
+    """Запускает подписчиков для всех существующих management-сокетов."""
+    listeners = []
+    for protocol, socket_name in PROTOCOL_TO_SOCKET.items():
+        if not os.path.exists(OPENVPN_SOCKETS[socket_name]):
+            continue
+        listener = ManagementListener(socket_name, protocol)
+        listener.start()
+        listeners.append(listener)
+    return listeners
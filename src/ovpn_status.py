@@ -0,0 +1,156 @@
+"""Разбор статуса OpenVPN (status-version 2/3): файлы статуса и ответ `status 2`.
+
+Один разборщик для сборщика статистики, веб-интерфейса, бота и
+management-подписчика. Колонки CLIENT_LIST берутся из строки
+HEADER,CLIENT_LIST, время подключения переводится один раз на каждую
+различную строку, а файл без завершающего END считается недописанным.
+"""
+
+import os
+from collections import namedtuple
+from datetime import datetime, timezone
+
+ClientRecord = namedtuple(
+    "ClientRecord",
+    [
+        "name",
+        "real_address",
+        "virtual_address",
+        "bytes_received",
+        "bytes_sent",
+        "connected_since",  # Как в файле: локальное время сервера
+        "connected_at",  # UTC epoch
+        "connected_iso",  # ISO UTC, ключ сессии в connection_logs и last_client_stats
+        "client_id",
+    ],
+)
+
+# Позиции колонок CLIENT_LIST status-version 2, если строки HEADER нет
+DEFAULT_COLUMNS = {
+    "Common Name": 1,
+    "Real Address": 2,
+    "Virtual Address": 3,
+    "Bytes Received": 5,
+    "Bytes Sent": 6,
+    "Connected Since": 7,
+    "Connected Since (time_t)": 8,
+    "Client ID": 10,
+}
+
+CONNECTED_CACHE_LIMIT = 65536
+
+# Строка времени подключения (или time_t) -> (epoch, ISO UTC)
+_connected_cache = {}
+# Путь -> ((inode, size, mtime_ns), записи) последнего полностью записанного файла
+_file_cache = {}
+
+
+class IncompleteStatusError(ValueError):
+    """Статус без завершающей строки END: OpenVPN ещё пишет файл."""
+
+
+def _connected_time(time_t, since):
+    key = time_t or since
+    cached = _connected_cache.get(key)
+    if cached is None:
+        try:
+            if time_t:
+                epoch = int(time_t)
+            else:
+                epoch = int(datetime.strptime(since, "%Y-%m-%d %H:%M:%S").timestamp())
+            cached = (epoch, datetime.fromtimestamp(epoch, timezone.utc).isoformat())
+        except (TypeError, ValueError, OverflowError, OSError):
+            cached = (None, None)
+        if len(_connected_cache) >= CONNECTED_CACHE_LIMIT:
+            _connected_cache.clear()
+        _connected_cache[key] = cached
+    return cached
+
+
+def _to_int(value):
+    return int(value) if value.isdigit() else 0
+
+
+def parse_status(content):
+    """Возвращает записи ClientRecord из текста или байтов статуса.
+
+    Бросает IncompleteStatusError, если последняя непустая строка — не END.
+    """
+    if isinstance(content, bytes):
+        content = content.decode("utf-8", errors="replace")
+    lines = content.splitlines()
+    while lines and not lines[-1].strip():
+        lines.pop()
+    if not lines or lines[-1].strip() != "END":
+        raise IncompleteStatusError("нет завершающей строки END")
+
+    separator = "\t" if "\t" in lines[0] else ","
+    client_prefix = f"CLIENT_LIST{separator}"
+    header_prefix = f"HEADER{separator}CLIENT_LIST{separator}"
+
+    (name_i, real_i, virtual_i, rx_i, tx_i, since_i, time_t_i, id_i) = DEFAULT_COLUMNS.values()
+    required = max(name_i, real_i, virtual_i, rx_i, tx_i, since_i) + 1
+    records = []
+    for line in lines:
+        if line.startswith(client_prefix):
+            parts = line.split(separator)
+            count = len(parts)
+            if count < required:
+                continue
+            since = parts[since_i]
+            connected_at, connected_iso = _connected_time(
+                parts[time_t_i] if time_t_i < count else None, since
+            )
+            client_id = parts[id_i] if id_i < count else ""
+            records.append(
+                ClientRecord(
+                    parts[name_i],
+                    parts[real_i],
+                    parts[virtual_i],
+                    _to_int(parts[rx_i]),
+                    _to_int(parts[tx_i]),
+                    since,
+                    connected_at,
+                    connected_iso,
+                    int(client_id) if client_id.isdigit() else None,
+                )
+            )
+        elif line.startswith(header_prefix):
+            # Индекс в HEADER на единицу больше: перед CLIENT_LIST стоит HEADER
+            names = line.split(separator)
+            header = {names[i]: i - 1 for i in range(2, len(names))}
+            (name_i, real_i, virtual_i, rx_i, tx_i, since_i, time_t_i, id_i) = (
+                header.get(key, index) for key, index in DEFAULT_COLUMNS.items()
+            )
+            required = max(name_i, real_i, virtual_i, rx_i, tx_i, since_i) + 1
+    return records
+
+
+def read_status_file(path):
+    """Записи файла статуса для читателей (веб-интерфейс, бот).
+
+    Неизменный файл не перечитывается. Если файл сейчас дописывается,
+    возвращается последний полностью записанный снимок (или пустой список).
+    Отсутствующий файл даёт пустой список.
+    """
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        _file_cache.pop(path, None)
+        return []
+    cached = _file_cache.get(path)
+    key = (st.st_ino, st.st_size, st.st_mtime_ns)
+    if cached and cached[0] == key:
+        return cached[1]
+    if not st.st_size:
+        # Файл только что усечён перед перезаписью
+        return cached[1] if cached else []
+
+    with open(path, "rb") as f:
+        content = f.read()
+    try:
+        records = parse_status(content)
+    except IncompleteStatusError:
+        return cached[1] if cached else []
+    _file_cache[path] = (key, records)
+    return records
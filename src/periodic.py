@@ -0,0 +1,121 @@
+"""Периодические задачи на asyncio с дедлайнами вместо schedule.
+
+Задача запускается по сетке start + k * interval (часы loop.time(), монотонные),
+а не «через interval после окончания», поэтому длительность задачи не копит
+дрейф. Если задача не успела к следующему дедлайну, пропущенные тики не
+догоняются пачкой, а учитываются в missed. jitter сдвигает каждый запуск на
+случайные 0..jitter секунд без сдвига самой сетки.
+
+Корутина выполняется в event loop, обычная функция — в потоке исполнителя
+планировщика (по умолчанию один поток: блокирующая работа с SQLite не идёт
+параллельно и не задерживает event loop; workers > 1 — медленные задачи не
+держат быстрые). timeout ограничивает ожидание задачи; поток, занятый
+зависшей функцией, прервать нельзя — следующие вызовы встанут за ней в
+очередь, что видно по timeouts и длительностям в metrics().
+"""
+
+import asyncio
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Job:
+    def __init__(self, name, func, interval, timeout=None, jitter=0.0, run_at_start=True):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.timeout = timeout
+        self.jitter = jitter
+        self.run_at_start = run_at_start
+        self.runs = 0
+        self.missed = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.last_started = None  # epoch
+        self.last_duration = 0.0
+        self.max_duration = 0.0
+        self.total_duration = 0.0
+        self.max_lag = 0.0  # Наибольшее опоздание старта относительно дедлайна
+
+    def metrics(self):
+        return {
+            "interval": self.interval,
+            "runs": self.runs,
+            "missed": self.missed,
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+            "last_started": self.last_started,
+            "last_duration": round(self.last_duration, 4),
+            "avg_duration": round(self.total_duration / self.runs, 4) if self.runs else 0.0,
+            "max_duration": round(self.max_duration, 4),
+            "max_lag": round(self.max_lag, 4),
+        }
+
+
+class Scheduler:
+    def __init__(self, thread_name="periodic", workers=1):
+        self.jobs = []
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=thread_name)
+
+    def add(self, name, func, interval, timeout=None, jitter=0.0, run_at_start=True):
+        job = Job(name, func, interval, timeout, jitter, run_at_start)
+        self.jobs.append(job)
+        return job
+
+    async def run_blocking(self, func, *args):
+        """Выполняет func(*args) в потоке планировщика."""
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    async def _call(self, job):
+        if asyncio.iscoroutinefunction(job.func):
+            return await job.func()
+        return await self.run_blocking(job.func)
+
+    async def _loop(self, job):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + (0 if job.run_at_start else job.interval)
+        while True:
+            delay = deadline - loop.time()
+            if job.jitter:
+                delay += random.uniform(0, job.jitter)
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            started = loop.time()
+            job.max_lag = max(job.max_lag, started - deadline)
+            job.last_started = time.time()
+            try:
+                await asyncio.wait_for(self._call(job), job.timeout)
+            except asyncio.TimeoutError:
+                job.timeouts += 1
+                print(f"Задача {job.name} не завершилась за {job.timeout} с")
+            except Exception as e:
+                job.errors += 1
+                print(f"Ошибка задачи {job.name}: {e}")
+            duration = loop.time() - started
+            job.runs += 1
+            job.last_duration = duration
+            job.total_duration += duration
+            job.max_duration = max(job.max_duration, duration)
+
+            deadline += job.interval
+            finished = loop.time()
+            if finished > deadline:
+                missed = int((finished - deadline) // job.interval) + 1
+                job.missed += missed
+                deadline += missed * job.interval
+                print(
+                    f"Задача {job.name} отстаёт: пропущено тиков {missed} "
+                    f"(выполнялась {duration:.2f} с при интервале {job.interval} с)"
+                )
+
+    def metrics(self):
+        """{имя задачи: счётчики и длительности} для мониторинга отставания."""
+        return {job.name: job.metrics() for job in self.jobs}
+
+    async def run(self):
+        try:
+            await asyncio.gather(*(self._loop(job) for job in self.jobs))
+        finally:
+            self.executor.shutdown(wait=False, cancel_futures=True)
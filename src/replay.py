@@ -0,0 +1,415 @@
+"""Прогон истории через сборщики статистики с подменённым временем.
+
+Снимки статуса OpenVPN и вывод `wg show all dump` проходят через настоящие
+logs.process_logs и wg_stats.tick так быстро, как позволяет SQLite. Часы
+процесса подменяются временем снимка, поэтому год работы сервера, агрегация и сроки хранения проверяются за минуты.
+
+Запуск:
+    python src/replay.py synthetic [--clients N] [--days M] [--step SECONDS]
+    python src/replay.py archive DIR
+
+Общие параметры: --db-dir DIR (сохранить базы, по умолчанию временный каталог),
+--retention-days N, --verbose (не скрывать вывод сборщиков).
+
+Каталог архива:
+    *.status, *-status.log*  — снимки статуса OpenVPN; протокол по имени файла
+                               (antizapret-udp, vpn-tcp, ...), время из строки TIME;
+    *.dump                   — вывод `wg show all dump`; время — первое число
+                               из 9+ цифр в имени файла, иначе mtime;
+    *.conf                   — конфигурации WireGuard для имён клиентов.
+"""
+
+import argparse
+import base64
+import contextlib
+import hashlib
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+
+from datetime import datetime
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+for _path in (BASE_DIR, os.path.dirname(BASE_DIR)):
+    if _path not in sys.path:
+        sys.path.insert(0, _path)
+
+import logs  # noqa: E402
+import wg_stats  # noqa: E402
+from src import runtime_state, storage, wg_collector, wg_config  # noqa: E402
+from src.stats_buckets import date_start, format_bucket, next_day  # noqa: E402
+
+OPENVPN_TABLES = ("ovpn_hourly", "ovpn_daily", "ovpn_monthly")
+WG_TABLES = ("wg_hourly", "wg_daily", "wg_monthly")
+
+STATUS_HEADER = (
+    "HEADER,CLIENT_LIST,Common Name,Real Address,Virtual Address,Virtual IPv6 Address,"
+    "Bytes Received,Bytes Sent,Connected Since,Connected Since (time_t),Username,"
+    "Client ID,Peer ID,Data Channel Cipher"
+)
+
+
+class SimulatedClock:
+    """Подменяет time.time сборщиков временем снимка."""
+
+    def __init__(self, start):
+        self.now = start
+        self._saved = None
+
+    def time(self):
+        return self.now
+
+    def __enter__(self):
+        self._saved = time.time
+        time.time = self.time
+        return self
+
+    def __exit__(self, *exc):
+        time.time = self._saved
+
+
+class StageTimer:
+    """Время, число вызовов и изменённые строки БД по этапам сбора."""
+
+    def __init__(self):
+        self.stages = {}
+        self.nested = set()
+        self._patched = []
+
+    def run(self, label, get_connection, func, *args, rows_of=None, **kwargs):
+        """Вызывает func; строки — изменения БД или rows_of(результат)."""
+        conn = get_connection()
+        changes = conn.total_changes
+        started = time.perf_counter()
+        result = None
+        try:
+            result = func(*args, **kwargs)
+            return result
+        finally:
+            stage = self.stages.setdefault(label, [0, 0.0, 0])
+            stage[0] += 1
+            stage[1] += time.perf_counter() - started
+            stage[2] += rows_of(result) if rows_of else conn.total_changes - changes
+
+    def wrap(self, module, name, label, get_connection, rows_of=None):
+        """Замеряет функцию модуля, которую вызывает другой код этого модуля."""
+        original = getattr(module, name)
+
+        def timed(*args, **kwargs):
+            return self.run(label, get_connection, original, *args, rows_of=rows_of, **kwargs)
+
+        setattr(module, name, timed)
+        self.nested.add(label)
+        self._patched.append((module, name, original))
+
+    def restore(self):
+        for module, name, original in reversed(self._patched):
+            setattr(module, name, original)
+        self._patched.clear()
+
+
+def wg_key(seed):
+    return base64.b64encode(hashlib.sha256(seed.encode()).digest()).decode()
+
+
+def synthetic_ticks(clients, days, step, end):
+    """Снимки для clients клиентов за days суток до момента end.
+
+    Клиенты распределены по файлам статуса logs.LOG_FILES; сессия каждого
+    переподключается раз в сутки, а счётчики WireGuard растут с начала прогона.
+    """
+    start = date_start(datetime.fromtimestamp(end).date()) - days * 86400
+    protocols = [protocol for _, protocol in logs.LOG_FILES]
+    offsets = [i * 7919 % 86400 for i in range(clients)]
+    rates = [1000 + i % 100 * 50 for i in range(clients)]
+    prefixes = [
+        f"CLIENT_LIST,client{i},udp4:198.51.{i // 256 % 256}.{i % 256}:{1024 + i % 60000},"
+        f"10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256},,"
+        for i in range(clients)
+    ]
+    suffixes = [f",UNDEF,{i},{i},AES-256-GCM" for i in range(clients)]
+    keys = [wg_key(f"client{i}") for i in range(clients)]
+    peer_prefixes = [
+        f"vpn\t{keys[i]}\t(none)\t203.0.113.{i % 256}:{1024 + i % 60000}"
+        f"\t10.29.{i // 256 % 256}.{i % 256}/32\t"
+        for i in range(clients)
+    ]
+    wg_header = f"vpn\t{wg_key('server-private')}\t{wg_key('server')}\t51820\toff"
+    since_cache = {}
+
+    def status(ts):
+        lines = {protocol: [] for protocol in protocols}
+        for i in range(clients):
+            connected = ts - (ts - offsets[i]) % 86400
+            since = since_cache.get(connected)
+            if since is None:
+                since = f"{datetime.fromtimestamp(connected):%Y-%m-%d %H:%M:%S}"
+                since_cache[connected] = since
+            rx = (ts - connected) * rates[i]
+            lines[protocols[i % len(protocols)]].append(
+                f"{prefixes[i]}{rx},{rx * 4},{since},{connected}{suffixes[i]}"
+            )
+        head = (
+            "TITLE,OpenVPN 2.6.12 x86_64-pc-linux-gnu\n"
+            f"TIME,{datetime.fromtimestamp(ts):%Y-%m-%d %H:%M:%S},{ts}\n{STATUS_HEADER}\n"
+        )
+        tail = "\nGLOBAL_STATS,Max bcast/mcast queue length,0\nEND\n"
+        return {
+            protocol: (head + "\n".join(rows) + tail).encode()
+            for protocol, rows in lines.items()
+        }
+
+    def dump(ts):
+        uptime = ts - start
+        peers = [
+            f"{peer_prefixes[i]}{ts - i % 120}\t{uptime * rates[i] * 2}\t{uptime * rates[i] * 8}\toff"
+            for i in range(clients)
+        ]
+        return "\n".join([wg_header] + peers)
+
+    day = start
+    while day < end:
+        day_end = next_day(day)
+        for ts in range(day, min(day_end, end), step):
+            yield ts, status(ts), dump(ts)
+        since_cache.clear()
+        day = day_end
+
+
+def _status_protocol(name):
+    for log_file, protocol in sorted(logs.LOG_FILES, key=lambda item: -len(item[0])):
+        stem = os.path.basename(log_file).replace("-status.log", "")
+        if stem in name:
+            return protocol
+    return logs.LOG_FILES[0][1]
+
+
+def _status_time(path):
+    with open(path, "rb") as f:
+        for line in f:
+            if line.startswith(b"TIME"):
+                value = line.strip().split(b"\t" if b"\t" in line else b",")[-1]
+                if value.isdigit():
+                    return int(value)
+                break
+    return int(os.path.getmtime(path))
+
+
+def _dump_time(path):
+    match = re.search(r"\d{9,}", os.path.basename(path))
+    return int(match.group()) if match else int(os.path.getmtime(path))
+
+
+def archive_ticks(directory):
+    """Снимки каталога архива по возрастанию времени; одновременные объединяются."""
+    events = {}
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if not os.path.isfile(path):
+            continue
+        if name.endswith(".status") or "-status.log" in name:
+            events.setdefault(_status_time(path), ({}, []))[0][_status_protocol(name)] = path
+        elif name.endswith(".dump"):
+            events.setdefault(_dump_time(path), ({}, []))[1].append(path)
+
+    for ts in sorted(events):
+        status_paths, dump_paths = events[ts]
+        statuses = {}
+        for protocol, path in status_paths.items():
+            with open(path, "rb") as f:
+                statuses[protocol] = f.read()
+        dump = None
+        if dump_paths:
+            # Несколько снимков за одну секунду — берётся последний по имени
+            with open(sorted(dump_paths)[-1], "r", encoding="utf-8") as f:
+                dump = f.read()
+        yield ts, statuses, dump
+
+
+def archive_client_mapping(directory):
+    mapping = {}
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(".conf"):
+            peers = wg_config.load_config(os.path.join(directory, name))
+            mapping.update((key, peer.client) for key, peer in peers.items() if peer.enabled)
+    return mapping
+
+
+def prepare(db_dir, retention_days):
+    """Перенаправляет сборщики на базы, файлы статуса и оперативное состояние в db_dir."""
+    status_dir = os.path.join(db_dir, "status")
+    os.makedirs(status_dir, exist_ok=True)
+    runtime_state.RUNTIME_DIR = os.path.join(db_dir, "run")
+    logs.LOG_FILES = [
+        (os.path.join(status_dir, os.path.basename(log_file)), protocol)
+        for log_file, protocol in logs.LOG_FILES
+    ]
+    logs.DB_PATH = os.path.join(db_dir, "openvpn_logs.db")
+    logs.FINGERPRINTS_PATH = os.path.join(db_dir, "openvpn_status_fingerprints.json")
+    logs._fingerprints = logs._last_maintenance = None
+    wg_stats.DB_PATH = os.path.join(db_dir, "wireguard_stats.db")
+
+    settings_path = os.path.join(db_dir, "settings.json")
+    if retention_days:
+        with open(settings_path, "w", encoding="utf-8") as f:
+            json.dump({"stats_retention_days": retention_days}, f)
+    logs.SETTINGS_PATH = wg_stats.SETTINGS_PATH = settings_path
+    wg_stats.init_db()
+
+
+def replay(ticks, client_mapping, timer):
+    """Прогоняет снимки через сборщики; возвращает число тиков и диапазон времени."""
+    protocol_paths = {protocol: path for path, protocol in logs.LOG_FILES}
+    current_dump = [""]
+    wg_collector.NETLINK_ENABLED = False
+    wg_collector.read_dump = lambda: current_dump[0]
+    wg_config.client_mapping = lambda interfaces=wg_config.CONFIG_INTERFACES: client_mapping
+
+    wg_stats._last_counters = wg_stats._last_saved = None
+    wg_stats.live_rates = wg_stats.RateBuffer()
+    for name, label in (
+        ("take_snapshot", "wireguard: снимок"),
+        ("publish_rates", "wireguard: скорости"),
+        ("save_wg_stats", "wireguard: приращения"),
+    ):
+        timer.wrap(wg_stats, name, label, wg_stats.get_connection)
+
+    timer.wrap(
+        logs, "collect_changed_logs", "openvpn: разбор статуса", logs.get_connection,
+        rows_of=lambda result: len(result[0]) if result else 0,
+    )
+    for name, label in (
+        ("stage_snapshot", "openvpn: снимок"),
+        ("save_daily_stats", "openvpn: почасовая статистика"),
+        ("save_connection_logs", "openvpn: журнал подключений"),
+        ("cleanup_old_stats", "openvpn: очистка"),
+        ("aggregate_to_monthly", "openvpn: агрегация дней"),
+        ("aggregate_to_yearly", "openvpn: агрегация месяцев"),
+    ):
+        timer.wrap(logs, name, label, logs.get_connection)
+
+    count = 0
+    first = last = last_retention = None
+    with SimulatedClock(0) as clock:
+        for ts, statuses, dump in ticks:
+            clock.now = ts
+            if first is None:
+                first = ts
+            last = ts
+            count += 1
+
+            if statuses:
+                for protocol, content in statuses.items():
+                    path = protocol_paths[protocol]
+                    with open(path, "wb") as f:
+                        f.write(content)
+                    # mtime снимка: отпечаток файла меняется даже при быстрой записи
+                    os.utime(path, ns=(ts * 10**9, ts * 10**9))
+                timer.run("openvpn: process_logs", logs.get_connection, logs.process_logs)
+
+            if dump is not None:
+                current_dump[0] = dump
+                if last_retention is None or ts - last_retention >= wg_stats.RETENTION_INTERVAL:
+                    last_retention = ts
+                    timer.run("wireguard: очистка", wg_stats.get_connection, wg_stats.retention_job)
+                timer.run("wireguard: tick", wg_stats.get_connection, wg_stats.tick)
+    timer.restore()
+    return count, first, last
+
+
+def database_report(db_path, tables):
+    """Размер файла после checkpoint и охват таблиц статистики."""
+    conn = storage.get_connection(db_path)
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    print(
+        f"{os.path.basename(db_path)}: {os.path.getsize(db_path) / 1024 / 1024:.1f} МиБ, "
+        f"свободно {free_pages * page_size / 1024 / 1024:.1f} МиБ"
+    )
+    for table in tables:
+        rows, first, last = conn.execute(
+            f"SELECT COUNT(*), MIN(bucket), MAX(bucket) FROM {table}"
+        ).fetchone()
+        if not rows:
+            print(f"  {table:<14} пусто")
+            continue
+        print(
+            f"  {table:<14} {rows:>9} строк  {format_bucket(first, '%Y-%m-%d %H:%M')} .. "
+            f"{format_bucket(last, '%Y-%m-%d %H:%M')}  ({(last - first) // 86400 + 1} сут.)"
+        )
+
+
+def print_history_report(db_path):
+    conn = storage.get_connection(db_path)
+    rows = conn.execute("SELECT COUNT(*) FROM connection_logs").fetchone()[0]
+    print(f"  {'connection_logs':<14} {rows:>9} строк")
+
+
+def print_report(timer, count, first, last, elapsed):
+    print(
+        f"Тиков: {count}, время снимков {datetime.fromtimestamp(first):%Y-%m-%d %H:%M} .. "
+        f"{datetime.fromtimestamp(last):%Y-%m-%d %H:%M}, прогон {elapsed:.1f} с"
+    )
+    print(f"{'этап':<34} {'вызовов':>8} {'всего, с':>9} {'строк':>10} {'строк/с':>10}")
+    for label, (calls, seconds, rows) in timer.stages.items():
+        rate = rows / seconds if seconds else 0
+        print(f"{label:<34} {calls:>8} {seconds:>9.2f} {rows:>10} {rate:>10.0f}")
+    # Вложенные этапы входят во внешние, итог считается только по внешним
+    top = [stage for label, stage in timer.stages.items() if label not in timer.nested]
+    rows = sum(stage[2] for stage in top)
+    seconds = sum(stage[1] for stage in top)
+    print(f"Итого: {rows} строк за {seconds:.1f} с, {rows / seconds if seconds else 0:.0f} строк/с")
+
+
+def main():
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--db-dir", help="каталог для баз (по умолчанию временный)")
+    common.add_argument("--retention-days", type=int, help="срок хранения статистики, дней")
+    common.add_argument("--verbose", action="store_true", help="показывать вывод сборщиков")
+    parser = argparse.ArgumentParser(description="Прогон истории через сборщики статистики")
+    commands = parser.add_subparsers(dest="command", required=True)
+    synthetic = commands.add_parser("synthetic", parents=[common], help="синтетические снимки")
+    synthetic.add_argument("--clients", type=int, default=100)
+    synthetic.add_argument("--days", type=int, default=365)
+    synthetic.add_argument("--step", type=int, default=3600, help="шаг снимков, секунд")
+    archive = commands.add_parser("archive", parents=[common], help="каталог сохранённых снимков")
+    archive.add_argument("directory")
+    args = parser.parse_args()
+
+    with contextlib.ExitStack() as stack:
+        db_dir = args.db_dir or stack.enter_context(tempfile.TemporaryDirectory())
+        os.makedirs(db_dir, exist_ok=True)
+        prepare(db_dir, args.retention_days)
+
+        if args.command == "synthetic":
+            # Генератор читает часы уже под подменой — конец прогона фиксируется заранее
+            ticks = synthetic_ticks(args.clients, args.days, args.step, int(time.time()))
+            client_mapping = {wg_key(f"client{i}"): f"client{i}" for i in range(args.clients)}
+        else:
+            ticks = archive_ticks(args.directory)
+            client_mapping = archive_client_mapping(args.directory)
+
+        timer = StageTimer()
+        started = time.perf_counter()
+        output = sys.stdout if args.verbose else stack.enter_context(open(os.devnull, "w"))
+        with contextlib.redirect_stdout(output):
+            count, first, last = replay(ticks, client_mapping, timer)
+        elapsed = time.perf_counter() - started
+        if not count:
+            print("Снимков для прогона нет")
+            sys.exit(1)
+
+        print_report(timer, count, first, last, elapsed)
+        database_report(logs.DB_PATH, OPENVPN_TABLES)
+        print_history_report(logs.DB_PATH)
+        database_report(wg_stats.DB_PATH, WG_TABLES)
+        storage.close_connection(logs.DB_PATH)
+        storage.close_connection(wg_stats.DB_PATH)
+
+
+if __name__ == "__main__":
+    main()
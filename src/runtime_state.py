@@ -0,0 +1,79 @@
+"""Обмен оперативным состоянием между службами через файлы в /run.
+
+Сборщики (logs.py, wg_stats.py, system_stats.py) публикуют снимки атомарной
+записью, веб-интерфейс и бот читают их с кэшем по mtime. Снимки — JSON
+(write_state/read_state) или двоичные данные со своим разбором
+(write_blob/read_blob).
+"""
+
+import json
+import os
+import time
+
+RUNTIME_DIR = os.environ.get("STATUSOPENVPN_RUNTIME_DIR", "/run/statusopenvpn")
+
+# {путь: (mtime_ns, данные)}
+_read_cache = {}
+
+
+def runtime_path(name):
+    return os.path.join(RUNTIME_DIR, name)
+
+
+def _write_atomic(name, payload):
+    """Атомарно записывает байты: читатель видит либо старую, либо новую версию."""
+    path = runtime_path(name)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(RUNTIME_DIR, exist_ok=True)
+        with open(tmp_path, "wb") as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+        return True
+    except OSError as e:
+        print(f"Не удалось записать {path}: {e}")
+        return False
+
+
+def _read_cached(name, max_age, decode):
+    path = runtime_path(name)
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    if max_age is not None and time.time() - st.st_mtime > max_age:
+        return None
+
+    cached = _read_cache.get(path)
+    if cached and cached[0] == st.st_mtime_ns:
+        return cached[1]
+    try:
+        with open(path, "rb") as f:
+            data = decode(f.read())
+    except (OSError, ValueError):
+        return None
+    _read_cache[path] = (st.st_mtime_ns, data)
+    return data
+
+
+def write_state(name, data):
+    """Атомарно записывает JSON-снимок."""
+    return _write_atomic(
+        name, json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    )
+
+
+def read_state(name, max_age=None):
+    """Читает JSON-снимок; None, если файла нет или он старше max_age секунд."""
+    return _read_cached(name, max_age, json.loads)
+
+
+def write_blob(name, payload):
+    """Атомарно записывает двоичный снимок."""
+    return _write_atomic(name, payload)
+
+
+def read_blob(name, decode, max_age=None):
+    """decode(байты) снимка, разобранный один раз на версию файла; None, если
+    файла нет, он старше max_age секунд или decode поднял ValueError."""
+    return _read_cached(name, max_age, decode)
@@ -0,0 +1,91 @@
+"""Целочисленные временные корзины таблиц статистики трафика.
+
+Ключ корзины — UTC epoch в секундах. Часовая корзина выровнена по часу UTC,
+дневная и месячная начинаются в полночь по часовому поясу сервера: именно
+по серверным суткам считаются дневные счётчики и сроки хранения.
+"""
+
+from datetime import date, datetime, time, timedelta, timezone
+
+from tzlocal import get_localzone
+
+HOUR = 3600
+
+
+def server_tz():
+    return get_localzone()
+
+
+def hour_bucket(ts):
+    ts = int(ts)
+    return ts - ts % HOUR
+
+
+def hour_ceil(ts):
+    ts = int(ts)
+    return -(-ts // HOUR) * HOUR
+
+
+def date_start(day, tz=None):
+    """Epoch полуночи календарной даты в поясе tz (по умолчанию серверном)."""
+    return int(datetime.combine(day, time.min, tzinfo=tz or server_tz()).timestamp())
+
+
+def day_bucket(ts, tz=None):
+    tz = tz or server_tz()
+    return date_start(datetime.fromtimestamp(ts, tz).date(), tz)
+
+
+def next_day(bucket, tz=None):
+    tz = tz or server_tz()
+    return date_start(datetime.fromtimestamp(bucket, tz).date() + timedelta(days=1), tz)
+
+
+def month_bucket(ts, tz=None):
+    tz = tz or server_tz()
+    return date_start(datetime.fromtimestamp(ts, tz).date().replace(day=1), tz)
+
+
+def next_month(bucket, tz=None):
+    tz = tz or server_tz()
+    day = datetime.fromtimestamp(bucket, tz).date()
+    if day.month == 12:
+        return date_start(date(day.year + 1, 1, 1), tz)
+    return date_start(date(day.year, day.month + 1, 1), tz)
+
+
+def parse_day(day_ymd, tz=None):
+    """'YYYY-MM-DD' -> epoch начала этих суток в поясе tz."""
+    return date_start(datetime.strptime(day_ymd, "%Y-%m-%d").date(), tz)
+
+
+def parse_month(month_ym, tz=None):
+    """'YYYY-MM' -> epoch начала месяца в поясе tz."""
+    return date_start(datetime.strptime(month_ym, "%Y-%m").date(), tz)
+
+
+def hour_window_for_day(day_ymd, tz):
+    """[start, end) часовых корзин, покрывающих календарный день в поясе tz."""
+    start = parse_day(day_ymd, tz)
+    end = date_start(datetime.strptime(day_ymd, "%Y-%m-%d").date() + timedelta(days=1), tz)
+    return hour_bucket(start), hour_ceil(end)
+
+
+def format_bucket(bucket, fmt, tz=None):
+    return datetime.fromtimestamp(bucket, tz or server_tz()).strftime(fmt)
+
+
+def iso_to_epoch(value):
+    """ISO-время (как в connected_since) -> epoch; None, если не разобрать."""
+    if not value:
+        return None
+    try:
+        return int(datetime.fromisoformat(value).timestamp())
+    except (TypeError, ValueError):
+        return None
+
+
+def epoch_to_iso(ts):
+    if ts is None:
+        return None
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat()
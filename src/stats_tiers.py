@@ -0,0 +1,108 @@
+"""Часовые и суточные свёртки system_stats для графиков CPU/RAM.
+
+Каждая строка тира — корзина (stats_buckets: час UTC или серверные сутки)
+с числом образцов, минимумом, суммой, максимумом и оценкой p95 по CPU и RAM.
+p95 считается по гистограмме из HIST_BINS корзин по HIST_WIDTH %, которая
+хранится в строке: новые образцы добавляются к ней при каждом сохранении,
+без перечитывания сырых строк. Точность оценки — ширина корзины гистограммы.
+
+У каждого тира свой срок хранения (TIERS), поэтому график за месяц или год —
+один диапазонный запрос по первичному ключу bucket.
+"""
+
+from array import array
+
+from src.stats_buckets import day_bucket, hour_bucket
+
+HIST_BINS = 50
+HIST_WIDTH = 100 / HIST_BINS
+PERCENTILE = 0.95
+
+HOURLY_TABLE = "system_stats_hourly"
+DAILY_TABLE = "system_stats_daily"
+
+# (таблица, корзина по epoch, срок хранения в днях)
+TIERS = (
+    (HOURLY_TABLE, hour_bucket, 90),
+    (DAILY_TABLE, day_bucket, 5 * 366),
+)
+
+_COLUMNS = (
+    "samples, cpu_min, cpu_sum, cpu_max, cpu_p95, cpu_hist, "
+    "ram_min, ram_sum, ram_max, ram_p95, ram_hist"
+)
+
+
+def percentile(hist, q=PERCENTILE):
+    """Оценка квантиля q по гистограмме (линейно внутри корзины)."""
+    total = sum(hist)
+    if not total:
+        return None
+    target = q * total
+    seen = 0
+    for i, count in enumerate(hist):
+        if count and seen + count >= target:
+            return (i + (target - seen) / count) * HIST_WIDTH
+        seen += count
+    return 100.0
+
+
+def _fold(old, values, weight):
+    """(min, sum, max, p95, hist) метрики после добавления values.
+
+    old — те же поля из строки тира или None для новой корзины.
+    """
+    hist = array("I")
+    if old and old[4] and len(old[4]) == hist.itemsize * HIST_BINS:
+        hist.frombytes(old[4])
+    else:
+        hist.extend([0] * HIST_BINS)
+    low, total, high = min(values), sum(values) * weight, max(values)
+    if old:
+        low, total, high = min(low, old[0]), total + old[1], max(high, old[2])
+    for value in values:
+        hist[min(max(int(value / HIST_WIDTH), 0), HIST_BINS - 1)] += weight
+    # Оценка по гистограмме не выходит за наблюдавшиеся значения
+    p95 = min(max(percentile(hist), low), high)
+    return low, total, high, p95, hist.tobytes()
+
+
+def add_samples(conn, samples, weight=1):
+    """Добавляет образцы (epoch, cpu, ram) в корзины всех тиров.
+
+    weight — сколько исходных образцов представляет каждый (для строк-средних).
+    Транзакцией управляет вызывающий.
+    """
+    for table, bucket_of, _ in TIERS:
+        groups = {}
+        for ts, cpu, ram in samples:
+            groups.setdefault(bucket_of(ts), []).append((cpu, ram))
+        for bucket, values in groups.items():
+            row = conn.execute(
+                f"SELECT {_COLUMNS} FROM {table} WHERE bucket = ?", (bucket,)
+            ).fetchone()
+            merged = []
+            for i, metric_values in enumerate(zip(*values)):
+                merged.extend(_fold(row[1 + 5 * i:6 + 5 * i] if row else None, metric_values, weight))
+            conn.execute(
+                f"INSERT OR REPLACE INTO {table} (bucket, {_COLUMNS}) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (bucket, (row[0] if row else 0) + len(values) * weight, *merged),
+            )
+
+
+def prune(conn, now):
+    """Удаляет корзины старше срока хранения своего тира."""
+    for table, _, days in TIERS:
+        conn.execute(f"DELETE FROM {table} WHERE bucket < ?", (int(now) - days * 86400,))
+
+
+def load_tier(conn, table, since):
+    """Корзины тира, начавшиеся после since (epoch), по возрастанию:
+    (bucket, cpu_avg, cpu_max, cpu_p95, ram_avg, ram_max, ram_p95)."""
+    return conn.execute(
+        "SELECT bucket, cpu_sum / samples, cpu_max, cpu_p95, "
+        f"ram_sum / samples, ram_max, ram_p95 FROM {table} "
+        "WHERE bucket > ? ORDER BY bucket",
+        (int(since),),
+    ).fetchall()
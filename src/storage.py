@@ -0,0 +1,104 @@
+"""Общий доступ к файлам SQLite для веб-интерфейса, сборщиков и бота.
+
+Все подключения открываются в режиме WAL: читатели не блокируют
+запись сборщиков и наоборот. В пределах потока подключение к файлу
+переиспользуется; веб-интерфейс читает через подключения только для чтения.
+
+Файл БД нельзя копировать как есть: часть транзакций лежит в -wal, а
+открытые подключения держат -shm. Копии для бэкапа и восстановление
+идут через backup API SQLite (backup_database, restore_database).
+"""
+
+import os
+import sqlite3
+import threading
+
+BUSY_TIMEOUT = 10  # Ожидание блокировки записи, в секундах
+CACHE_SIZE_KIB = 8192  # Кэш страниц на подключение
+MMAP_SIZE = 64 * 1024 * 1024
+
+_local = threading.local()
+
+
+def _configure(conn, readonly):
+    if not readonly:
+        # Режим журнала сохраняется в файле БД, достаточно включить его при записи
+        conn.execute("PRAGMA journal_mode = WAL")
+    # В WAL режим NORMAL не теряет целостность, только последние транзакции при сбое питания
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KIB}")
+    conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    return conn
+
+
+def connect(db_path, readonly=False):
+    """Новое подключение с настройками WAL. Закрывать должен вызывающий."""
+    if readonly:
+        conn = sqlite3.connect(
+            f"file:{os.path.abspath(db_path)}?mode=ro", uri=True, timeout=BUSY_TIMEOUT
+        )
+    else:
+        conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT)
+    return _configure(conn, readonly)
+
+
+def get_connection(db_path, readonly=False):
+    """Подключение текущего потока к файлу БД, создаётся при первом обращении.
+
+    Подключение не закрывают после использования: транзакции оформляются
+    через `with conn:`, а сам объект живёт до конца потока.
+    """
+    connections = getattr(_local, "connections", None)
+    # После fork (воркеры gunicorn) унаследованные подключения использовать нельзя
+    if connections is None or _local.pid != os.getpid():
+        connections = _local.connections = {}
+        _local.pid = os.getpid()
+
+    key = (db_path, readonly)
+    conn = connections.get(key)
+    if conn is None:
+        conn = connections[key] = connect(db_path, readonly=readonly)
+    return conn
+
+
+def close_connection(db_path, readonly=False):
+    """Закрывает подключение текущего потока, например после ошибки ввода-вывода."""
+    connections = getattr(_local, "connections", None)
+    if not connections or _local.pid != os.getpid():
+        return
+    conn = connections.pop((db_path, readonly), None)
+    if conn is not None:
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+
+def backup_database(db_path, dest_path):
+    """Согласованная копия db_path в dest_path, включая транзакции из -wal.
+
+    Копия — один файл без -wal и -shm.
+    """
+    source = connect(db_path, readonly=True)
+    try:
+        target = sqlite3.connect(dest_path)
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+    finally:
+        source.close()
+
+
+def restore_database(source, db_path):
+    """Заменяет содержимое db_path базой из подключения source.
+
+    Страницы пишутся через SQLite в одной транзакции: подключения других
+    процессов видят новое содержимое, -wal и -shm остаются согласованными.
+    """
+    target = connect(db_path)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
@@ -0,0 +1,154 @@
+"""Сборщик системных метрик панели (служба system_stats).
+
+Один процесс на сервер вместо потоков в каждом воркере gunicorn: снимок
+для главной страницы (CPU, память, диск, сеть, клиенты, службы) и недавние
+образцы CPU/RAM публикуются через runtime_state (tmpfs /run), а средние за
+DB_SAVE_INTERVAL записываются в system_stats. Воркеры только читают
+опубликованное (system_info_service.get_system_info / get_cpu_history),
+поэтому /api/cpu одинаков на всех воркерах.
+
+Каждая метрика снимка опрашивается со своей частотой и своим таймаутом
+(METRICS): CPU и сеть — по разности счётчиков без ожидания, службы — раз в
+15 с, сроки сертификатов — раз в час. Снимок публикуется после каждой
+метрики, первый — когда все метрики отработали хотя бы раз. Длительности и
+пропуски по метрикам публикуются в JOBS_STATE_NAME. Здесь же задача
+identity обновляет сведения о сервере для шапки страниц (identity_service).
+
+Состояния VPN unit, кроме опроса, перечитываются по сигналам systemd
+(systemd_watch.watch_bus): переход unit виден на панели и боту сразу.
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+
+_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _root not in sys.path:
+    sys.path.insert(0, _root)
+
+from src import periodic  # noqa: E402
+from src.metric_history import DAY_CAPACITY, MetricHistory  # noqa: E402
+from src.migrations import SAVED_AVERAGE_WEIGHT  # noqa: E402
+from src.runtime_state import write_blob, write_state  # noqa: E402
+from src.systemd_watch import watch_bus  # noqa: E402
+from src.ui.constants import (  # noqa: E402
+    DB_SAVE_INTERVAL,
+    HOST_STATIC_INFO,
+    SAMPLE_INTERVAL,
+    VPN_SYSTEMD_UNIT_SET,
+)
+from src.ui.services import system_info_service as metrics  # noqa: E402
+from src.ui.services.identity_service import (  # noqa: E402
+    REFRESH_INTERVAL as IDENTITY_INTERVAL,
+    refresh_identity,
+)
+from src.ui.services.stats_service import (  # noqa: E402
+    ensure_db,
+    load_saved_averages,
+    save_minute_average_to_db,
+)
+from src.ui.utils.network_utils import NetworkMeter  # noqa: E402
+
+JOBS_STATE_NAME = "system_stats_jobs.json"
+JOBS_INTERVAL = 60  # Интервал публикации счётчиков задач в секундах
+IDENTITY_TIMEOUT = 60  # Внешний IP и последний релиз запрашиваются по сети
+WORKERS = 3  # Потоков сбора: медленные метрики не задерживают CPU и сеть
+
+cpu_meter = metrics.CpuMeter()
+sample_meter = metrics.CpuMeter()
+network_meter = NetworkMeter()
+
+# (имя, функция, интервал в секундах, таймаут в секундах)
+METRICS = (
+    ("cpu", lambda: metrics.collect_cpu_memory(cpu_meter), 5, 5),
+    ("network", lambda: metrics.collect_network(network_meter), 5, 5),
+    ("clients", metrics.collect_clients, 10, 10),
+    ("services", metrics.collect_services, 15, 30),
+    ("blocked", metrics.collect_blocked, 30, 15),
+    ("disk", metrics.collect_disk, 60, 10),
+    ("uptime", metrics.collect_uptime, 60, 5),
+    ("certs", metrics.collect_certs, 3600, 300),
+)
+
+# Сырые образцы CPU/RAM и свёртки для графиков /api/cpu
+history = MetricHistory()
+_history_lock = threading.Lock()  # Образцы и сохранение средних — в разных потоках сбора
+# Время последнего образца в system_stats: следующее среднее — по образцам после него
+_last_saved_ts = 0
+# Собранный снимок; метрики дописывают в него свои поля
+system_info = {**HOST_STATIC_INFO}
+_pending = {name for name, *_ in METRICS}
+_scheduler = None
+
+
+def metric_job(name, func):
+    """Задача метрики: сбор в потоке исполнителя, слияние и публикация в event loop."""
+
+    async def run():
+        system_info.update(await _scheduler.run_blocking(func))
+        _pending.discard(name)
+        if not _pending:
+            write_state(metrics.SYSTEM_INFO_STATE_NAME, system_info)
+
+    return run
+
+
+def restore_history():
+    """Свёртки после перезапуска — из сохранённых средних: графики за сутки и
+    неделю не начинаются с нуля."""
+    since = time.time() - DAY_CAPACITY * 86400
+    for ts, cpu, ram in load_saved_averages(since):
+        history.add(ts, cpu, ram, raw=False, weight=SAVED_AVERAGE_WEIGHT)
+
+
+def sample_cpu():
+    sample = metrics.take_cpu_sample(sample_meter)
+    with _history_lock:
+        history.add(*sample)
+        payload = history.to_bytes()
+    write_blob(metrics.CPU_HISTORY_STATE_NAME, payload)
+
+
+def save_average():
+    global _last_saved_ts
+    with _history_lock:
+        times, cpu, ram = history.raw.since(_last_saved_ts + 1)
+    saved = save_minute_average_to_db(zip(times, cpu, ram))
+    if saved is not None:
+        _last_saved_ts = saved
+
+
+def publish_jobs():
+    """Длительности, пропуски и таймауты каждой метрики через runtime_state."""
+    write_state(JOBS_STATE_NAME, {"updated": time.time(), "jobs": _scheduler.metrics()})
+
+
+def create_scheduler():
+    global _scheduler
+    _scheduler = periodic.Scheduler(thread_name="system-stats", workers=WORKERS)
+    for name, func, interval, timeout in METRICS:
+        _scheduler.add(name, metric_job(name, func), interval, timeout=timeout)
+    _scheduler.add("sample", sample_cpu, SAMPLE_INTERVAL)
+    _scheduler.add("save", save_average, DB_SAVE_INTERVAL, run_at_start=False)
+    _scheduler.add("jobs", publish_jobs, JOBS_INTERVAL, run_at_start=False)
+    _scheduler.add("identity", refresh_identity, IDENTITY_INTERVAL, timeout=IDENTITY_TIMEOUT)
+    return _scheduler
+
+
+async def run():
+    scheduler = create_scheduler()
+    on_unit_change = metric_job("services", metrics.collect_services)
+    await asyncio.gather(scheduler.run(), watch_bus(VPN_SYSTEMD_UNIT_SET, on_unit_change))
+
+
+def main():
+    print("Сбор системных метрик запущен!")
+    ensure_db()
+    restore_history()
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
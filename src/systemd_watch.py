@@ -0,0 +1,196 @@
+"""Состояние unit systemd для панели и бота одним вызовом systemctl.
+
+Все unit опрашиваются одним `systemctl show -p LoadState,ActiveState,SubState
+u1 u2 ...` вместо `is-active` и `show` на каждый unit. Сборщик system_stats
+опрашивает VPN unit по расписанию и публикует снимок через runtime_state
+(SYSTEMD_STATE_NAME); бот читает этот снимок (read_unit_states) и
+ждёт в нём переходов (wait_for_change), а сам вызывает systemctl, только
+если снимка нет или он устарел.
+
+Переходы можно получать без ожидания опроса: watch_bus держит один
+`busctl monitor` на сигналы PropertiesChanged systemd и сообщает об
+изменениях наблюдаемых unit. Если busctl нет или монитор недоступен,
+остаётся опрос. Сигналы — только повод перечитать состояние: источником
+значений всегда остаётся systemctl show.
+"""
+
+import asyncio
+import json
+import os
+import subprocess
+import time
+
+from src.runtime_state import read_state, write_state
+
+SYSTEMCTL = "/bin/systemctl"
+BUSCTL = "/usr/bin/busctl"
+SYSTEMCTL_TIMEOUT = 8
+PROPERTIES = ("LoadState", "ActiveState", "SubState")
+
+SYSTEMD_STATE_NAME = "systemd_units.json"
+SNAPSHOT_MAX_AGE = 60  # Сборщик обновляет снимок раз в 15 с
+SNAPSHOT_POLL_INTERVAL = 2  # Проверка mtime снимка в wait_for_change
+
+UNIT_PATH_PREFIX = "/org/freedesktop/systemd1/unit/"
+BUS_MATCH = (
+    "type='signal',sender='org.freedesktop.systemd1',"
+    "interface='org.freedesktop.DBus.Properties',member='PropertiesChanged'"
+)
+BUS_DEBOUNCE = 0.3  # Перезапуск unit даёт серию сигналов — перечитываем один раз
+BUS_RETRY_INTERVAL = 60
+BUS_LINE_LIMIT = 1 << 20
+
+
+def unit_name(unit):
+    """Полное имя unit: без суффикса типа systemd подставляет .service."""
+    return unit if "." in unit.rsplit("@", 1)[-1] else f"{unit}.service"
+
+
+def unit_object_path(unit):
+    """Путь объекта unit на шине: символы кроме [A-Za-z0-9] — как _xx."""
+    escaped = "".join(
+        ch if ch.isascii() and ch.isalnum() and not (i == 0 and ch.isdigit()) else f"_{ord(ch):02x}"
+        for i, ch in enumerate(unit_name(unit))
+    )
+    return UNIT_PATH_PREFIX + escaped
+
+
+def parse_show(output, units):
+    """{unit: {свойство: значение}} из вывода systemctl show по units (блоки по порядку)."""
+    text = output.strip("\n")
+    blocks = text.split("\n\n") if text else []
+    if len(blocks) != len(units):
+        raise ValueError(f"systemctl show вернул {len(blocks)} блоков на {len(units)} unit")
+    result = {}
+    for unit, block in zip(units, blocks):
+        props = dict.fromkeys(PROPERTIES, "")
+        for line in block.splitlines():
+            key, sep, value = line.partition("=")
+            if sep and key in props:
+                props[key] = value
+        result[unit] = props
+    return result
+
+
+def query_units(units):
+    """{unit: свойства PROPERTIES} одним вызовом systemctl; None, если вызов не удался."""
+    units = list(units)
+    if not units:
+        return {}
+    try:
+        completed = subprocess.run(
+            [SYSTEMCTL, "show", "-p", ",".join(PROPERTIES), *map(unit_name, units)],
+            capture_output=True,
+            text=True,
+            timeout=SYSTEMCTL_TIMEOUT,
+        )
+    except (FileNotFoundError, subprocess.TimeoutExpired, OSError):
+        return None
+    if completed.returncode != 0:
+        return None
+    try:
+        return parse_show(completed.stdout, units)
+    except ValueError as e:
+        print(f"Не удалось разобрать вывод systemctl show: {e}")
+        return None
+
+
+def publish_unit_states(states):
+    """Публикует свойства unit для других процессов (по полным именам)."""
+    write_state(
+        SYSTEMD_STATE_NAME,
+        {"updated": time.time(), "units": {unit_name(unit): props for unit, props in states.items()}},
+    )
+
+
+def _published(max_age=SNAPSHOT_MAX_AGE):
+    snapshot = read_state(SYSTEMD_STATE_NAME, max_age)
+    return snapshot.get("units", {}) if snapshot else {}
+
+
+def read_unit_states(units):
+    """{unit: свойства} из свежего снимка сборщика, если он покрывает все units,
+    иначе одним вызовом systemctl; None, если systemctl недоступен."""
+    units = list(units)
+    published = _published()
+    if all(unit_name(unit) in published for unit in units):
+        return {unit: published[unit_name(unit)] for unit in units}
+    return query_units(units)
+
+
+async def wait_for_change(units, known, timeout):
+    """Ждёт не дольше timeout секунд, пока свойства одного из units в снимке
+    не отличатся от known ({unit: свойства}). True — при изменении."""
+    deadline = time.monotonic() + timeout
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        await asyncio.sleep(min(SNAPSHOT_POLL_INTERVAL, remaining))
+        published = _published()
+        for unit in units:
+            props = published.get(unit_name(unit))
+            if props is not None and props != known.get(unit):
+                return True
+
+
+async def watch_bus(units, on_change):
+    """Вызывает await on_change() после сигналов PropertiesChanged по units.
+
+    Возвращается сразу, если busctl нет; при обрыве монитора перезапускает
+    его через BUS_RETRY_INTERVAL.
+    """
+    if not os.path.exists(BUSCTL):
+        print(f"{BUSCTL} не найден: состояние служб только по опросу")
+        return
+    paths = {unit_object_path(unit) for unit in units}
+    dirty = asyncio.Event()
+
+    async def notifier():
+        # Сигналы во время on_change не теряются: флаг взводится снова
+        while True:
+            await dirty.wait()
+            await asyncio.sleep(BUS_DEBOUNCE)
+            dirty.clear()
+            try:
+                await on_change()
+            except Exception as e:
+                print(f"Ошибка обработки изменения unit: {e}")
+
+    notify_task = asyncio.create_task(notifier())
+    try:
+        while True:
+            await _monitor_bus(paths, dirty)
+            await asyncio.sleep(BUS_RETRY_INTERVAL)
+    finally:
+        notify_task.cancel()
+
+
+async def _monitor_bus(paths, dirty):
+    """Один запуск busctl monitor: dirty взводится по сигналам объектов paths."""
+    proc = None
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            BUSCTL,
+            "--system",
+            "monitor",
+            "--json=short",
+            f"--match={BUS_MATCH}",
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+            limit=BUS_LINE_LIMIT,
+        )
+        async for line in proc.stdout:
+            try:
+                path = json.loads(line).get("path")
+            except (ValueError, AttributeError):
+                continue
+            if path in paths:
+                dirty.set()
+        print(f"busctl monitor завершился с кодом {await proc.wait()}")
+    except (OSError, ValueError) as e:
+        print(f"Ошибка busctl monitor: {e}")
+    finally:
+        if proc is not None and proc.returncode is None:
+            proc.kill()
+            await proc.wait()
@@ -4,6 +4,9 @@ import os
 import sqlite3
 from datetime import datetime, timedelta
 
+from src.migrations import AUDIT_MIGRATIONS, migrate_database
+from src.storage import get_connection
+
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 AUDIT_DB_PATH = os.path.join(BASE_DIR, "databases", "admin_audit.db")
 
@@ -11,22 +14,10 @@ RETENTION_DAYS = 30
 
 
 def _get_conn():
-    """Получить подключение к БД и создать таблицу при необходимости."""
-    conn = sqlite3.connect(AUDIT_DB_PATH)
+    """Получить подключение потока к БД, при первом вызове применить миграции."""
+    migrate_database(AUDIT_DB_PATH, AUDIT_MIGRATIONS)
+    conn = get_connection(AUDIT_DB_PATH)
     conn.row_factory = sqlite3.Row
-    conn.execute("""
-        CREATE TABLE IF NOT EXISTS admin_log (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp TEXT NOT NULL,
-            source TEXT NOT NULL,
-            admin_id TEXT NOT NULL,
-            admin_name TEXT NOT NULL,
-            action TEXT NOT NULL,
-            details TEXT DEFAULT '',
-            ip_address TEXT DEFAULT ''
-        )
-    """)
-    conn.commit()
     return conn
 
 
@@ -318,7 +318,10 @@ async def _vpn_autorestart_worker(service_unit: str, label: str):
 
 
 async def monitor_vpn_services():
-    """Проверка VPN unit systemd каждые VPN_SERVICE_CHECK_INTERVAL с."""
+    """Проверка VPN unit systemd при переходе в снимке сборщика system_stats,
+    но не реже раза в VPN_SERVICE_CHECK_INTERVAL с."""
+    from src.systemd_watch import wait_for_change
+
     from .config import (
         get_admin_ids,
         VPN_SERVICE_CHECK_INTERVAL,
@@ -326,7 +329,7 @@ async def monitor_vpn_services():
         is_vpn_monitoring_enabled,
         is_vpn_service_monitored,
     )
-    from .server import VPN_MONITORED_SERVICES, get_service_state
+    from .server import VPN_MONITORED_SERVICES, read_service_properties, service_state
     from .keyboards import create_vpn_service_autorestart_cancel_keyboard
     
     bot = get_bot()
@@ -342,6 +345,8 @@ async def monitor_vpn_services():
             clear_vpn_monitor_runtime_state()
             await asyncio.sleep(VPN_SERVICE_CHECK_INTERVAL)
             continue
+        units = [unit for _, unit in VPN_MONITORED_SERVICES]
+        properties = await read_service_properties(units)
         for idx, (label, unit) in enumerate(VPN_MONITORED_SERVICES):
             if not is_vpn_service_monitored(unit):
                 pending = _vpn_pending_restart_tasks.get(unit)
@@ -350,7 +355,7 @@ async def monitor_vpn_services():
                 _vpn_inactive_alert_message_ids.pop(unit, None)
                 _vpn_service_last_state.pop(unit, None)
                 continue
-            state = await get_service_state(unit)
+            state = service_state(properties.get(unit))
             prev = _vpn_service_last_state.get(unit)
 
             if state == "absent":
@@ -394,7 +399,7 @@ async def monitor_vpn_services():
             _vpn_pending_restart_tasks[unit] = task
             _vpn_service_last_state[unit] = state
         
-        await asyncio.sleep(VPN_SERVICE_CHECK_INTERVAL)
+        await wait_for_change(units, properties, VPN_SERVICE_CHECK_INTERVAL)
 
 
 def _get_system_stats_db_path():
@@ -412,12 +417,12 @@ def _check_sustained_high_load(cpu_threshold: int, memory_threshold: int) -> tup
     Проверить, была ли нагрузка выше порога последние 5 минут (по данным БД).
     Возвращает (is_sustained, avg_cpu, avg_ram) или (False, None, None), если порог не превышен.
     """
-    import sqlite3
+    from src.storage import get_connection
     
     db_path = _get_system_stats_db_path()
     
     try:
-        conn = sqlite3.connect(db_path)
+        conn = get_connection(db_path, readonly=True)
         cursor = conn.cursor()
         
         now = datetime.datetime.now()
@@ -434,7 +439,6 @@ def _check_sustained_high_load(cpu_threshold: int, memory_threshold: int) -> tup
         )
         
         rows = cursor.fetchall()
-        conn.close()
         
         if not rows:
             return False, None, None
@@ -1,10 +1,11 @@
 import os
-import sqlite3
 import subprocess
 import shutil
-from datetime import datetime, timedelta
+import time
 
 from src.config import Config
+from src.stats_buckets import day_bucket, format_bucket, next_day
+from src.storage import get_connection
 from src.ui.services.openvpn_service import (
     ensure_client_connect_ban_check_block,
     kick_openvpn_client,
@@ -15,7 +16,6 @@ from src.ui.services.openvpn_service import (
 from src.ui.services.wireguard_service import (
     get_disabled_wg_peers,
     get_wireguard_stats,
-    parse_wireguard_output,
     toggle_peer_config,
 )
 from src.ui.utils.format_utils import format_bytes
@@ -71,7 +71,7 @@ def _get_openvpn_statuses(clients: list[str]) -> dict[str, dict]:
 
 
 def _get_wireguard_statuses(clients: list[str]) -> dict[str, dict]:
-    stats = parse_wireguard_output(get_wireguard_stats(), hide_ip=True, hide_warp=False)
+    stats = get_wireguard_stats(hide_ip=True, hide_warp=False)
     disabled = get_disabled_wg_peers()
     online_map = {}
     for iface in stats:
@@ -101,20 +101,21 @@ def _get_wireguard_statuses(clients: list[str]) -> dict[str, dict]:
 
 
 def _get_openvpn_brief_stats(client_name: str) -> dict:
-    today = datetime.now().strftime("%Y-%m-%d")
-    tomorrow = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d")
+    today = day_bucket(time.time())
+    tomorrow = next_day(today)
     received = 0
     sent = 0
     last_connected = None
-    with sqlite3.connect(Config.LOGS_DATABASE_PATH) as conn:
+    with get_connection(Config.LOGS_DATABASE_PATH, readonly=True) as conn:
         row = conn.execute(
             """
             SELECT
-                COALESCE(SUM(total_bytes_received), 0),
-                COALESCE(SUM(total_bytes_sent), 0),
+                COALESCE(SUM(bytes_received), 0),
+                COALESCE(SUM(bytes_sent), 0),
                 MAX(last_connected)
-            FROM daily_stats
-            WHERE client_name = ? AND hour >= ? AND hour < ?
+            FROM ovpn_hourly
+            WHERE client_id IN (SELECT id FROM ovpn_clients WHERE client_name = ?)
+              AND bucket >= ? AND bucket < ?
             """,
             (client_name, today, tomorrow),
         ).fetchone()
@@ -130,18 +131,20 @@ def _get_openvpn_brief_stats(client_name: str) -> dict:
 
 
 def _get_wireguard_brief_stats(client_name: str) -> dict:
-    today = datetime.now().strftime("%Y-%m-%d")
+    today = day_bucket(time.time())
+    tomorrow = next_day(today)
     received = 0
     sent = 0
     last_activity = None
-    with sqlite3.connect(Config.WG_STATS_PATH) as conn:
+    with get_connection(Config.WG_STATS_PATH, readonly=True) as conn:
         daily = conn.execute(
             """
             SELECT
                 COALESCE(SUM(received), 0),
                 COALESCE(SUM(sent), 0)
-            FROM wg_daily_stats
-            WHERE client = ? AND date = ?
+            FROM wg_daily
+            WHERE peer_id IN (SELECT id FROM wg_peers WHERE client = ?)
+              AND bucket = ?
             """,
             (client_name, today),
         ).fetchone()
@@ -150,11 +153,12 @@ def _get_wireguard_brief_stats(client_name: str) -> dict:
             sent = daily[1] or 0
         hour_row = conn.execute(
             """
-            SELECT MAX(hour)
-            FROM wg_hourly_stats
-            WHERE client = ? AND substr(hour, 1, 10) = ?
+            SELECT MAX(bucket)
+            FROM wg_hourly
+            WHERE peer_id IN (SELECT id FROM wg_peers WHERE client = ?)
+              AND bucket >= ? AND bucket < ?
             """,
-            (client_name, today),
+            (client_name, today, tomorrow),
         ).fetchone()
         if hour_row:
             last_activity = hour_row[0]
@@ -210,7 +214,7 @@ def _set_wireguard_client_block(client_name: str, should_block: bool) -> tuple[b
 
 def _get_wireguard_client_peers(client_name: str) -> list[dict]:
     peers = []
-    active_stats = parse_wireguard_output(get_wireguard_stats(), hide_ip=True, hide_warp=False)
+    active_stats = get_wireguard_stats(hide_ip=True, hide_warp=False)
     for iface in active_stats:
         iface_name = iface.get("interface")
         if not iface_name:
@@ -261,9 +265,12 @@ def _sync_wireguard_interfaces(interfaces: set[str]) -> tuple[bool, str]:
     return True, ""
 
 
-def _format_activity(value: str | None) -> str:
+def _format_activity(value: str | int | None) -> str:
     if not value:
         return "—"
+    if isinstance(value, int):
+        # Корзины статистики хранят UTC epoch
+        return format_bucket(value, "%Y-%m-%d %H:%M")
     val = str(value).strip().replace("T", " ")
     if len(val) >= 16:
         val = val[:16]
@@ -2,7 +2,6 @@
 
 import os
 import re
-import tarfile
 import tempfile
 
 from aiogram import Router, types
@@ -39,6 +38,7 @@ from ..utils import (
 )
 from ..audit import log_action, notify_admins
 from ..client_status_service import get_client_statuses, get_client_brief, set_client_block
+from src.ui.services.backup_service import build_statusopenvpn_backup_archive
 
 router = Router()
 
@@ -545,17 +545,14 @@ async def _send_settings_backup(chat_id: int) -> bool:
 
 
 async def _send_statusopenvpn_backup(chat_id: int) -> bool:
-    sources = _get_statusopenvpn_backup_sources()
-    if not sources:
-        return False
-
     bot = await _get_bot()
     try:
         with tempfile.TemporaryDirectory() as tmpdir:
             archive_path = os.path.join(tmpdir, "StatusOpenVPN-backup.tar.gz")
-            with tarfile.open(archive_path, "w:gz") as archive:
-                for source_path, archive_name in sources:
-                    archive.add(source_path, arcname=archive_name)
+            ok, err = build_statusopenvpn_backup_archive(archive_path)
+            if not ok:
+                print(f"Ошибка создания бэкапа StatusOpenVPN: {err}")
+                return False
             await bot.send_document(
                 chat_id=chat_id,
                 document=FSInputFile(
@@ -568,45 +565,3 @@ async def _send_statusopenvpn_backup(chat_id: int) -> bool:
     except Exception as e:
         print(f"Ошибка отправки бэкапа StatusOpenVPN: {e}")
         return False
-
-
-def _get_statusopenvpn_backup_sources() -> list[tuple[str, str]]:
-    base_dir = os.path.dirname(
-        os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    )
-    candidates = [
-        os.path.join(base_dir, "databases"),
-        base_dir,
-        "/root/StatusOpenVPN-backup",
-    ]
-    sources: list[tuple[str, str]] = []
-    seen = set()
-
-    for candidate in candidates:
-        if os.path.isdir(candidate):
-            for root, _, files in os.walk(candidate):
-                for name in files:
-                    path = os.path.join(root, name)
-                    if candidate.endswith(os.path.join("src", "databases")):
-                        archive_name = os.path.join(
-                            "src",
-                            "databases",
-                            os.path.relpath(path, candidate),
-                        )
-                    elif candidate.endswith("src"):
-                        if not name.endswith(".db"):
-                            continue
-                        archive_name = os.path.join("src", os.path.relpath(path, candidate))
-                    else:
-                        archive_name = os.path.join(os.path.basename(candidate), os.path.relpath(path, candidate))
-                    real_path = os.path.realpath(path)
-                    if real_path not in seen:
-                        seen.add(real_path)
-                        sources.append((path, archive_name))
-        elif os.path.isfile(candidate):
-            real_path = os.path.realpath(candidate)
-            if real_path not in seen:
-                seen.add(real_path)
-                sources.append((candidate, os.path.basename(candidate)))
-
-    return sources
@@ -3,16 +3,19 @@
 import asyncio
 import datetime
 import html
+import time
 from typing import Optional, Tuple
 
+from src.ovpn_status import read_status_file
+from src.systemd_watch import query_units, read_unit_states
+from src.wg_collector import collect, collect_async, is_online
+from src.wg_config import client_mapping
+
 HTOP_TOP_LIMIT = 10
 
 from .utils import (
     get_color_by_percent,
     format_vpn_clients,
-    parse_handshake_time,
-    is_peer_online,
-    read_wg_config,
 )
 
 VPN_MONITORED_SERVICES = [
@@ -118,46 +121,25 @@ async def get_server_stats():
         return f"❌ Ошибка получения статистики: {str(e)}"
 
 
-async def is_systemd_unit_loaded(service_name: str) -> bool:
-    """True, если unit известен systemd (не not-found)."""
-    try:
-        process = await asyncio.create_subprocess_exec(
-            "/bin/systemctl",
-            "show",
-            "-p",
-            "LoadState",
-            "--value",
-            service_name,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE,
-        )
-        stdout, _ = await process.communicate()
-        load_state = stdout.decode().strip()
-        return bool(load_state) and load_state != "not-found"
-    except Exception:
-        return False
+def service_state(props: Optional[dict]) -> str:
+    """Состояние службы по свойствам systemd_watch: absent — unit не известен systemd."""
+    if not props or props["LoadState"] in ("", "not-found"):
+        return "absent"
+    state = props["ActiveState"]
+    if state not in ("active", "inactive", "failed"):
+        return "unknown"
+    return state
+
+
+async def read_service_properties(service_names) -> dict:
+    """Свойства служб из снимка сборщика system_stats или одним вызовом systemctl."""
+    return await asyncio.to_thread(read_unit_states, service_names) or {}
 
 
 async def get_service_state(service_name: str) -> str:
-    """Получить состояние службы systemd."""
-    if not await is_systemd_unit_loaded(service_name):
-        return "absent"
-    try:
-        process = await asyncio.create_subprocess_exec(
-            "/bin/systemctl",
-            "is-active",
-            service_name,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE,
-        )
-        stdout, _ = await process.communicate()
-        state = stdout.decode().strip()
-        
-        if state not in ("active", "inactive", "failed"):
-            return "unknown"
-        return state
-    except Exception:
-        return "unknown"
+    """Текущее состояние службы systemd, без снимка (после перезапуска и т.п.)."""
+    states = await asyncio.to_thread(query_units, [service_name])
+    return service_state(states.get(service_name) if states else None)
 
 
 def get_vpn_monitor_menu_text() -> str:
@@ -188,18 +170,21 @@ async def get_services_status_text():
         "",
     ]
     
+    other = [
+        ("StatusOpenVPN", "StatusOpenVPN.service"),
+        ("Telegram bot", "telegram-bot.service"),
+    ]
+    properties = await read_service_properties(
+        [service for _, service in VPN_MONITORED_SERVICES + other]
+    )
     for label, service in VPN_MONITORED_SERVICES:
-        state = await get_service_state(service)
+        state = service_state(properties.get(service))
         icon = "🟢" if state == "active" else "🔴" if state == "inactive" else "🟡"
         monitor_mark = "✅" if is_vpn_service_monitored(service) else "❌"
         lines.append(f"{monitor_mark} {icon} <b>{label}:</b> {state}")
     lines.extend(["", "<b>⚙️ Службы StatusOpenVPN:</b>", ""])
-    other = [
-        ("StatusOpenVPN", "StatusOpenVPN.service"),
-        ("Telegram bot", "telegram-bot.service"),
-    ]
     for label, service in other:
-        state = await get_service_state(service)
+        state = service_state(properties.get(service))
         icon = "🟢" if state == "active" else "🔴" if state == "inactive" else "🟡"
         lines.append(f"{icon} <b>{label}:</b> {state}")
     return "\n".join(lines)
@@ -243,37 +228,26 @@ def _get_openvpn_online_entries():
     entries = []
     for file_path, protocol in file_paths:
         try:
-            with open(file_path, "r", encoding="utf-8") as file:
-                for line in file:
-                    if not line.startswith("CLIENT_LIST"):
-                        continue
-                    parts = line.strip().split(",")
-                    if len(parts) < 2:
-                        continue
-                    client_name = parts[1].strip()
-                    if not client_name or client_name == "UNDEF":
-                        continue
-                    connected = "—"
-                    if len(parts) > 7:
-                        try:
-                            raw = parts[7].strip()
-                            start_dt = datetime.datetime.strptime(
-                                raw, "%Y-%m-%d %H:%M:%S"
-                            )
-                            connected = _format_connected_dt(start_dt)
-                        except (ValueError, IndexError):
-                            pass
-                    entries.append(
-                        {
-                            "name": client_name,
-                            "protocol": f"OpenVPN · {protocol}",
-                            "connected": connected,
-                        }
-                    )
-        except FileNotFoundError:
-            continue
-        except Exception as e:
+            records = read_status_file(file_path)
+        except OSError as e:
             print(f"Ошибка чтения {file_path}: {e}")
+            continue
+        for record in records:
+            client_name = record.name.strip()
+            if not client_name or client_name == "UNDEF":
+                continue
+            connected = "—"
+            if record.connected_at is not None:
+                connected = _format_connected_dt(
+                    datetime.datetime.fromtimestamp(record.connected_at)
+                )
+            entries.append(
+                {
+                    "name": client_name,
+                    "protocol": f"OpenVPN · {protocol}",
+                    "connected": connected,
+                }
+            )
 
     entries.sort(key=lambda x: (x["name"].lower(), x["protocol"]))
     return entries
@@ -322,42 +296,32 @@ def _wg_online_proto_and_name(
     return "WireGuard", public_key
 
 
-def _parse_wireguard_online_entries(output: str):
-    """Разобрать вывод `wg show` для онлайн-пиров с протоколом и временем handshake."""
+def _wireguard_online_entries(peers):
+    """Онлайн-пиры из `wg show all dump` с протоколом и временем handshake."""
     entries = []
-    lines = (output or "").splitlines()
 
-    vpn_mapping = read_wg_config("/etc/wireguard/vpn.conf")
-    antizapret_mapping = read_wg_config("/etc/wireguard/antizapret.conf")
+    vpn_mapping = client_mapping(("vpn",))
+    antizapret_mapping = client_mapping(("antizapret",))
 
-    current_peer = None
-    current_interface: Optional[str] = None
-    for line in lines:
-        line = line.strip()
-        if line.startswith("interface:"):
-            current_interface = line.split(":", 1)[1].strip()
+    now = time.time()
+    for peer in peers:
+        if not is_online(peer, now):
             continue
-        if line.startswith("peer:"):
-            current_peer = line.split(":", 1)[1].strip()
-            continue
-        if line.startswith("latest handshake:") and current_peer:
-            handshake_raw = line.split(":", 1)[1].strip()
-            handshake_time = parse_handshake_time(handshake_raw)
-            if handshake_time and is_peer_online(handshake_time):
-                proto, name = _wg_online_proto_and_name(
-                    current_peer,
-                    current_interface,
-                    vpn_mapping,
-                    antizapret_mapping,
-                )
-                entries.append(
-                    {
-                        "name": name,
-                        "protocol": proto,
-                        "connected": _format_connected_dt(handshake_time),
-                    }
-                )
-            current_peer = None
+        proto, name = _wg_online_proto_and_name(
+            peer.public_key,
+            peer.interface,
+            vpn_mapping,
+            antizapret_mapping,
+        )
+        entries.append(
+            {
+                "name": name,
+                "protocol": proto,
+                "connected": _format_connected_dt(
+                    datetime.datetime.fromtimestamp(peer.latest_handshake)
+                ),
+            }
+        )
 
     entries.sort(key=lambda x: (x["name"].lower(), x["protocol"]))
     return entries
@@ -366,16 +330,8 @@ def _parse_wireguard_online_entries(output: str):
 async def _get_wireguard_online_entries():
     """Получить список онлайн-клиентов WireGuard с деталями."""
     try:
-        process = await asyncio.create_subprocess_exec(
-            "/usr/bin/wg",
-            "show",
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE,
-        )
-        stdout, _ = await process.communicate()
-        if process.returncode != 0:
-            return []
-        return _parse_wireguard_online_entries(stdout.decode())
+        _, peers = await collect_async()
+        return _wireguard_online_entries(peers)
     except Exception:
         return []
 
@@ -480,9 +436,6 @@ def _format_uptime(uptime_string):
 
 def _count_online_clients():
     """Подсчитать онлайн-клиентов VPN."""
-    import re
-    import subprocess
-    
     total_openvpn = 0
     results = {}
     
@@ -494,35 +447,17 @@ def _count_online_clients():
     ]
     
     try:
-        wg_output = subprocess.check_output(["/usr/bin/wg", "show"], text=True)
-        wg_latest_handshakes = re.findall(r"latest handshake: (.+)", wg_output)
-        
-        online_wg = 0
-        for handshake in wg_latest_handshakes:
-            handshake_str = handshake.strip()
-            if handshake_str == "0 seconds ago":
-                online_wg += 1
-            else:
-                try:
-                    handshake_time = parse_handshake_time(handshake_str)
-                    if handshake_time and is_peer_online(handshake_time):
-                        online_wg += 1
-                except Exception:
-                    continue
+        _, peers = collect()
+        now = time.time()
+        online_wg = sum(1 for peer in peers if is_online(peer, now))
         results["WireGuard"] = online_wg
     except Exception:
         results["WireGuard"] = 0
     
     for path, _ in file_paths:
         try:
-            with open(path, "r", encoding="utf-8") as f:
-                for line in f:
-                    if not line.startswith("CLIENT_LIST,"):
-                        continue
-                    parts = line.split(",", 2)
-                    if len(parts) > 1 and parts[1] != "UNDEF":
-                        total_openvpn += 1
-        except Exception:
+            total_openvpn += sum(1 for record in read_status_file(path) if record.name != "UNDEF")
+        except OSError:
             continue
     
     results["OpenVPN"] = total_openvpn
@@ -2,15 +2,23 @@
 
 import os
 import asyncio
-import datetime
 
 
 _server_ip_cache = None
 
 
 def get_external_ip():
-    """Получить внешний IP-адрес (с кэшированием)."""
+    """Получить внешний IP-адрес (с кэшированием).
+
+    Сначала берётся значение, сохранённое сборщиком system_stats (identity_service),
+    чтобы бот не ходил в сеть и без интернета знал последний IP.
+    """
     global _server_ip_cache
+    from src.ui.services.identity_service import read_identity_file
+
+    saved_ip = read_identity_file().get("external_ip")
+    if saved_ip:
+        return saved_ip
     if _server_ip_cache is not None:
         return _server_ip_cache
     
@@ -150,89 +158,6 @@ def format_vpn_clients(clients_dict):
 └ <b>OpenVPN:</b> {clients_dict['OpenVPN']} шт."""
 
 
-def parse_handshake_time(raw_value: str):
-    """Разобрать строку времени handshake WireGuard."""
-    value = (raw_value or "").strip()
-    if not value:
-        return None
-    if value.lower() == "now":
-        return datetime.datetime.now()
-    if value.lower() in ["never", "n/a", "(none)"]:
-        return None
-    
-    if any(unit in value for unit in ["мин", "час", "сек", "minute", "hour", "second", "day", "week"]):
-        return _parse_relative_time(value)
-    
-    try:
-        return datetime.datetime.strptime(value, "%Y-%m-%d %H:%M:%S")
-    except ValueError:
-        return None
-
-
-def _parse_relative_time(relative_time):
-    """Преобразовать строку относительного времени в datetime."""
-    now = datetime.datetime.now()
-    time_deltas = {"days": 0, "hours": 0, "minutes": 0, "seconds": 0}
-    
-    parts = relative_time.split()
-    i = 0
-    while i < len(parts):
-        try:
-            value = int(parts[i])
-            unit = parts[i + 1]
-            if "д" in unit or "day" in unit:
-                time_deltas["days"] += value
-            elif "ч" in unit or "hour" in unit:
-                time_deltas["hours"] += value
-            elif "мин" in unit or "minute" in unit:
-                time_deltas["minutes"] += value
-            elif "сек" in unit or "second" in unit:
-                time_deltas["seconds"] += value
-            i += 2
-        except (ValueError, IndexError):
-            break
-    
-    delta = datetime.timedelta(
-        days=time_deltas["days"],
-        hours=time_deltas["hours"],
-        minutes=time_deltas["minutes"],
-        seconds=time_deltas["seconds"],
-    )
-    
-    return now - delta
-
-
-def is_peer_online(last_handshake):
-    """Проверить, онлайн ли пир WireGuard."""
-    if not last_handshake:
-        return False
-    return datetime.datetime.now() - last_handshake < datetime.timedelta(minutes=3)
-
-
-def read_wg_config(file_path):
-    """Прочитать привязку клиентов из конфига WireGuard."""
-    client_mapping = {}
-    
-    try:
-        with open(file_path, "r", encoding="utf-8") as file:
-            current_client_name = None
-            
-            for line in file:
-                line = line.strip()
-                
-                if line.startswith("# Client ="):
-                    current_client_name = line.split("=", 1)[1].strip()
-                elif line.startswith("[Peer]"):
-                    current_client_name = current_client_name or "N/A"
-                elif line.startswith("PublicKey =") and current_client_name:
-                    public_key = line.split("=", 1)[1].strip()
-                    client_mapping[public_key] = current_client_name
-    except FileNotFoundError:
-        pass
-    
-    return client_mapping
-
-
 def find_config_file(dir_path: str, pattern) -> str:
     """Найти файл конфигурации по шаблону в каталоге."""
     if not os.path.exists(dir_path):
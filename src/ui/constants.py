@@ -18,10 +18,8 @@ SETUP_DESCRIPTIONS_PATH = os.path.join(BASE_DIR, "src", "setup_descriptions.json
 LEGACY_ADMIN_INFO_PATH = os.path.join(BASE_DIR, "src", "telegram_admins.json")
 
 CACHE_DURATION = 5
-MAX_CPU_HISTORY = 60 * 12
 DB_SAVE_INTERVAL = 300
 SAMPLE_INTERVAL = 10
-MAX_HISTORY_SECONDS = 7 * 24 * 3600
 LIVE_POINTS = 60
 
 BOT_SERVICE_NAME = "telegram-bot"
@@ -1,14 +1,16 @@
-import socket
-
 from flask import render_template, request
 from flask_login import login_required
 
 from src.ui.constants import HOST_STATIC_INFO
 from src.ui.extensions import app
+from src.ui.services.identity_service import (
+    IP_NOT_FOUND,
+    get_identity,
+    get_server_ip,
+    get_update_status,
+)
 from src.ui.services.settings_service import read_settings
-from src.ui.services.system_info_service import get_git_version, get_system_info
-from src.ui.services.update_service import is_update_available
-from src.ui.utils.network_utils import get_external_ip
+from src.ui.services.system_info_service import get_system_info
 
 
 @app.context_processor
@@ -17,11 +19,12 @@ def inject_info():
     app_name = settings_data.get("app_name", "StatusOpenVPN")
     show_ovpn_menu = bool(settings_data.get("show_ovpn_menu", True))
     show_wg_menu = bool(settings_data.get("show_wg_menu", True))
-    update_available, _current, latest_version = is_update_available()
+    identity = get_identity()
+    update_available, current_version, latest_version, _error = get_update_status()
     return {
-        "hostname": socket.gethostname(),
-        "server_ip": get_external_ip(),
-        "version": get_git_version(),
+        "hostname": identity["hostname"],
+        "server_ip": identity["external_ip"] or IP_NOT_FOUND,
+        "version": current_version,
         "update_available": update_available,
         "latest_version": latest_version,
         "base_path": request.script_root or "",
@@ -35,9 +38,9 @@ def inject_info():
 @app.route("/")
 @login_required
 def home():
-    server_ip = get_external_ip()
+    server_ip = get_server_ip() or IP_NOT_FOUND
     system_info = get_system_info() or {**HOST_STATIC_INFO}
-    hostname = socket.gethostname()
+    hostname = get_identity()["hostname"]
 
     return render_template(
         "index.html",
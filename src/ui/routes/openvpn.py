@@ -1,15 +1,24 @@
-import sqlite3
 from collections import OrderedDict
 from datetime import datetime, timedelta
 
 from flask import jsonify, render_template, request
 from flask_login import login_required
-from tzlocal import get_localzone
 from zoneinfo._common import ZoneInfoNotFoundError
 
+from src.stats_buckets import (
+    epoch_to_iso,
+    format_bucket,
+    hour_bucket,
+    hour_window_for_day,
+    parse_day,
+    parse_month,
+)
+from src.storage import get_connection
 from src.ui.constants import MONTH_OPTIONS_RU
 from src.ui.extensions import app
+from src.ui.services.cert_index_service import get_cert_expiries
 from src.ui.services.env_service import get_openvpn_server_ports
+from src.ui.services.identity_service import get_server_ip
 from src.ui.services.openvpn_service import (
     cert_days_left_fields,
     get_all_openvpn_clients,
@@ -27,10 +36,8 @@ from src.ui.utils.format_utils import (
     parse_bytes,
     pluralize_clients,
 )
-from src.ui.utils.network_utils import get_external_ip
 from src.ui.utils.openvpn_naming import clean_client_display_name
 from src.ui.utils.time_utils import (
-    get_server_hour_window_for_client_day,
     parse_date_yyyy_mm_dd,
     resolve_client_timezone,
 )
@@ -70,7 +77,7 @@ def _collect_openvpn_clients_unsorted():
 
     all_clients = get_all_openvpn_clients()
     banned_clients = read_banned_clients()
-    server_ip = get_external_ip()
+    server_ip = get_server_ip()
 
     all_clients_list = []
 
@@ -165,8 +172,9 @@ def _dedupe_openvpn_client_status_rows(rows):
 def _build_openvpn_client_status_sorted(sort_by, order):
     """Список клиентов для страницы статуса: сертификат, сортировка client/status/cert."""
     all_clients_list, _, _, errors, _, _ = _collect_openvpn_clients_unsorted()
+    expiries = get_cert_expiries()
     for row in all_clients_list:
-        exp_dt, exp_label = get_openvpn_client_cert_expiry(row["name"])
+        exp_dt, exp_label = get_openvpn_client_cert_expiry(row["name"], expiries)
         row["cert_expiry_dt"] = exp_dt
         row["cert_expiry_label"] = exp_label
         days_left, days_label = cert_days_left_fields(exp_dt)
@@ -413,7 +421,7 @@ def ovpn_history():
         page = request.args.get("page", 1, type=int)
         per_page = 20
 
-        conn_logs = sqlite3.connect(app.config["LOGS_DATABASE_PATH"])
+        conn_logs = get_connection(app.config["LOGS_DATABASE_PATH"], readonly=True)
 
         filter_clause = "client_name != 'UNDEF'"
         filter_params = []
@@ -441,7 +449,6 @@ def ovpn_history():
                LIMIT ? OFFSET ?""",
             (*filter_params, per_page, offset),
         ).fetchall()
-        conn_logs.close()
 
         hide_ovpn_ip = read_settings().get("hide_ovpn_ip", True)
 
@@ -508,13 +515,13 @@ def ovpn_stats():
             return label
 
         allowed_sorts = {
-            "client_name": "client_name",
-            "client_bytes_sent": "SUM(total_bytes_received)",
-            "client_bytes_received": "SUM(total_bytes_sent)",
-            "last_connected": "MAX(last_connected)",
+            "client_name": "c.client_name",
+            "client_bytes_sent": "SUM(s.bytes_received)",
+            "client_bytes_received": "SUM(s.bytes_sent)",
+            "last_connected": "MAX(s.last_connected)",
         }
 
-        sort_column = allowed_sorts.get(sort_by, "client_name")
+        sort_column = allowed_sorts.get(sort_by, "c.client_name")
         order_sql = "DESC" if order == "desc" else "ASC"
         if period == "day":
             date_from = now.strftime("%Y-%m-%d")
@@ -592,62 +599,44 @@ def ovpn_stats():
         stats_list = []
         total_received, total_sent = 0, 0
 
-        with sqlite3.connect(app.config["LOGS_DATABASE_PATH"]) as conn:
-            if is_single_day:
-                target_date = date_from
-                start_hour, end_hour = get_server_hour_window_for_client_day(
-                    target_date, client_tz
-                )
-                query = f"""
-                    SELECT client_name,
-                           SUM(total_bytes_received),
-                           SUM(total_bytes_sent),
-                           MAX(last_connected)
-                    FROM daily_stats
-                    WHERE hour >= ? AND hour < ?
-                    GROUP BY client_name
-                    ORDER BY {sort_column} {order_sql}
-                """
-                rows = conn.execute(query, (start_hour, end_hour)).fetchall()
-            elif period == "year":
-                year_month_from = year_start.strftime("%Y-%m")
-                query = f"""
-                    SELECT client_name,
-                           SUM(total_bytes_received),
-                           SUM(total_bytes_sent),
-                           MAX(last_connected)
-                    FROM yearly_stats
-                    WHERE month >= ?
-                    GROUP BY client_name
-                    ORDER BY {sort_column} {order_sql}
-                """
-                rows = conn.execute(query, (year_month_from,)).fetchall()
-            elif date_to:
-                query = f"""
-                    SELECT client_name,
-                           SUM(total_bytes_received),
-                           SUM(total_bytes_sent),
-                           MAX(last_connected)
-                    FROM monthly_stats
-                    WHERE month >= ? AND month < ?
-                    GROUP BY client_name
-                    ORDER BY {sort_column} {order_sql}
-                """
-                rows = conn.execute(query, (date_from, date_to)).fetchall()
-            else:
-                query = f"""
-                    SELECT client_name,
-                           SUM(total_bytes_received),
-                           SUM(total_bytes_sent),
-                           MAX(last_connected)
-                    FROM monthly_stats
-                    WHERE month >= ?
-                    GROUP BY client_name
-                    ORDER BY {sort_column} {order_sql}
-                """
-                rows = conn.execute(query, (date_from,)).fetchall()
+        if is_single_day:
+            table = "ovpn_hourly"
+            bucket_from, bucket_to = hour_window_for_day(date_from, client_tz)
+        elif period == "year":
+            table = "ovpn_monthly"
+            bucket_from = parse_month(year_start.strftime("%Y-%m"))
+            bucket_to = None
+        else:
+            table = "ovpn_daily"
+            bucket_from = parse_day(date_from)
+            bucket_to = parse_day(date_to) if date_to else None
+        if bucket_to is None:
+            bucket_to = int(now.timestamp()) + 1
+
+        with get_connection(app.config["LOGS_DATABASE_PATH"], readonly=True) as conn:
+            # Сначала сумма по целочисленному client_id, имена подставляются уже к итогам
+            query = f"""
+                SELECT c.client_name,
+                       SUM(s.bytes_received),
+                       SUM(s.bytes_sent),
+                       MAX(s.last_connected)
+                FROM (
+                    SELECT client_id,
+                           SUM(bytes_received) AS bytes_received,
+                           SUM(bytes_sent) AS bytes_sent,
+                           MAX(last_connected) AS last_connected
+                    FROM {table}
+                    WHERE bucket >= ? AND bucket < ?
+                    GROUP BY client_id
+                ) AS s
+                JOIN ovpn_clients AS c ON c.id = s.client_id
+                GROUP BY c.client_name
+                ORDER BY {sort_column} {order_sql}
+            """
+            rows = conn.execute(query, (bucket_from, bucket_to)).fetchall()
 
             for client_name, received, sent, last_connected in rows:
+                last_connected = epoch_to_iso(last_connected)
                 total_received += received or 0
                 total_sent += sent or 0
                 stats_list.append(
@@ -753,24 +742,36 @@ def api_ovpn_client_chart():
         is_single_day = True
 
     try:
-        with sqlite3.connect(app.config["LOGS_DATABASE_PATH"]) as conn:
+        with get_connection(app.config["LOGS_DATABASE_PATH"], readonly=True) as conn:
             if is_single_day:
-                start_hour, end_hour = get_server_hour_window_for_client_day(
-                    target_date, client_tz
-                )
-                rows = conn.execute(
-                    """
-                    SELECT hour,
-                           SUM(total_bytes_received) as rx,
-                           SUM(total_bytes_sent) as tx
-                    FROM daily_stats
-                    WHERE client_name = ? AND hour >= ? AND hour < ?
-                    GROUP BY hour
-                    ORDER BY hour ASC
-                    """,
-                    (client_name, start_hour, end_hour),
-                ).fetchall()
-                hour_data = {h: (rx or 0, tx or 0) for h, rx, tx in rows}
+                table = "ovpn_hourly"
+                bucket_from, bucket_to = hour_window_for_day(target_date, client_tz)
+            elif period == "year":
+                table = "ovpn_monthly"
+                bucket_from, bucket_to = parse_month(year_month_from), None
+            else:
+                table = "ovpn_daily"
+                bucket_from = parse_day(date_from)
+                bucket_to = parse_day(date_to) if date_to else None
+            if bucket_to is None:
+                bucket_to = int(now.timestamp()) + 1
+
+            rows = conn.execute(
+                f"""
+                SELECT bucket,
+                       SUM(bytes_received) as rx,
+                       SUM(bytes_sent) as tx
+                FROM {table}
+                WHERE client_id IN (SELECT id FROM ovpn_clients WHERE client_name = ?)
+                  AND bucket >= ? AND bucket < ?
+                GROUP BY bucket
+                ORDER BY bucket ASC
+                """,
+                (client_name, bucket_from, bucket_to),
+            ).fetchall()
+
+            if is_single_day:
+                hour_data = {bucket: (rx or 0, tx or 0) for bucket, rx, tx in rows}
                 day_start_client = datetime.strptime(
                     target_date, "%Y-%m-%d"
                 ).replace(tzinfo=client_tz)
@@ -785,59 +786,14 @@ def api_ovpn_client_chart():
 
                 point_dt_client = day_start_client
                 while point_dt_client < display_end_client:
-                    point_dt_server = point_dt_client.astimezone(get_localzone())
-                    server_hour_key = point_dt_server.strftime("%Y-%m-%d %H:00")
                     labels.append(point_dt_client.strftime("%Y-%m-%d %H:00"))
-                    rx, tx = hour_data.get(server_hour_key, (0, 0))
-                    rx_data.append(rx or 0)
-                    tx_data.append(tx or 0)
+                    rx, tx = hour_data.get(hour_bucket(point_dt_client.timestamp()), (0, 0))
+                    rx_data.append(rx)
+                    tx_data.append(tx)
                     point_dt_client += timedelta(hours=1)
-            elif period == "year":
-                rows = conn.execute(
-                    """
-                    SELECT month,
-                           SUM(total_bytes_received) as rx,
-                           SUM(total_bytes_sent) as tx
-                    FROM yearly_stats
-                    WHERE client_name = ? AND month >= ?
-                    GROUP BY month
-                    ORDER BY month ASC
-                    """,
-                    (client_name, year_month_from),
-                ).fetchall()
-                labels = [r[0] for r in rows]
-                rx_data = [r[1] or 0 for r in rows]
-                tx_data = [r[2] or 0 for r in rows]
-            elif date_to:
-                rows = conn.execute(
-                    """
-                    SELECT month,
-                           SUM(total_bytes_received) as rx,
-                           SUM(total_bytes_sent) as tx
-                    FROM monthly_stats
-                    WHERE client_name = ? AND month >= ? AND month < ?
-                    GROUP BY month
-                    ORDER BY month ASC
-                    """,
-                    (client_name, date_from, date_to),
-                ).fetchall()
-                labels = [r[0] for r in rows]
-                rx_data = [r[1] or 0 for r in rows]
-                tx_data = [r[2] or 0 for r in rows]
             else:
-                rows = conn.execute(
-                    """
-                    SELECT month,
-                           SUM(total_bytes_received) as rx,
-                           SUM(total_bytes_sent) as tx
-                    FROM monthly_stats
-                    WHERE client_name = ? AND month >= ?
-                    GROUP BY month
-                    ORDER BY month ASC
-                    """,
-                    (client_name, date_from),
-                ).fetchall()
-                labels = [r[0] for r in rows]
+                label_format = "%Y-%m" if period == "year" else "%Y-%m-%d"
+                labels = [format_bucket(r[0], label_format) for r in rows]
                 rx_data = [r[1] or 0 for r in rows]
                 tx_data = [r[2] or 0 for r in rows]
 
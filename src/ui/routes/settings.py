@@ -40,6 +40,7 @@ from src.ui.services.env_service import (
     read_setup_key_value_file,
     update_env_values,
 )
+from src.ui.services.identity_service import get_update_status
 from src.ui.services.settings_service import (
     get_display_app_name,
     parse_history_max_records,
@@ -53,8 +54,6 @@ from src.ui.services.stats_service import (
     get_ovpn_wg_database_sizes,
 )
 from src.ui.services.update_service import (
-    get_latest_github_version,
-    is_update_available,
     is_update_running,
     read_update_log_tail,
     start_silent_update,
@@ -548,10 +547,7 @@ def settings_audit():
 def settings_update():
     update_message = None
     update_error = None
-    update_available, current_version, latest_version = is_update_available()
-    github_error = None
-    if not latest_version:
-        latest_version, github_error = get_latest_github_version()
+    update_available, current_version, latest_version, github_error = get_update_status()
 
     if request.method == "POST":
         if is_update_running():
@@ -593,7 +589,7 @@ def settings_update():
 @app.route("/api/settings/update/status")
 @login_required
 def api_settings_update_status():
-    update_available, current_version, latest_version = is_update_available()
+    update_available, current_version, latest_version, _error = get_update_status()
     return jsonify(
         {
             "update_available": update_available,
@@ -1,19 +1,22 @@
 import json
 import os
-import sqlite3
 import subprocess
 import time
-from datetime import datetime, timedelta, timezone
+from datetime import datetime, timezone
 
 from flask import jsonify, request
 from flask_login import login_required
 
+from src.stats_tiers import DAILY_TABLE, HOURLY_TABLE
 from src.ui.constants import LIVE_POINTS, VPN_SYSTEMD_UNIT_SET
 from src.ui.extensions import app
-from src.ui.services.stats_service import group_rows, resample_to_n
-from src.ui.services.system_info_service import get_system_info, get_vnstat_interfaces
+from src.ui.services.system_info_service import (
+    get_cpu_history,
+    get_system_info,
+    get_vnstat_interfaces,
+)
+from src.ui.services.stats_service import load_stats_tier
 from src.ui.services.vpn_service import restart_vpn_systemd_unit
-from src.ui.state import cpu_history
 
 
 @app.route("/api/system_info")
@@ -217,95 +220,54 @@ def api_interfaces():
     return jsonify({"interfaces": interfaces})
 
 
-@app.route("/api/cpu")
-def api_cpu():
-    period = request.args.get("period", "live")
-    now = datetime.now()
+# Период графика: (кольцо MetricHistory, длительность в секундах, число точек,
+# тир stats_tiers в БД или None — только кольцо в памяти)
+CPU_PERIODS = {
+    "live": ("raw", None, LIVE_POINTS, None),
+    "hour": ("minutes", 3600, 60, None),
+    "day": ("hours", 86400, 24, HOURLY_TABLE),
+    "week": ("days", 7 * 86400, 7, DAILY_TABLE),
+    "month": ("days", 30 * 86400, 30, DAILY_TABLE),
+    "year": ("days", 365 * 86400, 365, DAILY_TABLE),
+}
 
-    targets = {
-        "live": LIVE_POINTS,
-        "hour": 60,
-        "day": 24,
-        "week": 7,
-        "month": 30,
-    }
-    max_points = targets.get(period, LIVE_POINTS)
 
-    mem_rows = list(cpu_history)
+def _round_all(values):
+    return [round(value, 2) for value in values]
 
-    if period == "live":
-        last = mem_rows[-LIVE_POINTS:] if len(mem_rows) > LIVE_POINTS else mem_rows
-
-        data = [
-            {"timestamp": r["timestamp"], "cpu": r["cpu"], "ram": r["ram"]}
-            for r in last
-        ]
 
+@app.route("/api/cpu")
+def api_cpu():
+    period = request.args.get("period", "live")
+    if period not in CPU_PERIODS:
+        period = "live"
+    ring_name, duration, max_points, tier = CPU_PERIODS[period]
+    cutoff = time.time() - duration if duration else 0
+
+    result = {"period": period}
+    rows = load_stats_tier(tier, cutoff) if tier else None
+    if rows:
+        times, cpu, cpu_max, cpu_p95, ram, ram_max, ram_p95 = zip(*rows[-max_points:])
+        result.update(
+            cpu_max=_round_all(cpu_max),
+            cpu_p95=_round_all(cpu_p95),
+            ram_max=_round_all(ram_max),
+            ram_p95=_round_all(ram_p95),
+        )
     else:
-        if period == "hour":
-            bucket = "minute"
-            cutoff = now - timedelta(hours=1)
-        elif period == "day":
-            bucket = "hour"
-            cutoff = now - timedelta(days=1)
-        elif period == "week":
-            bucket = "day"
-            cutoff = now - timedelta(days=7)
-        elif period == "month":
-            bucket = "day"
-            cutoff = now - timedelta(days=30)
-        else:
-            bucket = "minute"
-            cutoff = now - timedelta(hours=1)
-
-        mem_candidates = [r for r in mem_rows if r["timestamp"] >= cutoff]
-        need_db = True
-        if need_db:
-            try:
-                conn = sqlite3.connect(app.config["SYSTEM_STATS_PATH"])
-                cur = conn.cursor()
-
-                cur.execute(
-                    """
-                    SELECT timestamp, cpu_percent, ram_percent
-                    FROM system_stats
-                    WHERE timestamp >= ?
-                    ORDER BY timestamp ASC
-                """,
-                    (cutoff.strftime("%Y-%m-%d %H:%M:%S"),),
-                )
-
-                rows = cur.fetchall()
-                conn.close()
-
-                source_rows = [
-                    {
-                        "timestamp": datetime.strptime(ts, "%Y-%m-%d %H:%M:%S"),
-                        "cpu": cpu,
-                        "ram": ram,
-                    }
-                    for ts, cpu, ram in rows
-                ]
-
-            except Exception as e:
-                print("[DB ERROR] api_cpu:", e)
-                source_rows = mem_candidates
+        # Тира нет или он ещё пуст (первые минуты после установки) — кольца сборщика
+        history = get_cpu_history()
+        if history is None:
+            times = cpu = ram = ()
         else:
-            source_rows = mem_candidates
-
-        grouped = group_rows(source_rows, interval=bucket)
-        data = resample_to_n(grouped, max_points)
-
-    utc_labels = [
-        d["timestamp"].astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
-        for d in data
-    ]
-
-    return jsonify(
-        {
-            "utc_labels": utc_labels,
-            "cpu_percent": [round(d["cpu"], 2) for d in data],
-            "ram_percent": [round(d["ram"], 2) for d in data],
-            "period": period,
-        }
+            times, cpu, ram = getattr(history, ring_name).since(cutoff, max_points)
+
+    result.update(
+        utc_labels=[
+            datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+            for ts in times
+        ],
+        cpu_percent=_round_all(cpu),
+        ram_percent=_round_all(ram),
     )
+    return jsonify(result)
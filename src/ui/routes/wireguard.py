@@ -1,14 +1,20 @@
 import os
 import re
 import shutil
-import sqlite3
 import subprocess
 from datetime import datetime, timedelta
 
 from flask import jsonify, redirect, render_template, request, url_for
 from flask_login import current_user, login_required
-from tzlocal import get_localzone
 
+from src.stats_buckets import (
+    format_bucket,
+    hour_bucket,
+    hour_window_for_day,
+    parse_day,
+    parse_month,
+)
+from src.storage import get_connection
 from src.tg_bot.audit import log_action
 from src.ui.constants import CLIENT_SH_PATH, MONTH_OPTIONS_RU
 from src.ui.extensions import app
@@ -16,14 +22,12 @@ from src.ui.services.settings_service import read_settings
 from src.ui.services.wireguard_service import (
     get_disabled_wg_peers,
     get_wireguard_stats,
-    parse_wireguard_output,
     rename_client_in_wg_configs,
     toggle_peer_config,
 )
 from src.ui.utils.wireguard_naming import wg_client_name_param_ok
 from src.ui.utils.format_utils import format_bytes
 from src.ui.utils.time_utils import (
-    get_server_hour_window_for_client_day,
     parse_date_yyyy_mm_dd,
     resolve_client_timezone,
 )
@@ -37,9 +41,7 @@ def wg():
     hide_wg_ip = settings_data.get("hide_wg_ip", True)
     hide_warp = bool(settings_data.get("hide_wg_warp_interface", False))
     shorten_wg_filenames = bool(settings_data.get("shorten_wg_filenames", False))
-    stats = parse_wireguard_output(
-        get_wireguard_stats(), hide_ip=hide_wg_ip, hide_warp=hide_warp
-    )
+    stats = get_wireguard_stats(hide_ip=hide_wg_ip, hide_warp=hide_warp)
     disabled_peers = get_disabled_wg_peers()
     for interface_data in stats:
         for peer in interface_data.get("peers", []):
@@ -71,9 +73,7 @@ def api_wg_stats():
         settings_data = read_settings()
         hide_wg_ip = settings_data.get("hide_wg_ip", True)
         hide_warp = bool(settings_data.get("hide_wg_warp_interface", False))
-        stats = parse_wireguard_output(
-            get_wireguard_stats(), hide_ip=hide_wg_ip, hide_warp=hide_warp
-        )
+        stats = get_wireguard_stats(hide_ip=hide_wg_ip, hide_warp=hide_warp)
         disabled_peers = get_disabled_wg_peers()
         for interface_data in stats:
             for peer in interface_data.get("peers", []):
@@ -394,12 +394,12 @@ def wg_stats():
             return label
 
         allowed_sorts = {
-            "client": "client",
-            "total_sent": "SUM(sent)",
-            "total_received": "SUM(received)",
+            "client": "p.client",
+            "total_sent": "SUM(s.sent)",
+            "total_received": "SUM(s.received)",
         }
 
-        sort_column = allowed_sorts.get(sort_by, "client")
+        sort_column = allowed_sorts.get(sort_by, "p.client")
         order_sql = "DESC" if order == "desc" else "ASC"
         if period == "day":
             date_from = now.strftime("%Y-%m-%d")
@@ -477,64 +477,39 @@ def wg_stats():
         stats_list = []
         total_received, total_sent = 0, 0
 
-        with sqlite3.connect(app.config["WG_STATS_PATH"]) as conn:
-            if is_single_day:
-                target_date = date_from
-                start_hour, end_hour = get_server_hour_window_for_client_day(
-                    target_date, client_tz
-                )
-                query = f"""
-                    SELECT client,
-                           SUM(received) as total_received,
-                           SUM(sent) as total_sent
-                    FROM wg_hourly_stats
-                    WHERE hour >= ? AND hour < ?
-                      AND interface != 'warp'
-                    GROUP BY client
-                    HAVING SUM(received) > 0 OR SUM(sent) > 0
-                    ORDER BY {sort_column} {order_sql}
-                """
-                rows = conn.execute(query, (start_hour, end_hour)).fetchall()
-            elif period == "year":
-                year_month_from = year_start.strftime("%Y-%m")
-                query = f"""
-                    SELECT client,
-                           SUM(received) as total_received,
-                           SUM(sent) as total_sent
-                    FROM wg_monthly_stats
-                    WHERE month >= ?
-                      AND interface != 'warp'
-                    GROUP BY client
-                    HAVING SUM(received) > 0 OR SUM(sent) > 0
-                    ORDER BY {sort_column} {order_sql}
-                """
-                rows = conn.execute(query, (year_month_from,)).fetchall()
-            elif date_to:
-                query = f"""
-                    SELECT client,
-                           SUM(received) as total_received,
-                           SUM(sent) as total_sent
-                    FROM wg_daily_stats
-                    WHERE date >= ? AND date < ?
-                      AND interface != 'warp'
-                    GROUP BY client
-                    HAVING SUM(received) > 0 OR SUM(sent) > 0
-                    ORDER BY {sort_column} {order_sql}
-                """
-                rows = conn.execute(query, (date_from, date_to)).fetchall()
-            else:
-                query = f"""
-                    SELECT client,
-                           SUM(received) as total_received,
-                           SUM(sent) as total_sent
-                    FROM wg_daily_stats
-                    WHERE date >= ?
-                      AND interface != 'warp'
-                    GROUP BY client
-                    HAVING SUM(received) > 0 OR SUM(sent) > 0
-                    ORDER BY {sort_column} {order_sql}
-                """
-                rows = conn.execute(query, (date_from,)).fetchall()
+        if is_single_day:
+            table = "wg_hourly"
+            bucket_from, bucket_to = hour_window_for_day(date_from, client_tz)
+        elif period == "year":
+            table = "wg_monthly"
+            bucket_from = parse_month(year_start.strftime("%Y-%m"))
+            bucket_to = None
+        else:
+            table = "wg_daily"
+            bucket_from = parse_day(date_from)
+            bucket_to = parse_day(date_to) if date_to else None
+        if bucket_to is None:
+            bucket_to = int(now.timestamp()) + 1
+
+        with get_connection(app.config["WG_STATS_PATH"], readonly=True) as conn:
+            # Сначала сумма по целочисленному peer_id, имена подставляются уже к итогам
+            query = f"""
+                SELECT p.client,
+                       SUM(s.received) as total_received,
+                       SUM(s.sent) as total_sent
+                FROM (
+                    SELECT peer_id, SUM(received) AS received, SUM(sent) AS sent
+                    FROM {table}
+                    WHERE bucket >= ? AND bucket < ?
+                    GROUP BY peer_id
+                ) AS s
+                JOIN wg_peers AS p ON p.id = s.peer_id
+                WHERE p.interface != 'warp'
+                GROUP BY p.client
+                HAVING SUM(s.received) > 0 OR SUM(s.sent) > 0
+                ORDER BY {sort_column} {order_sql}
+            """
+            rows = conn.execute(query, (bucket_from, bucket_to)).fetchall()
 
             for row in rows:
                 client, received, sent = row
@@ -638,25 +613,38 @@ def api_wg_client_chart():
         is_single_day = True
 
     try:
-        with sqlite3.connect(app.config["WG_STATS_PATH"]) as conn:
+        with get_connection(app.config["WG_STATS_PATH"], readonly=True) as conn:
             if is_single_day:
-                start_hour, end_hour = get_server_hour_window_for_client_day(
-                    target_date, client_tz
+                table = "wg_hourly"
+                bucket_from, bucket_to = hour_window_for_day(target_date, client_tz)
+            elif period == "year":
+                table = "wg_monthly"
+                bucket_from, bucket_to = parse_month(year_month_from), None
+            else:
+                table = "wg_daily"
+                bucket_from = parse_day(date_from)
+                bucket_to = parse_day(date_to) if date_to else None
+            if bucket_to is None:
+                bucket_to = int(now.timestamp()) + 1
+
+            rows = conn.execute(
+                f"""
+                SELECT bucket,
+                       SUM(received) as rx,
+                       SUM(sent) as tx
+                FROM {table}
+                WHERE peer_id IN (
+                    SELECT id FROM wg_peers WHERE client = ? AND interface != 'warp'
                 )
-                rows = conn.execute(
-                    """
-                    SELECT hour,
-                           SUM(received) as rx,
-                           SUM(sent) as tx
-                    FROM wg_hourly_stats
-                    WHERE client = ? AND hour >= ? AND hour < ?
-                      AND interface != 'warp'
-                    GROUP BY hour
-                    ORDER BY hour ASC
-                    """,
-                    (client_name, start_hour, end_hour),
-                ).fetchall()
-                hour_data = {h: (rx or 0, tx or 0) for h, rx, tx in rows}
+                  AND bucket >= ? AND bucket < ?
+                GROUP BY bucket
+                ORDER BY bucket ASC
+                """,
+                (client_name, bucket_from, bucket_to),
+            ).fetchall()
+
+            if is_single_day:
+                hour_data = {bucket: (rx or 0, tx or 0) for bucket, rx, tx in rows}
                 day_start_client = datetime.strptime(
                     target_date, "%Y-%m-%d"
                 ).replace(tzinfo=client_tz)
@@ -671,62 +659,14 @@ def api_wg_client_chart():
 
                 point_dt_client = day_start_client
                 while point_dt_client < display_end_client:
-                    point_dt_server = point_dt_client.astimezone(get_localzone())
-                    server_hour_key = point_dt_server.strftime("%Y-%m-%d %H:00")
                     labels.append(point_dt_client.strftime("%Y-%m-%d %H:00"))
-                    rx, tx = hour_data.get(server_hour_key, (0, 0))
-                    rx_data.append(rx or 0)
-                    tx_data.append(tx or 0)
+                    rx, tx = hour_data.get(hour_bucket(point_dt_client.timestamp()), (0, 0))
+                    rx_data.append(rx)
+                    tx_data.append(tx)
                     point_dt_client += timedelta(hours=1)
-            elif period == "year":
-                rows = conn.execute(
-                    """
-                    SELECT month,
-                           SUM(received) as rx,
-                           SUM(sent) as tx
-                    FROM wg_monthly_stats
-                    WHERE client = ? AND month >= ?
-                      AND interface != 'warp'
-                    GROUP BY month
-                    ORDER BY month ASC
-                    """,
-                    (client_name, year_month_from),
-                ).fetchall()
-                labels = [r[0] for r in rows]
-                rx_data = [r[1] or 0 for r in rows]
-                tx_data = [r[2] or 0 for r in rows]
-            elif date_to:
-                rows = conn.execute(
-                    """
-                    SELECT date,
-                           SUM(received) as rx,
-                           SUM(sent) as tx
-                    FROM wg_daily_stats
-                    WHERE client = ? AND date >= ? AND date < ?
-                      AND interface != 'warp'
-                    GROUP BY date
-                    ORDER BY date ASC
-                    """,
-                    (client_name, date_from, date_to),
-                ).fetchall()
-                labels = [r[0] for r in rows]
-                rx_data = [r[1] or 0 for r in rows]
-                tx_data = [r[2] or 0 for r in rows]
             else:
-                rows = conn.execute(
-                    """
-                    SELECT date,
-                           SUM(received) as rx,
-                           SUM(sent) as tx
-                    FROM wg_daily_stats
-                    WHERE client = ? AND date >= ?
-                      AND interface != 'warp'
-                    GROUP BY date
-                    ORDER BY date ASC
-                    """,
-                    (client_name, date_from),
-                ).fetchall()
-                labels = [r[0] for r in rows]
+                label_format = "%Y-%m" if period == "year" else "%Y-%m-%d"
+                labels = [format_bucket(r[0], label_format) for r in rows]
                 rx_data = [r[1] or 0 for r in rows]
                 tx_data = [r[2] or 0 for r in rows]
 
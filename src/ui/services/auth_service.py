@@ -4,6 +4,7 @@ import string
 
 from flask_login import UserMixin
 
+from src.storage import connect
 from src.ui.extensions import app, bcrypt, loginManager
 
 
@@ -16,7 +17,7 @@ class User(UserMixin):
 
 
 def get_db_connection():
-    conn = sqlite3.connect(app.config["DATABASE_PATH"])
+    conn = connect(app.config["DATABASE_PATH"])
     conn.row_factory = sqlite3.Row
     return conn
 
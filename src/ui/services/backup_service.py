@@ -1,21 +1,40 @@
 import json
 import os
 import shutil
+import sqlite3
 import subprocess
 import tarfile
 import tempfile
 from typing import BinaryIO
 
+from src.migrations import (
+    AUDIT_MIGRATIONS,
+    OPENVPN_LOGS_MIGRATIONS,
+    SYSTEM_STATS_MIGRATIONS,
+    WG_STATS_MIGRATIONS,
+    migrate,
+)
+from src.storage import backup_database, restore_database
 from src.tg_bot.config import load_settings, normalize_settings_data, save_settings
 from src.tg_bot.settings_report import settings_are_equal
 from src.ui.constants import BASE_DIR, CLIENT_SH_PATH, SETTINGS_PATH
-from src.ui.utils.network_utils import get_external_ip
+from src.ui.services.identity_service import get_server_ip
 
 DATABASES_DIR = os.path.join(BASE_DIR, "src", "databases")
 STATUSOPENVPN_BACKUP_DIR = "/root/StatusOpenVPN-backup"
 SETTINGS_RESTORE_PHRASE = "settings.json"
 MAX_RESTORE_ARCHIVE_BYTES = 512 * 1024 * 1024
 MAX_SETTINGS_RESTORE_BYTES = 1_000_000
+# Служебные файлы SQLite: их содержимое попадает в архив через копию .db
+SQLITE_SIDE_SUFFIXES = ("-wal", "-shm", "-journal")
+# Восстановленная база приводится к текущей схеме до записи в рабочий файл:
+# процессы, уже выполнившие migrate_database для этого файла, не мигрируют его снова
+DB_MIGRATIONS = {
+    "openvpn_logs.db": OPENVPN_LOGS_MIGRATIONS,
+    "wireguard_stats.db": WG_STATS_MIGRATIONS,
+    "system_stats.db": SYSTEM_STATS_MIGRATIONS,
+    "admin_audit.db": AUDIT_MIGRATIONS,
+}
 SETTINGS_KEY_TYPES = {
     "app_name": str,
     "telegram_admins": dict,
@@ -52,6 +71,8 @@ def get_statusopenvpn_backup_sources() -> list[tuple[str, str]]:
         if os.path.isdir(candidate):
             for root, _, files in os.walk(candidate):
                 for name in files:
+                    if name.endswith(SQLITE_SIDE_SUFFIXES):
+                        continue
                     path = os.path.join(root, name)
                     if candidate.endswith(os.path.join("src", "databases")):
                         archive_name = os.path.join(
@@ -89,18 +110,27 @@ def build_statusopenvpn_backup_archive(dest_path: str) -> tuple[bool, str]:
         return False, "Файлы для бэкапа StatusOpenVPN не найдены."
 
     try:
-        with tarfile.open(dest_path, "w:gz") as archive:
+        with tempfile.TemporaryDirectory(prefix="sovpn-backup-") as tmpdir, tarfile.open(
+            dest_path, "w:gz"
+        ) as archive:
             for source_path, archive_name in sources:
-                archive.add(source_path, arcname=archive_name)
+                if source_path.endswith(".db"):
+                    # Согласованный снимок вместо файла, в который пишут сборщики
+                    snapshot_path = os.path.join(tmpdir, "snapshot.db")
+                    backup_database(source_path, snapshot_path)
+                    archive.add(snapshot_path, arcname=archive_name)
+                    os.remove(snapshot_path)
+                else:
+                    archive.add(source_path, arcname=archive_name)
         return True, ""
-    except OSError as e:
+    except (OSError, sqlite3.Error) as e:
         return False, str(e)
 
 
 def find_vpn_clients_backup_path() -> str | None:
-    server_ip = get_external_ip() or ""
+    server_ip = get_server_ip()
     paths_to_check = []
-    if server_ip and " " not in server_ip and "Ошибка" not in server_ip:
+    if server_ip:
         paths_to_check.append(f"/root/antizapret/backup-{server_ip}.tar.gz")
     paths_to_check.append("/root/antizapret/backup.tar.gz")
 
@@ -213,10 +243,17 @@ def restore_statusopenvpn_from_archive(file_storage: BinaryIO, filename: str) ->
         restored = []
         try:
             for src_path, dest_name in db_files:
-                dest_path = os.path.join(DATABASES_DIR, dest_name)
-                shutil.copy2(src_path, dest_path)
+                # SQLite применяет -wal из архивов, собранных копированием файлов
+                source = sqlite3.connect(src_path)
+                try:
+                    migrations = DB_MIGRATIONS.get(dest_name)
+                    if migrations:
+                        migrate(source, migrations)
+                    restore_database(source, os.path.join(DATABASES_DIR, dest_name))
+                finally:
+                    source.close()
                 restored.append(dest_name)
-        except OSError as e:
+        except (OSError, sqlite3.Error) as e:
             return False, f"Ошибка записи баз данных: {e}"
 
         return True, f"Восстановлено файлов: {len(restored)} ({', '.join(sorted(restored))})."
@@ -0,0 +1,148 @@
+"""Индекс сроков действия клиентских сертификатов OpenVPN.
+
+Сроки берутся из .crt в OPENVPN_EASYRSA_ISSUED_DIR и прежних каталогах
+OPENVPN_KEYS_DIR / disabled. PEM разбирается один раз на (путь, mtime,
+размер). Индекс хранится через runtime_state, поэтому сборщик system_stats
+и воркеры веб-интерфейса не разбирают одни и те же сертификаты заново, в
+том числе после перезапуска.
+
+Обработчики запросов (get_cert_expiries) делают stat только каталогов:
+выпуск, отзыв и продление в easyrsa меняют mtime каталога, и тогда заново
+проверяются файлы лишь этого каталога. stat каждого .crt — в
+refresh_cert_index, его раз в час вызывает сборщик system_stats
+(collect_certs); так же находятся файлы, перезаписанные на месте. Срок
+клиента — поиск в словаре по имени.
+"""
+
+import os
+from datetime import datetime, timezone
+
+from cryptography import x509
+from cryptography.hazmat.backends import default_backend
+
+from src.runtime_state import read_state, write_state
+from src.ui.constants import (
+    OPENVPN_EASYRSA_ISSUED_DIR,
+    OPENVPN_KEYS_DIR,
+    OPENVPN_KEYS_DISABLED_DIR,
+)
+
+CERT_INDEX_STATE_NAME = "openvpn_cert_index.json"
+CERT_DIRS = (OPENVPN_EASYRSA_ISSUED_DIR, OPENVPN_KEYS_DIR, OPENVPN_KEYS_DISABLED_DIR)
+
+# {"dirs": {каталог: {"mtime_ns", "files"}}, "certs": {путь: [mtime_ns, размер, срок epoch]}}
+_index = None
+# {имя клиента: самый ранний срок (naive UTC)} для текущего _index
+_expiries = {}
+
+
+def read_pem_cert_not_after_utc(path):
+    try:
+        with open(path, "rb") as f:
+            cert = x509.load_pem_x509_certificate(f.read(), default_backend())
+        na = getattr(cert, "not_valid_after_utc", None)
+        if na is not None:
+            na = na.replace(tzinfo=None)
+        else:
+            na = cert.not_valid_after
+        return na
+    except Exception:
+        return None
+
+
+def _list_crt_files(directory, saved):
+    """{"mtime_ns", "files"} каталога; список перечитывается при смене mtime."""
+    try:
+        mtime_ns = os.stat(directory).st_mtime_ns
+    except OSError:
+        return None
+    if saved and saved.get("mtime_ns") == mtime_ns:
+        return saved
+    try:
+        files = sorted(name for name in os.listdir(directory) if name.endswith(".crt"))
+    except OSError:
+        return None
+    return {"mtime_ns": mtime_ns, "files": files}
+
+
+def _cert_entry(path, saved):
+    """[mtime_ns, размер, срок epoch или None]; PEM разбирается только при изменении файла."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    if saved and saved[:2] == [st.st_mtime_ns, st.st_size]:
+        return saved
+    not_after = read_pem_cert_not_after_utc(path)
+    expires = not_after.replace(tzinfo=timezone.utc).timestamp() if not_after else None
+    return [st.st_mtime_ns, st.st_size, expires]
+
+
+def _build_index(saved, stat_files):
+    """Индекс по текущим каталогам; saved возвращается как есть, если ничего не изменилось.
+
+    stat_files=False — stat файлов только в каталогах со сменившимся mtime.
+    """
+    saved_dirs = saved.get("dirs", {})
+    saved_certs = saved.get("certs", {})
+    dirs = {}
+    for directory in CERT_DIRS:
+        listing = _list_crt_files(directory, saved_dirs.get(directory))
+        if listing is not None:
+            dirs[directory] = listing
+    if not stat_files and dirs.keys() == saved_dirs.keys() and all(
+        listing is saved_dirs[directory] for directory, listing in dirs.items()
+    ):
+        return saved
+
+    certs = {}
+    for directory, listing in dirs.items():
+        recheck = stat_files or listing is not saved_dirs.get(directory)
+        for filename in listing["files"]:
+            path = os.path.join(directory, filename)
+            entry = saved_certs.get(path)
+            if recheck or entry is None:
+                entry = _cert_entry(path, entry)
+            if entry is not None:
+                certs[path] = entry
+    return {"dirs": dirs, "certs": certs}
+
+
+def _update_index(stat_files):
+    """Обновляет индекс (опубликованный свежее памяти) и возвращает сроки по именам."""
+    global _index, _expiries
+    saved = read_state(CERT_INDEX_STATE_NAME) or _index or {}
+    fresh = _build_index(saved, stat_files)
+    if fresh is not saved and fresh != saved:
+        write_state(CERT_INDEX_STATE_NAME, fresh)
+    if fresh is _index or fresh == _index:
+        _index = fresh
+        return _expiries
+
+    earliest = {}
+    for path, (_, _, expires) in fresh["certs"].items():
+        if expires is None:
+            continue
+        name = os.path.basename(path)[:-4]
+        if name not in earliest or expires < earliest[name]:
+            earliest[name] = expires
+    _expiries = {
+        name: datetime.fromtimestamp(expires, timezone.utc).replace(tzinfo=None)
+        for name, expires in earliest.items()
+    }
+    _index = fresh
+    return _expiries
+
+
+def get_cert_expiries():
+    """{имя клиента: самый ранний срок среди его .crt (naive UTC)} для обработчиков запросов.
+
+    Имя — имя файла без .crt во всех каталогах CERT_DIRS. Сроки — из
+    опубликованного индекса; stat делается только для каталогов.
+    """
+    return _update_index(stat_files=False)
+
+
+def refresh_cert_index():
+    """get_cert_expiries со stat каждого .crt; вызывается сборщиком system_stats."""
+    return _update_index(stat_files=True)
@@ -0,0 +1,161 @@
+"""Сведения о сервере для шапки страниц: внешний IP, имя хоста, версия, последний релиз.
+
+Значения обновляет один процесс — сборщик system_stats (задача
+refresh_identity), каждое по своему TTL. Снимок публикуется через
+runtime_state (IDENTITY_STATE_NAME) и сохраняется в IDENTITY_PATH: после
+перезапуска сразу доступны последние известные значения. Воркеры
+веб-интерфейса только читают снимок (get_identity), поэтому api.ipify.org,
+GitHub и `git describe` не влияют на время отрисовки и не вызываются в
+каждом воркере. Неудачное обновление оставляет прежнее значение и
+повторяется через RETRY_INTERVAL, так что без доступа в интернет панель
+работает с последним известным IP.
+"""
+
+import json
+import os
+import socket
+import time
+
+from src.runtime_state import read_state, write_state
+from src.ui.constants import BASE_DIR
+from src.ui.services.system_info_service import get_git_version
+from src.ui.services.update_service import (
+    UPDATE_CHECK_TTL,
+    get_latest_github_version,
+    normalize_version_tag,
+)
+from src.ui.utils.network_utils import fetch_external_ip
+
+IDENTITY_PATH = os.path.join(BASE_DIR, "src", "databases", "host_identity.json")
+IDENTITY_STATE_NAME = "host_identity.json"
+EXTERNAL_IP_TTL = 3600
+VERSION_TTL = 3600
+RETRY_INTERVAL = 300  # Повтор после ошибки
+REFRESH_INTERVAL = 30
+IP_NOT_FOUND = "IP не найден"
+
+# Снимок сборщика; заменяется целиком, читатели не берут блокировку
+_identity = {
+    "hostname": socket.gethostname(),
+    "external_ip": None,
+    "external_ip_at": 0.0,
+    "external_ip_error": None,
+    "version": "unknown",
+    "version_at": 0.0,
+    "latest_version": None,
+    "latest_at": 0.0,
+    "latest_error": None,
+}
+_loaded = False
+
+
+def read_identity_file():
+    """Сохранённые сведения или {}, если файла нет или он повреждён."""
+    try:
+        with open(IDENTITY_PATH, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def load_identity():
+    """Подхватывает сохранённые значения при старте. Версия перепроверяется сразу:
+    после обновления сервис перезапускается с новым кодом."""
+    global _identity, _loaded
+    saved = read_identity_file()
+    identity = dict(_identity)
+    for key in identity:
+        if key in saved and key != "hostname":
+            identity[key] = saved[key]
+    identity["version_at"] = 0.0
+    _identity = identity
+    _loaded = True
+
+
+def save_identity(identity):
+    """Публикует снимок для воркеров и сохраняет его на случай перезапуска."""
+    write_state(IDENTITY_STATE_NAME, identity)
+    tmp_path = f"{IDENTITY_PATH}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(IDENTITY_PATH), exist_ok=True)
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(identity, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, IDENTITY_PATH)
+    except OSError as e:
+        print(f"Не удалось сохранить {IDENTITY_PATH}: {e}")
+
+
+def _due(checked_at, ttl, failed, now):
+    return now - checked_at >= (RETRY_INTERVAL if failed else ttl)
+
+
+def refresh_identity(now=None):
+    """Обновляет значения с истёкшим TTL; True, если что-то обновлялось.
+
+    Сначала локальные (имя хоста, версия), затем сетевые; каждое значение
+    публикуется сразу, не дожидаясь медленных запросов.
+    """
+    global _identity
+    if not _loaded:
+        load_identity()
+    now = time.time() if now is None else now
+    initial = _identity
+    identity = dict(initial)
+    identity["hostname"] = socket.gethostname()
+
+    if _due(identity["version_at"], VERSION_TTL, False, now):
+        identity["version"] = get_git_version()
+        identity["version_at"] = now
+    _identity = dict(identity)
+
+    if _due(identity["external_ip_at"], EXTERNAL_IP_TTL, identity["external_ip_error"], now):
+        ip, error = fetch_external_ip()
+        if ip:
+            identity["external_ip"] = ip
+        else:
+            print(f"Не удалось получить внешний IP: {error}")
+        identity["external_ip_error"] = error
+        identity["external_ip_at"] = now
+        _identity = dict(identity)
+
+    if _due(identity["latest_at"], UPDATE_CHECK_TTL, identity["latest_error"], now):
+        latest, error = get_latest_github_version()
+        if latest:
+            identity["latest_version"] = latest
+        identity["latest_error"] = error
+        identity["latest_at"] = now
+        _identity = dict(identity)
+
+    if identity == initial:
+        return False
+    save_identity(identity)
+    return True
+
+
+def get_identity():
+    """Снимок сборщика, а пока его нет — сохранённые в IDENTITY_PATH значения."""
+    published = read_state(IDENTITY_STATE_NAME)
+    if published is None:
+        published = read_identity_file()
+    return {**_identity, **published}
+
+
+def get_server_ip():
+    """Последний известный внешний IP или None."""
+    return get_identity()["external_ip"]
+
+
+def get_update_status():
+    """(доступно обновление, текущая версия, последний релиз, ошибка проверки) из снимка."""
+    identity = get_identity()
+    current = identity["version"]
+    latest = identity["latest_version"]
+    error = identity["latest_error"] if not latest else None
+    if not latest or current == "unknown":
+        return False, current, latest, error
+    current_v = normalize_version_tag(current)
+    latest_v = normalize_version_tag(latest)
+    if current_v is None or latest_v is None:
+        return False, current, latest, error
+    return latest_v > current_v, current, latest, error
@@ -1,13 +1,9 @@
-import csv
 import os
 import re
 import socket
 import subprocess
 from datetime import datetime, timedelta
 
-from cryptography import x509
-from cryptography.hazmat.backends import default_backend
-
 from src.ui.constants import (
     CLIENT_CONNECT_BAN_CHECK_BLOCK,
     CLIENT_SH_PATH,
@@ -16,14 +12,16 @@ from src.ui.constants import (
     OPENVPN_CONFIG_PATHS,
     OPENVPN_EASYRSA_ISSUED_DIR,
     OPENVPN_KEYS_DIR,
-    OPENVPN_KEYS_DISABLED_DIR,
     OPENVPN_SOCKETS,
     PROTOCOL_TO_SOCKET,
 )
+from src.ovpn_mgmt import get_proxy_path, get_rates_state_name
+from src.ovpn_status import IncompleteStatusError, parse_status, read_status_file
+from src.runtime_state import read_state
+from src.ui.services.cert_index_service import get_cert_expiries
 from src.ui.state import client_cache
 from src.ui.utils.format_utils import (
     format_bytes,
-    format_date,
     format_duration,
     normalize_real_address,
 )
@@ -32,6 +30,8 @@ from src.ui.utils.openvpn_naming import extract_client_name_from_ovpn
 
 OPENVPN_CLIENT_NAME_RE = re.compile(r"^[a-zA-Z0-9_-]{1,32}$")
 OPENVPN_CERT_RENEW_WARN_DAYS = 30
+# Скорости из потока bytecount старше этого считаются неактуальными
+LIVE_RATES_MAX_AGE = 10
 
 
 def read_banned_clients():
@@ -132,59 +132,14 @@ def get_all_openvpn_clients():
     return clients
 
 
-def list_openvpn_client_crt_files(client_name):
-    """Пути к .crt: сначала easyrsa3, затем legacy client/keys и disabled."""
-    paths = []
-    clean = (client_name or "").strip()
-    if not clean:
-        return paths
-
-    easyrsa_crt = os.path.join(OPENVPN_EASYRSA_ISSUED_DIR, f"{clean}.crt")
-    if os.path.isfile(easyrsa_crt):
-        paths.append(easyrsa_crt)
-
-    for base in (OPENVPN_KEYS_DIR, OPENVPN_KEYS_DISABLED_DIR):
-        if not os.path.isdir(base):
-            continue
-        try:
-            for filename in os.listdir(base):
-                if not filename.endswith(".crt"):
-                    continue
-                if clean in filename:
-                    path = os.path.join(base, filename)
-                    if path not in paths:
-                        paths.append(path)
-        except OSError:
-            continue
-    return paths
-
+def get_openvpn_client_cert_expiry(client_name, expiries=None):
+    """Самый ранний срок среди .crt клиента и подпись для UI.
 
-def read_pem_cert_not_after_utc(path):
-    try:
-        with open(path, "rb") as f:
-            cert = x509.load_pem_x509_certificate(f.read(), default_backend())
-        na = getattr(cert, "not_valid_after_utc", None)
-        if na is not None:
-            na = na.replace(tzinfo=None)
-        else:
-            na = cert.not_valid_after
-        return na
-    except Exception:
-        return None
-
-
-def get_openvpn_client_cert_expiry(client_name):
-    """По всем .crt клиента возвращает минимальный срок (самый ранний) и подпись для UI."""
-    paths = list_openvpn_client_crt_files(client_name)
-    if not paths:
-        return None, "—"
-    earliest = None
-    for path in paths:
-        na = read_pem_cert_not_after_utc(path)
-        if na is None:
-            continue
-        if earliest is None or na < earliest:
-            earliest = na
+    expiries — результат get_cert_expiries(), если срок нужен для многих клиентов.
+    """
+    if expiries is None:
+        expiries = get_cert_expiries()
+    earliest = expiries.get((client_name or "").strip())
     if earliest is None:
         return None, "—"
     return earliest, earliest.strftime("%d.%m.%Y")
@@ -221,8 +176,9 @@ def count_openvpn_expiring_certs(days=30):
     now = datetime.utcnow()
     limit = now + timedelta(days=days)
     total = 0
+    expiries = get_cert_expiries()
     for client_name in get_all_openvpn_clients():
-        expiry_dt, _ = get_openvpn_client_cert_expiry(client_name)
+        expiry_dt = expiries.get(client_name)
         if expiry_dt is not None and now < expiry_dt < limit:
             total += 1
     return total
@@ -336,9 +292,20 @@ def send_openvpn_command(socket_name, command, timeout=5):
     if not socket_path:
         return None, f"Unknown socket: {socket_name}"
 
+    # Management-сокет занят подписчиком bytecount службы logs — идём через его прокси
+    proxy_path = get_proxy_path(socket_name)
+    if os.path.exists(proxy_path):
+        response, error = _send_management_command(proxy_path, command, timeout)
+        if not error:
+            return response, None
+
     if not os.path.exists(socket_path):
         return None, f"Socket not found: {socket_path}"
 
+    return _send_management_command(socket_path, command, timeout)
+
+
+def _send_management_command(socket_path, command, timeout):
     try:
         sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
         sock.settimeout(timeout)
@@ -378,24 +345,23 @@ def get_openvpn_clients_from_socket(protocol):
     if error:
         return [], error
 
-    clients = []
-    for line in response.split("\n"):
-        line = line.strip()
-
-        if line.startswith("CLIENT_LIST"):
-            parts = line.split(",")
-            if len(parts) >= 11:
-                clients.append(
-                    {
-                        "common_name": parts[1],
-                        "real_address": parts[2],
-                        "virtual_address": parts[3],
-                        "bytes_received": int(parts[5]) if parts[5].isdigit() else 0,
-                        "bytes_sent": int(parts[6]) if parts[6].isdigit() else 0,
-                        "connected_since": parts[7],
-                        "client_id": parts[10] if len(parts) > 10 else None,
-                    }
-                )
+    try:
+        records = parse_status(response)
+    except IncompleteStatusError:
+        return [], f"Incomplete status response: {response.strip()[:200]}"
+
+    clients = [
+        {
+            "common_name": record.name,
+            "real_address": record.real_address,
+            "virtual_address": record.virtual_address,
+            "bytes_received": record.bytes_received,
+            "bytes_sent": record.bytes_sent,
+            "connected_since": record.connected_since,
+            "client_id": str(record.client_id) if record.client_id is not None else None,
+        }
+        for record in records
+    ]
 
     return clients, None
 
@@ -432,77 +398,87 @@ def kick_openvpn_client(client_name, protocol=None):
     return kicked, errors
 
 
+def get_live_rates(protocol):
+    """Скорости клиентов по потоку bytecount: {имя: (приём, передача)} в байт/с."""
+    socket_name = PROTOCOL_TO_SOCKET.get(protocol)
+    if not socket_name:
+        return {}
+    state = read_state(get_rates_state_name(socket_name), max_age=LIVE_RATES_MAX_AGE)
+    if not state:
+        return {}
+    return {name: tuple(rates) for name, rates in state.get("clients", {}).items()}
+
+
 def read_csv(file_path, protocol):
     data = []
     total_received, total_sent = 0, 0
     current_time = datetime.now()
 
-    if not os.path.exists(file_path) or os.path.getsize(file_path) == 0:
+    records = read_status_file(file_path)
+    if not records:
         return [], 0, 0, None
 
-    with open(file_path, newline="", encoding="utf-8") as csvfile:
-        reader = csv.reader(csvfile)
-        try:
-            next(reader)
-        except StopIteration:
-            return [], 0, 0, None
-
-        for row in reader:
-            if row[0] == "CLIENT_LIST":
-                client_name = row[1]
-                real_address = normalize_real_address(row[2])
-                received = int(row[5])
-                sent = int(row[6])
-                total_received += received
-                total_sent += sent
-
-                start_date = datetime.strptime(row[7], "%Y-%m-%d %H:%M:%S")
-                duration = format_duration(start_date)
-
-                previous_data = client_cache.get(
-                    client_name, {"received": 0, "sent": 0, "timestamp": current_time}
-                )
-                previous_received = previous_data["received"]
-                previous_sent = previous_data["sent"]
-                previous_time = previous_data["timestamp"]
-
-                time_diff = (current_time - previous_time).total_seconds()
-                if time_diff >= 30:
-                    download_speed = (
-                        (received - previous_received) / time_diff
-                        if received >= previous_received
-                        else 0
-                    )
-                    upload_speed = (
-                        (sent - previous_sent) / time_diff
-                        if sent >= previous_sent
-                        else 0
-                    )
-                else:
-                    download_speed = 0
-                    upload_speed = 0
-
-                client_cache[client_name] = {
-                    "received": received,
-                    "sent": sent,
-                    "timestamp": current_time,
-                }
-
-                data.append(
-                    [
-                        client_name,
-                        real_address,
-                        row[3],
-                        format_bytes(received),
-                        format_bytes(sent),
-                        f"{format_bytes(max(download_speed, 0))}/s",
-                        f"{format_bytes(max(upload_speed, 0))}/s",
-                        format_date(row[7]),
-                        duration,
-                        protocol,
-                        max(download_speed, 0),
-                        max(upload_speed, 0),
-                    ]
-                )
+    live_rates = get_live_rates(protocol)
+
+    for record in records:
+        client_name = record.name
+        real_address = normalize_real_address(record.real_address)
+        received = record.bytes_received
+        sent = record.bytes_sent
+        total_received += received
+        total_sent += sent
+
+        if record.connected_at is not None:
+            duration = format_duration(datetime.fromtimestamp(record.connected_at))
+        else:
+            duration = "-"
+
+        previous_data = client_cache.get(
+            client_name, {"received": 0, "sent": 0, "timestamp": current_time}
+        )
+        previous_received = previous_data["received"]
+        previous_sent = previous_data["sent"]
+        previous_time = previous_data["timestamp"]
+
+        time_diff = (current_time - previous_time).total_seconds()
+        if client_name in live_rates:
+            download_speed, upload_speed = live_rates[client_name]
+        elif time_diff >= 30:
+            download_speed = (
+                (received - previous_received) / time_diff
+                if received >= previous_received
+                else 0
+            )
+            upload_speed = (
+                (sent - previous_sent) / time_diff
+                if sent >= previous_sent
+                else 0
+            )
+        else:
+            download_speed = 0
+            upload_speed = 0
+
+        client_cache[client_name] = {
+            "received": received,
+            "sent": sent,
+            "timestamp": current_time,
+        }
+
+        data.append(
+            [
+                client_name,
+                real_address,
+                record.virtual_address,
+                format_bytes(received),
+                format_bytes(sent),
+                f"{format_bytes(max(download_speed, 0))}/s",
+                f"{format_bytes(max(upload_speed, 0))}/s",
+                record.connected_iso,
+                duration,
+                protocol,
+                max(download_speed, 0),
+                max(upload_speed, 0),
+            ]
+        )
 
     return data, total_received, total_sent, None
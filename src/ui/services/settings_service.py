@@ -3,6 +3,7 @@ import os
 import sqlite3
 from datetime import datetime
 
+from src.storage import get_connection
 from src.ui.constants import DEFAULT_SETTINGS, LEGACY_ADMIN_INFO_PATH, SETTINGS_PATH
 
 
@@ -80,7 +81,7 @@ def parse_history_max_records(raw_value):
 def get_available_stat_years(db_path, table_name, date_column):
     years = []
     try:
-        with sqlite3.connect(db_path) as conn:
+        with get_connection(db_path, readonly=True) as conn:
             rows = conn.execute(
                 f"""
                 SELECT DISTINCT substr({date_column}, 1, 4) AS y
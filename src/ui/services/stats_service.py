@@ -3,29 +3,18 @@ import sqlite3
 from datetime import datetime, timedelta
 from statistics import mean
 
-from src.ui.constants import DB_SAVE_INTERVAL
+from src import stats_tiers
+from src.migrations import SYSTEM_STATS_MIGRATIONS, migrate_database
+from src.storage import connect, get_connection
 from src.ui.extensions import app
-from src.ui.state import cpu_history
 from src.ui.utils.format_utils import format_bytes
 
+RAW_RETENTION_DAYS = 7  # Пятиминутные средние; дальше — только свёртки stats_tiers
 
-def ensure_db():
-    """Создает таблицу system_stats, если она не существует."""
-    conn = sqlite3.connect(app.config["SYSTEM_STATS_PATH"])
-    cur = conn.cursor()
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS system_stats (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp DATETIME,
-            cpu_percent REAL,
-            ram_percent REAL
-        )
-    """
-    )
 
-    conn.commit()
-    conn.close()
+def ensure_db():
+    """Приводит схему system_stats к последней версии."""
+    migrate_database(app.config["SYSTEM_STATS_PATH"], SYSTEM_STATS_MIGRATIONS)
 
 
 def get_ovpn_wg_database_sizes():
@@ -54,14 +43,14 @@ def get_ovpn_wg_database_sizes():
 
 
 def _delete_tables_and_vacuum(db_path, tables):
-    with sqlite3.connect(db_path) as conn:
-        for t in tables:
-            try:
-                conn.execute(f"DELETE FROM {t}")
-            except sqlite3.OperationalError:
-                pass
-    conn = sqlite3.connect(db_path)
+    conn = connect(db_path)
     try:
+        with conn:
+            for t in tables:
+                try:
+                    conn.execute(f"DELETE FROM {t}")
+                except sqlite3.OperationalError:
+                    pass
         conn.execute("VACUUM")
     finally:
         conn.close()
@@ -73,11 +62,13 @@ def clear_openvpn_stats_database():
         _delete_tables_and_vacuum(
             app.config["LOGS_DATABASE_PATH"],
             (
-                "daily_stats",
-                "monthly_stats",
-                "yearly_stats",
+                "ovpn_hourly",
+                "ovpn_daily",
+                "ovpn_monthly",
+                "ovpn_clients",
                 "connection_logs",
                 "last_client_stats",
+                "rollup_state",
             ),
         )
         return True, None
@@ -91,10 +82,10 @@ def clear_wireguard_stats_database():
         _delete_tables_and_vacuum(
             app.config["WG_STATS_PATH"],
             (
-                "wg_hourly_stats",
-                "wg_daily_stats",
-                "wg_monthly_stats",
-                "wg_intermediate",
+                "wg_hourly",
+                "wg_daily",
+                "wg_monthly",
+                "wg_peers",
                 "wg_total_stats",
             ),
         )
@@ -103,82 +94,65 @@ def clear_wireguard_stats_database():
         return False, str(e)
 
 
-def save_minute_average_to_db():
-    """Сохраняет средние значения CPU и RAM за последний интервал в БД."""
+def save_minute_average_to_db(samples):
+    """Сохраняет среднее CPU и RAM по образцам в БД и добавляет образцы
+    в часовые и суточные свёртки (stats_tiers).
+
+    samples — ещё не сохранённые образцы (epoch, cpu, ram) сборщика system_stats.
+    Возвращает время последнего записанного образца или None, если ничего не
+    записано: по нему сборщик отбирает следующую порцию без повторов и пропусков.
+    """
+    window = list(samples)
+    if not window:
+        return None
     now = datetime.now()
-    cutoff = now - timedelta(seconds=DB_SAVE_INTERVAL)
-    to_avg = [p for p in cpu_history if p["timestamp"] >= cutoff]
-    if not to_avg:
-        return
-    cpu_avg = mean([p["cpu"] for p in to_avg])
-    ram_avg = mean([p["ram"] for p in to_avg])
+    cpu_avg = mean([cpu for _, cpu, _ in window])
+    ram_avg = mean([ram for _, _, ram in window])
 
     try:
-        conn = sqlite3.connect(app.config["SYSTEM_STATS_PATH"])
-        cur = conn.cursor()
-        cur.execute(
-            "INSERT INTO system_stats (timestamp, cpu_percent, ram_percent) VALUES (?, ?, ?)",
-            (now.strftime("%Y-%m-%d %H:%M:%S"), round(cpu_avg, 3), round(ram_avg, 3)),
-        )
-
-        cutoff_db = now - timedelta(days=7)
-        cur.execute(
-            "DELETE FROM system_stats WHERE timestamp < ?",
-            (cutoff_db.strftime("%Y-%m-%d %H:%M:%S"),),
-        )
-
-        conn.commit()
-        conn.close()
+        conn = get_connection(app.config["SYSTEM_STATS_PATH"])
+        with conn:
+            conn.execute(
+                "INSERT INTO system_stats (timestamp, cpu_percent, ram_percent) VALUES (?, ?, ?)",
+                (now.strftime("%Y-%m-%d %H:%M:%S"), round(cpu_avg, 3), round(ram_avg, 3)),
+            )
+            stats_tiers.add_samples(conn, window)
+
+            cutoff_db = now - timedelta(days=RAW_RETENTION_DAYS)
+            conn.execute(
+                "DELETE FROM system_stats WHERE timestamp < ?",
+                (cutoff_db.strftime("%Y-%m-%d %H:%M:%S"),),
+            )
+            stats_tiers.prune(conn, now.timestamp())
     except Exception as e:
         print("[DB ERROR] save_minute_average_to_db:", e)
+        return None
+    return max(ts for ts, _, _ in window)
 
 
-def group_rows(rows, interval="minute"):
-    """Группирует ряды по интервалу и усредняет значения CPU и RAM."""
-    grouped = {}
-
-    for r in rows:
-        ts = r["timestamp"]
-
-        if interval == "minute":
-            key = ts.replace(second=0, microsecond=0)
-        elif interval == "hour":
-            key = ts.replace(minute=0, second=0, microsecond=0)
-        elif interval == "day":
-            key = ts.replace(hour=0, minute=0, second=0, microsecond=0)
-        else:
-            key = ts
-
-        if key not in grouped:
-            grouped[key] = {"cpu": [], "ram": []}
-
-        grouped[key]["cpu"].append(r["cpu"])
-        grouped[key]["ram"].append(r["ram"])
-
-    result = []
-    for key, values in grouped.items():
-        result.append(
-            {
-                "timestamp": key,
-                "cpu": sum(values["cpu"]) / len(values["cpu"]),
-                "ram": sum(values["ram"]) / len(values["ram"]),
-            }
-        )
-
-    return sorted(result, key=lambda x: x["timestamp"])
+def load_saved_averages(since):
+    """Сохранённые средние (epoch, cpu, ram) с момента since (epoch) по возрастанию времени."""
+    try:
+        conn = get_connection(app.config["SYSTEM_STATS_PATH"], readonly=True)
+        rows = conn.execute(
+            "SELECT timestamp, cpu_percent, ram_percent FROM system_stats "
+            "WHERE timestamp >= ? ORDER BY timestamp",
+            (datetime.fromtimestamp(since).strftime("%Y-%m-%d %H:%M:%S"),),
+        ).fetchall()
+    except Exception as e:
+        print("[DB ERROR] load_saved_averages:", e)
+        return []
+    return [
+        (datetime.strptime(ts, "%Y-%m-%d %H:%M:%S").timestamp(), cpu, ram)
+        for ts, cpu, ram in rows
+    ]
 
 
-def resample_to_n(data, n):
-    """Возвращает ровно n точек, либо все данные, если их меньше."""
-    if not data:
-        return []
-    if len(data) <= n:
-        return data
-    step = len(data) / n
-    out = []
-    for i in range(n):
-        idx = int(i * step)
-        if idx >= len(data):
-            idx = len(data) - 1
-        out.append(data[idx])
-    return out
+def load_stats_tier(table, since):
+    """Корзины тира stats_tiers после since (epoch) или None при ошибке БД."""
+    try:
+        conn = get_connection(app.config["SYSTEM_STATS_PATH"], readonly=True)
+        return stats_tiers.load_tier(conn, table, since)
+    except Exception as e:
+        print("[DB ERROR] load_stats_tier:", e)
+        return None
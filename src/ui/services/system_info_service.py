@@ -1,35 +1,42 @@
 import json
 import subprocess
 import time
-from datetime import datetime, timedelta
 
 import psutil
 
-from src.ui import state
-from src.ui.constants import (
-    CACHE_DURATION,
-    DB_SAVE_INTERVAL,
-    HOST_STATIC_INFO,
-    MAX_CPU_HISTORY,
-    MAX_HISTORY_SECONDS,
-    SAMPLE_INTERVAL,
-)
+from src.metric_history import MetricHistory
+from src.ovpn_status import read_status_file
+from src.runtime_state import read_blob, read_state
+from src.systemd_watch import publish_unit_states, query_units
+from src.ui.constants import VPN_SYSTEMD_UNIT_SET
+from src.ui.services.cert_index_service import refresh_cert_index
 from src.ui.services.openvpn_service import (
     count_openvpn_expiring_certs,
     read_banned_clients,
 )
 from src.ui.services.settings_service import read_settings
-from src.ui.services.stats_service import ensure_db, save_minute_average_to_db
 from src.ui.services.vpn_service import get_vpn_systemd_states
 from src.ui.services.wireguard_service import get_disabled_wg_peers
-from src.ui.utils.format_utils import format_bytes, format_uptime
+from src.ui.utils.format_utils import format_bytes, format_uptime_seconds
 from src.ui.utils.network_utils import (
     get_default_interface,
-    get_network_load,
     get_network_stats,
-    get_uptime,
+    get_uptime_seconds,
 )
-from src.ui.utils.time_utils import is_peer_online, parse_relative_time
+from src.wg_collector import collect, is_online
+
+STATUS_FILE_PATHS = [
+    ("/etc/openvpn/server/logs/antizapret-udp-status.log", "UDP"),
+    ("/etc/openvpn/server/logs/antizapret-tcp-status.log", "TCP"),
+    ("/etc/openvpn/server/logs/vpn-udp-status.log", "VPN-UDP"),
+    ("/etc/openvpn/server/logs/vpn-tcp-status.log", "VPN-TCP"),
+]
+
+# Снимки публикует служба system_stats (src/system_stats.py), воркеры только читают
+SYSTEM_INFO_STATE_NAME = "system_info.json"
+CPU_HISTORY_STATE_NAME = "cpu_history.bin"
+SYSTEM_INFO_MAX_AGE = 30
+CPU_HISTORY_MAX_AGE = 60
 
 
 def count_online_clients(file_paths):
@@ -38,43 +45,21 @@ def count_online_clients(file_paths):
 
     hide_warp = bool(read_settings().get("hide_wg_warp_interface", False))
     try:
-        wg_output = subprocess.check_output(["/usr/bin/wg", "show"], text=True)
-        current_interface = ""
-        online_wg = 0
-        for raw_line in wg_output.splitlines():
-            line = raw_line.strip()
-            if line.startswith("interface:"):
-                current_interface = line.split(":", 1)[1].strip().lower()
-                continue
-            if not line.startswith("latest handshake:"):
-                continue
-            if hide_warp and current_interface == "warp":
-                continue
-
-            handshake_str = line.split(":", 1)[1].strip()
-            if handshake_str in {"0 seconds ago", "now", "Now"}:
-                online_wg += 1
-                continue
-            try:
-                handshake_time = parse_relative_time(handshake_str)
-                if is_peer_online(handshake_time):
-                    online_wg += 1
-            except Exception:
-                continue
+        _, peers = collect()
+        now = time.time()
+        online_wg = sum(
+            1
+            for peer in peers
+            if not (hide_warp and peer.interface.lower() == "warp") and is_online(peer, now)
+        )
         results["WireGuard"] = online_wg
     except Exception:
         results["WireGuard"] = 0
 
     for path, _ in file_paths:
         try:
-            with open(path, "r", encoding="utf-8") as f:
-                for line in f:
-                    if not line.startswith("CLIENT_LIST,"):
-                        continue
-                    parts = line.split(",", 2)
-                    if len(parts) > 1 and parts[1] != "UNDEF":
-                        total_openvpn += 1
-        except Exception:
+            total_openvpn += sum(1 for record in read_status_file(path) if record.name != "UNDEF")
+        except OSError:
             continue
 
     results["OpenVPN"] = total_openvpn
@@ -97,92 +82,112 @@ def count_blocked_clients():
 
 
 def get_system_info():
-    return state.cached_system_info
-
-
-def update_system_info():
-    file_paths = [
-        ("/etc/openvpn/server/logs/antizapret-udp-status.log", "UDP"),
-        ("/etc/openvpn/server/logs/antizapret-tcp-status.log", "TCP"),
-        ("/etc/openvpn/server/logs/vpn-udp-status.log", "VPN-UDP"),
-        ("/etc/openvpn/server/logs/vpn-tcp-status.log", "VPN-TCP"),
-    ]
-
-    while True:
-        current_time = time.time()
-        if not state.cached_system_info or (
-            current_time - state.last_fetch_time >= CACHE_DURATION
-        ):
-            cpu_percent = psutil.cpu_percent(interval=1)
-            ram_percent = psutil.virtual_memory().percent
-            timestamp = datetime.now()
-
-            state.cpu_history.append(
-                {"timestamp": timestamp, "cpu": cpu_percent, "ram": ram_percent}
-            )
-            if len(state.cpu_history) > MAX_CPU_HISTORY:
-                state.cpu_history.pop(0)
-
-            interface = get_default_interface()
-            network_stats = get_network_stats(interface) if interface else None
-            vpn_clients = count_online_clients(file_paths)
-            vpn_blocked = count_blocked_clients()
-            openvpn_expiring_certs = count_openvpn_expiring_certs()
-            vpn_services = get_vpn_systemd_states()
-
-            _mem = psutil.virtual_memory()
-            _disk = psutil.disk_usage("/")
-            memory_used_mb = round(_mem.used / (1024**2))
-            memory_total_mb = round(_mem.total / (1024**2))
-            memory_percent_mb = (
-                round((memory_used_mb / memory_total_mb) * 100, 1)
-                if memory_total_mb
-                else 0.0
-            )
-            state.cached_system_info = {
-                **HOST_STATIC_INFO,
-                "cpu_load": round(cpu_percent, 1),
-                "memory_used": memory_used_mb,
-                "memory_total": memory_total_mb,
-                "memory_percent": memory_percent_mb,
-                "disk_used": round(_disk.used / (1024**3), 1),
-                "disk_total": round(_disk.total / (1024**3), 1),
-                "network_load": get_network_load(),
-                "uptime": format_uptime(get_uptime()),
-                "network_interface": interface or "Не найдено",
-                "rx_bytes": format_bytes(network_stats["rx"]) if network_stats else 0,
-                "tx_bytes": format_bytes(network_stats["tx"]) if network_stats else 0,
-                "vpn_clients": vpn_clients,
-                "vpn_blocked": vpn_blocked,
-                "openvpn_expiring_certs": openvpn_expiring_certs,
-                "vpn_services": vpn_services,
-            }
-
-            state.last_fetch_time = current_time
-
-        time.sleep(CACHE_DURATION)
-
-
-def update_system_info_loop():
-    ensure_db()
-
-    while True:
-        now = time.time()
-        if now - state.last_collect >= SAMPLE_INTERVAL:
-            cpu = psutil.cpu_percent(interval=None)
-            ram = psutil.virtual_memory().percent
-            ts = datetime.now()
-            state.cpu_history.append({"timestamp": ts, "cpu": cpu, "ram": ram})
-            cutoff = datetime.now() - timedelta(seconds=MAX_HISTORY_SECONDS)
-            while state.cpu_history and state.cpu_history[0]["timestamp"] < cutoff:
-                state.cpu_history.pop(0)
-            state.last_collect = now
-
-        if now - state.last_db_save >= DB_SAVE_INTERVAL:
-            save_minute_average_to_db()
-            state.last_db_save = now
-
-        time.sleep(1)
+    """Последний снимок сборщика или None, если служба не публиковала его недавно."""
+    return read_state(SYSTEM_INFO_STATE_NAME, max_age=SYSTEM_INFO_MAX_AGE)
+
+
+def get_cpu_history():
+    """MetricHistory сборщика (разбирается один раз на публикацию) или None."""
+    return read_blob(CPU_HISTORY_STATE_NAME, MetricHistory.from_bytes, max_age=CPU_HISTORY_MAX_AGE)
+
+
+class CpuMeter:
+    """Загрузка CPU по разности счётчиков /proc/stat с прошлого замера, без ожидания.
+
+    У каждого потребителя свой замер: psutil.cpu_percent(interval=None) общий
+    на процесс, и два опроса с разной частотой сбивали бы друг другу интервал.
+    """
+
+    def __init__(self):
+        self.last = psutil.cpu_times()
+
+    @staticmethod
+    def _split(times):
+        # guest уже учтён в user (как в psutil.cpu_percent)
+        total = sum(times) - getattr(times, "guest", 0) - getattr(times, "guest_nice", 0)
+        return total, times.idle + getattr(times, "iowait", 0)
+
+    def percent(self):
+        times = psutil.cpu_times()
+        last, self.last = self.last, times
+        total, idle = self._split(times)
+        last_total, last_idle = self._split(last)
+        elapsed = total - last_total
+        if elapsed <= 0:
+            return 0.0
+        busy = elapsed - (idle - last_idle)
+        return round(min(100.0, max(0.0, busy / elapsed * 100)), 1)
+
+
+def take_cpu_sample(meter):
+    """(epoch, CPU %, RAM %); загрузка CPU — с прошлого замера meter."""
+    return time.time(), meter.percent(), psutil.virtual_memory().percent
+
+
+# Метрики снимка главной страницы: каждая возвращает свою часть полей,
+# частоту опроса задаёт сборщик (src/system_stats.py)
+
+
+def collect_cpu_memory(meter):
+    _mem = psutil.virtual_memory()
+    memory_used_mb = round(_mem.used / (1024**2))
+    memory_total_mb = round(_mem.total / (1024**2))
+    memory_percent_mb = (
+        round((memory_used_mb / memory_total_mb) * 100, 1)
+        if memory_total_mb
+        else 0.0
+    )
+    return {
+        "cpu_load": meter.percent(),
+        "memory_used": memory_used_mb,
+        "memory_total": memory_total_mb,
+        "memory_percent": memory_percent_mb,
+    }
+
+
+def collect_network(meter):
+    interface = get_default_interface()
+    network_stats = get_network_stats(interface) if interface else None
+    return {
+        "network_load": meter.load(),
+        "network_interface": interface or "Не найдено",
+        "rx_bytes": format_bytes(network_stats["rx"]) if network_stats else 0,
+        "tx_bytes": format_bytes(network_stats["tx"]) if network_stats else 0,
+    }
+
+
+def collect_disk():
+    _disk = psutil.disk_usage("/")
+    return {
+        "disk_used": round(_disk.used / (1024**3), 1),
+        "disk_total": round(_disk.total / (1024**3), 1),
+    }
+
+
+def collect_uptime():
+    return {"uptime": format_uptime_seconds(get_uptime_seconds())}
+
+
+def collect_clients():
+    return {"vpn_clients": count_online_clients(STATUS_FILE_PATHS)}
+
+
+def collect_blocked():
+    return {"vpn_blocked": count_blocked_clients()}
+
+
+def collect_services():
+    """Состояния VPN unit; снимок публикуется и для бота (systemd_watch)."""
+    states = query_units(VPN_SYSTEMD_UNIT_SET)
+    if states is not None:
+        publish_unit_states(states)
+    return {"vpn_services": get_vpn_systemd_states(states or {})}
+
+
+def collect_certs():
+    """Полная проверка .crt; обработчики запросов читают готовый индекс."""
+    refresh_cert_index()
+    return {"openvpn_expiring_certs": count_openvpn_expiring_certs()}
 
 
 def get_vnstat_interfaces():
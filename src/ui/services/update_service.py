@@ -7,7 +7,6 @@ import requests
 from packaging.version import InvalidVersion, Version
 
 from src.ui.constants import BASE_DIR, GITHUB_REPO, UPDATE_LOG_PATH, UPDATE_SCRIPT
-from src.ui.services.system_info_service import get_git_version
 
 UPDATE_CHECK_TTL = 900
 UPDATE_LOCK_PATH = "/tmp/statusopenvpn-update.lock"
@@ -29,10 +28,6 @@ def normalize_version_tag(tag):
         return None
 
 
-def get_current_version():
-    return get_git_version()
-
-
 def _fetch_github_tags():
     url = f"https://api.github.com/repos/{GITHUB_REPO}/tags"
     response = requests.get(url, params={"per_page": 100}, timeout=15)
@@ -72,18 +67,6 @@ def get_latest_github_version():
         return None, str(exc)
 
 
-def is_update_available():
-    current = get_current_version()
-    latest, _error = get_latest_github_version()
-    if not latest or current == "unknown":
-        return False, current, latest
-    current_v = normalize_version_tag(current)
-    latest_v = normalize_version_tag(latest)
-    if current_v is None or latest_v is None:
-        return False, current, latest
-    return latest_v > current_v, current, latest
-
-
 def is_update_running():
     if not os.path.isfile(UPDATE_LOCK_PATH):
         return False
@@ -1,43 +1,32 @@
 import subprocess
 
+from src.systemd_watch import query_units
 from src.ui.constants import VPN_SYSTEMD_UNITS, VPN_SYSTEMD_UNIT_SET
 
 
-def get_vpn_systemd_states():
-    """Состояние ActiveState через systemctl is-active для каждого unit."""
-    rows = []
-    for unit, label, kind in VPN_SYSTEMD_UNITS:
-        state = "unknown"
-        try:
-            completed = subprocess.run(
-                ["/bin/systemctl", "is-active", unit],
-                capture_output=True,
-                text=True,
-                timeout=8,
-            )
-            st = (completed.stdout or "").strip()
-            if st:
-                state = st
-            else:
-                load = subprocess.run(
-                    ["/bin/systemctl", "show", "-p", "LoadState", "--value", unit],
-                    capture_output=True,
-                    text=True,
-                    timeout=8,
-                )
-                if (load.stdout or "").strip() == "not-found":
-                    state = "not-found"
-        except (FileNotFoundError, subprocess.TimeoutExpired, OSError):
-            state = "unknown"
-        rows.append(
-            {
-                "unit": unit,
-                "label": label,
-                "kind": kind,
-                "state": state,
-            }
-        )
-    return rows
+def vpn_unit_state(props):
+    """ActiveState unit для панели; not-found — unit не установлен."""
+    if not props:
+        return "unknown"
+    if props["LoadState"] == "not-found":
+        return "not-found"
+    return props["ActiveState"] or "unknown"
+
+
+def get_vpn_systemd_states(states=None):
+    """Состояния VPN unit; states — свойства из systemd_watch, иначе один
+    пакетный вызов systemctl show на все unit."""
+    if states is None:
+        states = query_units(unit for unit, _, _ in VPN_SYSTEMD_UNITS) or {}
+    return [
+        {
+            "unit": unit,
+            "label": label,
+            "kind": kind,
+            "state": vpn_unit_state(states.get(unit)),
+        }
+        for unit, label, kind in VPN_SYSTEMD_UNITS
+    ]
 
 
 def restart_vpn_systemd_unit(unit: str) -> tuple[bool, str]:
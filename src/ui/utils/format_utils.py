@@ -1,8 +1,5 @@
 import base64
-import re
-from datetime import datetime, timezone
-
-from tzlocal import get_localzone
+from datetime import datetime
 
 
 def humanize_bytes(num, suffix="B"):
@@ -73,31 +70,19 @@ def mask_ip(ip_address, hide=True):
     return ip_address
 
 
-def format_uptime(uptime_string):
-    pattern = r"(?:(\d+)\s*years?|(\d+)\s*months?|(\d+)\s*weeks?|(\d+)\s*days?|(\d+)\s*hours?|(\d+)\s*minutes?)"
-
-    years = months = weeks = days = hours = minutes = 0
-    matches = re.findall(pattern, uptime_string)
-
-    for match in matches:
-        if match[0]:
-            years = int(match[0])
-        elif match[1]:
-            months = int(match[1])
-        elif match[2]:
-            weeks = int(match[2])
-        elif match[3]:
-            days = int(match[3])
-        elif match[4]:
-            hours = int(match[4])
-        elif match[5]:
-            minutes = int(match[5])
+def format_uptime_seconds(seconds):
+    """Время работы в виде `uptime -p` по-русски: "1 нед. 2 дн. 3 ч. 4 мин."."""
+    if seconds is None:
+        return ""
+    minutes_total = int(seconds) // 60
+    days_total, rest = divmod(minutes_total, 24 * 60)
+    hours, minutes = divmod(rest, 60)
+    years, days_total = divmod(days_total, 365)
+    weeks, days = divmod(days_total, 7)
 
     result = []
     if years > 0:
         result.append(f"{years} г.")
-    if months > 0:
-        result.append(f"{months} мес.")
     if weeks > 0:
         result.append(f"{weeks} нед.")
     if days > 0:
@@ -133,37 +118,26 @@ def format_duration(start_time):
         return f"{seconds} сек."
 
 
-def format_date(date_string):
-    date_obj = datetime.strptime(date_string, "%Y-%m-%d %H:%M:%S")
-    server_timezone = get_localzone()
-    localized_date = date_obj.replace(tzinfo=server_timezone)
-    utc_date = localized_date.astimezone(timezone.utc)
-    return utc_date.isoformat()
-
-
-def format_handshake_time(handshake_string):
-    time_units = re.findall(r"(\d+)\s+(\w+)", handshake_string)
-
-    abbreviations = {
-        "year": "г.",
-        "years": "г.",
-        "month": "мес.",
-        "months": "мес.",
-        "week": "нед.",
-        "weeks": "нед.",
-        "day": "дн.",
-        "days": "дн.",
-        "hour": "ч.",
-        "hours": "ч.",
-        "minute": "мин.",
-        "minutes": "мин.",
-        "second": "сек.",
-        "seconds": "сек.",
-    }
-
-    return " ".join(
-        f"{value} {abbreviations[unit]}" for value, unit in time_units
-    )
+HANDSHAKE_UNITS = (
+    (365 * 86400, "г."),
+    (86400, "дн."),
+    (3600, "ч."),
+    (60, "мин."),
+    (1, "сек."),
+)
+
+
+def format_handshake_age(seconds):
+    """Давность рукопожатия WireGuard в секундах -> «1 ч. 5 мин. 3 сек.»."""
+    seconds = int(seconds)
+    if seconds <= 0:
+        return "Now"
+    parts = []
+    for size, label in HANDSHAKE_UNITS:
+        value, seconds = divmod(seconds, size)
+        if value:
+            parts.append(f"{value} {label}")
+    return " ".join(parts)
 
 
 def normalize_real_address(addr):
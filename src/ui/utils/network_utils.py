@@ -1,21 +1,34 @@
-import subprocess
+import ipaddress
 import time
 
 import psutil
 import requests
 
 
-def get_default_interface():
+ROUTE_PATH = "/proc/net/route"
+UPTIME_PATH = "/proc/uptime"
+RTF_UP = 0x1
+
+
+def get_default_interface(route_path=ROUTE_PATH):
+    """Интерфейс IPv4-маршрута по умолчанию с наименьшей метрикой (как первый в `ip route`)."""
+    best = None
     try:
-        result = subprocess.run(
-            ["/usr/bin/ip", "route"], capture_output=True, text=True, check=True
-        )
-        for line in result.stdout.splitlines():
-            if "default" in line:
-                return line.split()[4]
-    except Exception as e:
-        print(f"Ошибка: {e}")
-    return None
+        with open(route_path, "r", encoding="utf-8") as f:
+            next(f, None)
+            for line in f:
+                # Iface Destination Gateway Flags RefCnt Use Metric Mask ...
+                fields = line.split()
+                if len(fields) < 8 or fields[1] != "00000000" or fields[7] != "00000000":
+                    continue
+                if not int(fields[3], 16) & RTF_UP:
+                    continue
+                metric = int(fields[6])
+                if best is None or metric < best[0]:
+                    best = (metric, fields[0])
+    except (OSError, ValueError) as e:
+        print(f"Ошибка чтения {route_path}: {e}")
+    return best[1] if best else None
 
 
 def get_network_stats(interface):
@@ -33,56 +46,65 @@ def get_network_stats(interface):
         return None
 
 
-def get_network_load():
-    net_io_start = psutil.net_io_counters(pernic=True)
-    time.sleep(1)
-    net_io_end = psutil.net_io_counters(pernic=True)
+class NetworkMeter:
+    """Скорость интерфейсов в Мбит/с по разности счётчиков с прошлого замера, без ожидания."""
 
-    network_data = {}
-    for interface in net_io_start:
-        if interface == "lo":
-            continue
+    def __init__(self):
+        self.last = psutil.net_io_counters(pernic=True)
+        self.last_at = time.monotonic()
 
-        sent_start, recv_start = (
-            net_io_start[interface].bytes_sent,
-            net_io_start[interface].bytes_recv,
-        )
-        sent_end, recv_end = (
-            net_io_end[interface].bytes_sent,
-            net_io_end[interface].bytes_recv,
-        )
+    def load(self):
+        counters = psutil.net_io_counters(pernic=True)
+        now = time.monotonic()
+        last, self.last = self.last, counters
+        elapsed, self.last_at = now - self.last_at, now
+        if elapsed <= 0:
+            return {}
 
-        sent_speed = (sent_end - sent_start) * 8 / 1e6
-        recv_speed = (recv_end - recv_start) * 8 / 1e6
+        network_data = {}
+        for interface, end in counters.items():
+            start = last.get(interface)
+            if interface == "lo" or start is None:
+                continue
+            # Счётчик сбросился (интерфейс пересоздан) — интервал пропускается
+            if end.bytes_sent < start.bytes_sent or end.bytes_recv < start.bytes_recv:
+                continue
 
-        if sent_speed > 0 or recv_speed > 0:
-            network_data[interface] = {
-                "sent_speed": round(sent_speed, 2),
-                "recv_speed": round(recv_speed, 2),
-            }
+            sent_speed = (end.bytes_sent - start.bytes_sent) * 8 / 1e6 / elapsed
+            recv_speed = (end.bytes_recv - start.bytes_recv) * 8 / 1e6 / elapsed
 
-    return network_data
+            if sent_speed > 0 or recv_speed > 0:
+                network_data[interface] = {
+                    "sent_speed": round(sent_speed, 2),
+                    "recv_speed": round(recv_speed, 2),
+                }
 
+        return network_data
 
-def get_uptime():
+
+def get_uptime_seconds(uptime_path=UPTIME_PATH):
+    """Время работы системы в секундах из /proc/uptime; None при ошибке."""
     try:
-        uptime = (
-            subprocess.check_output("/usr/bin/uptime -p", shell=True).decode().strip()
-        )
-    except subprocess.CalledProcessError:
-        uptime = "Не удалось получить время работы"
-    return uptime
+        with open(uptime_path, "r", encoding="utf-8") as f:
+            return float(f.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
 
 
-def get_external_ip():
+def fetch_external_ip():
+    """(внешний IP, ошибка) по ответу api.ipify.org; запрос идёт в сеть — только из фонового обновления."""
     try:
         response = requests.get("https://api.ipify.org", timeout=10)
-        if response.status_code == 200:
-            return response.text
-        return "IP не найден"
+        if response.status_code != 200:
+            return None, f"HTTP {response.status_code}"
+        value = response.text.strip()
+        ipaddress.ip_address(value)
+        return value, None
+    except ValueError:
+        return None, "некорректный ответ api.ipify.org"
     except requests.Timeout:
-        return "Ошибка: запрос превысил время ожидания."
+        return None, "запрос превысил время ожидания."
     except requests.ConnectionError:
-        return "Ошибка: нет подключения к интернету."
+        return None, "нет подключения к интернету."
     except requests.RequestException as e:
-        return f"Ошибка при запросе: {e}"
+        return None, f"Ошибка при запросе: {e}"
@@ -0,0 +1,159 @@
+"""Снимок WireGuard: generic netlink или `wg show all dump`.
+
+Один источник для сборщика статистики, веб-интерфейса и бота. Сначала
+устройства читаются через netlink (wg_netlink) без запуска процесса; если
+netlink недоступен, используется `wg show all dump`. В обоих случаях
+счётчики трафика — точные байты, latest handshake — UTC epoch (0, если
+рукопожатия не было). В dump строка интерфейса содержит 5 полей, строка пира — 9.
+
+STATUSOPENVPN_WG_NETLINK=0 отключает netlink.
+"""
+
+import asyncio
+import os
+import subprocess
+import time
+from collections import namedtuple
+
+from src import wg_netlink
+from src.runtime_state import read_state
+
+WG_BINARY = "/usr/bin/wg"
+ONLINE_HANDSHAKE_SECONDS = 180  # Пир онлайн, если рукопожатие было не раньше
+NETLINK_ENABLED = os.environ.get("STATUSOPENVPN_WG_NETLINK", "1") != "0"
+NETLINK_RETRY_INTERVAL = 60  # После ошибки netlink столько секунд работает `wg`
+RATES_STATE_NAME = "wireguard_rates.json"  # Скорости пиров, публикует wg_stats
+RATES_MAX_AGE = 65  # Старше — сборщик не работает, скорости не показываются
+
+Interface = namedtuple("Interface", ["name", "public_key", "listen_port"])
+Peer = namedtuple(
+    "Peer",
+    [
+        "interface",
+        "public_key",
+        "endpoint",  # None, если пир ещё не подключался
+        "allowed_ips",  # Список подсетей
+        "latest_handshake",  # UTC epoch или 0
+        "received",
+        "sent",
+    ],
+)
+
+_netlink_retry_at = 0.0
+_netlink_warned = False
+# (разобранный файл скоростей, индекс по пирам): файл не менялся — индекс тот же
+_rates_cache = (None, {})
+
+
+def _none(value):
+    return None if value in ("(none)", "off", "") else value
+
+
+def parse_dump(output):
+    """Возвращает (интерфейсы, пиры) из вывода `wg show all dump`."""
+    interfaces = []
+    peers = []
+    for line in (output or "").splitlines():
+        parts = line.split("\t")
+        if len(parts) == 9:
+            allowed_ips = _none(parts[4])
+            peers.append(
+                Peer(
+                    parts[0],
+                    parts[1],
+                    _none(parts[3]),
+                    allowed_ips.split(",") if allowed_ips else [],
+                    int(parts[5]) if parts[5].isdigit() else 0,
+                    int(parts[6]) if parts[6].isdigit() else 0,
+                    int(parts[7]) if parts[7].isdigit() else 0,
+                )
+            )
+        elif len(parts) == 5:
+            # Приватный ключ (второе поле) не сохраняется
+            interfaces.append(Interface(parts[0], parts[2], parts[3]))
+    return interfaces, peers
+
+
+def read_dump():
+    """Вывод `wg show all dump` или пустая строка при ошибке."""
+    try:
+        result = subprocess.run(
+            [WG_BINARY, "show", "all", "dump"], capture_output=True, text=True, check=True
+        )
+        return result.stdout
+    except subprocess.CalledProcessError as e:
+        print(f"Команда wg show завершилась с ошибкой: {e.stderr}")
+    except FileNotFoundError:
+        print("Команда wg не найдена. Убедитесь, что WireGuard установлен и доступен в системе.")
+    return ""
+
+
+async def read_dump_async():
+    """read_dump для event loop бота: без блокировки на время работы wg."""
+    try:
+        process = await asyncio.create_subprocess_exec(
+            WG_BINARY, "show", "all", "dump",
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        stdout, _ = await process.communicate()
+    except OSError:
+        return ""
+    if process.returncode != 0:
+        return ""
+    return stdout.decode()
+
+
+def collect_netlink():
+    """Снимок через netlink или None, если нужен `wg`."""
+    global _netlink_retry_at, _netlink_warned
+    if not NETLINK_ENABLED or time.monotonic() < _netlink_retry_at:
+        return None
+    try:
+        interfaces, peers = wg_netlink.get_devices()
+    except OSError as e:
+        _netlink_retry_at = time.monotonic() + NETLINK_RETRY_INTERVAL
+        if not _netlink_warned:
+            _netlink_warned = True
+            print(f"WireGuard netlink недоступен, используется wg: {e}")
+        return None
+    return [Interface._make(item) for item in interfaces], [Peer._make(item) for item in peers]
+
+
+def collect():
+    """Текущий снимок: (интерфейсы, пиры)."""
+    snapshot = collect_netlink()
+    if snapshot is None:
+        snapshot = parse_dump(read_dump())
+    return snapshot
+
+
+async def collect_async():
+    snapshot = collect_netlink()
+    if snapshot is None:
+        snapshot = parse_dump(await read_dump_async())
+    return snapshot
+
+
+def is_online(peer, now=None):
+    if not peer.latest_handshake:
+        return False
+    return (now or time.time()) - peer.latest_handshake < ONLINE_HANDSHAKE_SECONDS
+
+
+def read_live_rates(max_age=RATES_MAX_AGE):
+    """Скорости пиров от wg_stats: {(интерфейс, ключ): (приём, передача, пик приёма, пик передачи)} в байт/с."""
+    global _rates_cache
+    state = read_state(RATES_STATE_NAME, max_age=max_age)
+    if not state:
+        return {}
+    if _rates_cache[0] is not state:
+        _rates_cache = (
+            state,
+            {
+                (interface, public_key): tuple(rates)
+                for interface, peers in state.get("peers", {}).items()
+                for public_key, rates in peers.items()
+            },
+        )
+    return _rates_cache[1]
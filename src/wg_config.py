@@ -0,0 +1,122 @@
+"""Модель конфигураций WireGuard (/etc/wireguard/<interface>.conf).
+
+Один разбор для сборщика статистики, веб-интерфейса и бота. Каждый файл
+разбирается в индекс публичный ключ -> PeerConfig и перечитывается, только
+если изменился (inode, размер, mtime): повторный запрос стоит одного stat().
+
+Блок пира начинается строкой "# Client = имя" (если она есть) или [Peer] и
+длится до следующего блока или [Interface]. Отключённый пир закомментирован
+префиксом "#~ " (см. wireguard_service.toggle_peer_config).
+"""
+
+import os
+from collections import namedtuple
+
+CONFIG_DIR = "/etc/wireguard"
+CONFIG_INTERFACES = ("vpn", "antizapret")
+DISABLED_PREFIX = "#~ "
+
+PeerConfig = namedtuple(
+    "PeerConfig",
+    [
+        "public_key",
+        "client",  # Имя из "# Client =" или "N/A"
+        "enabled",  # False, если блок закомментирован "#~ "
+        "allowed_ips",  # Кортеж подсетей
+        "start",  # Первая строка блока (индекс с 0)
+        "end",  # Строка после блока
+    ],
+)
+
+_MISSING = {}  # Общий пустой индекс отсутствующего файла: кэш client_mapping не сбрасывается
+# Путь -> ((inode, size, mtime_ns), {публичный ключ: PeerConfig})
+_file_cache = {}
+# Интерфейсы -> (индексы конфигов, по которым построено, {ключ: имя клиента})
+_mapping_cache = {}
+
+
+def config_path(interface):
+    return os.path.join(CONFIG_DIR, f"{interface}.conf")
+
+
+def parse_config(lines):
+    """{публичный ключ: PeerConfig} в порядке следования пиров в файле."""
+    peers = {}
+    block = None  # [start, client, enabled, public_key, allowed_ips] текущего пира
+    client = client_line = None
+
+    def close(end):
+        if block and block[3]:
+            peers[block[3]] = PeerConfig(block[3], block[1], block[2], block[4], block[0], end)
+
+    for index, line in enumerate(lines):
+        stripped = line.strip()
+        if stripped.startswith("# Client ="):
+            close(index)
+            block = None
+            client = stripped.split("=", 1)[1].strip()
+            client_line = index
+            continue
+
+        enabled = not stripped.startswith(DISABLED_PREFIX)
+        clean = stripped if enabled else stripped[len(DISABLED_PREFIX):]
+        if clean.startswith("[Peer]"):
+            close(index)
+            start = client_line if client_line is not None else index
+            block = [start, client or "N/A", enabled, None, ()]
+            client = client_line = None
+        elif clean.startswith("[Interface]"):
+            close(index)
+            block = None
+            client = client_line = None
+        elif block is not None:
+            if clean.startswith("PublicKey ="):
+                block[3] = clean.split("=", 1)[1].strip()
+            elif clean.startswith("AllowedIPs ="):
+                block[4] = tuple(
+                    ip.strip() for ip in clean.split("=", 1)[1].split(",") if ip.strip()
+                )
+    close(len(lines))
+    return peers
+
+
+def load_config(path):
+    """Индекс пиров файла; неизменный файл не перечитывается, отсутствующий — {}."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        _file_cache.pop(path, None)
+        return _MISSING
+    key = (st.st_ino, st.st_size, st.st_mtime_ns)
+    cached = _file_cache.get(path)
+    if cached and cached[0] == key:
+        return cached[1]
+
+    with open(path, "r", encoding="utf-8") as f:
+        peers = parse_config(f.readlines())
+    _file_cache[path] = (key, peers)
+    return peers
+
+
+def get_peers(interface):
+    return load_config(config_path(interface))
+
+
+def client_mapping(interfaces=CONFIG_INTERFACES):
+    """{публичный ключ: имя клиента} включённых пиров; при дубликате побеждает последний интерфейс."""
+    configs = tuple(get_peers(interface) for interface in interfaces)
+    cached = _mapping_cache.get(interfaces)
+    if cached and len(cached[0]) == len(configs) and all(
+        old is new for old, new in zip(cached[0], configs)
+    ):
+        return cached[1]
+
+    mapping = {}
+    for peers in configs:
+        mapping.update((key, peer.client) for key, peer in peers.items() if peer.enabled)
+    _mapping_cache[interfaces] = (configs, mapping)
+    return mapping
+
+
+def disabled_peers(interface):
+    return [peer for peer in get_peers(interface).values() if not peer.enabled]
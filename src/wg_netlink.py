@@ -0,0 +1,363 @@
+"""Чтение устройств WireGuard через generic netlink без запуска `wg`.
+
+Запрос WG_CMD_GET_DEVICE к семейству "wireguard" возвращает то же, что
+`wg show all dump`: ключи, порт, endpoint, allowed ips, время рукопожатия и
+счётчики. Нужны права CAP_NET_ADMIN (как у `wg`). Ошибки netlink поднимаются
+как OSError — вызывающий (wg_collector) переходит на `wg`.
+
+Устройство с большим числом пиров ядро отдаёт несколькими сообщениями;
+пир, чьи allowed ips не поместились, повторяется в начале следующего.
+"""
+
+import base64
+import errno
+import os
+import socket
+import struct
+
+NETLINK_GENERIC = 16
+GENL_ID_CTRL = 0x10
+CTRL_CMD_GETFAMILY = 3
+CTRL_ATTR_FAMILY_ID = 1
+CTRL_ATTR_FAMILY_NAME = 2
+
+NLM_F_REQUEST = 0x1
+NLM_F_MULTI = 0x2
+NLM_F_ACK = 0x4
+NLM_F_DUMP = 0x300
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+NLA_TYPE_MASK = 0x3FFF  # Без флагов NLA_F_NESTED и NLA_F_NET_BYTEORDER
+
+WG_GENL_NAME = "wireguard"
+WG_GENL_VERSION = 1
+WG_CMD_GET_DEVICE = 0
+
+WGDEVICE_A_IFNAME = 2
+WGDEVICE_A_PUBLIC_KEY = 4
+WGDEVICE_A_LISTEN_PORT = 6
+WGDEVICE_A_PEERS = 8
+
+WGPEER_A_PUBLIC_KEY = 1
+WGPEER_A_ENDPOINT = 4
+WGPEER_A_LAST_HANDSHAKE_TIME = 6
+WGPEER_A_RX_BYTES = 7
+WGPEER_A_TX_BYTES = 8
+WGPEER_A_ALLOWEDIPS = 9
+
+WGALLOWEDIP_A_FAMILY = 1
+WGALLOWEDIP_A_IPADDR = 2
+WGALLOWEDIP_A_CIDR_MASK = 3
+
+SYS_CLASS_NET = "/sys/class/net"
+RECV_BUFFER = 65536
+
+NLMSG_HEADER = struct.Struct("=IHHII")
+GENL_HEADER = struct.Struct("=BBH")
+NLA_HEADER = struct.Struct("=HH")
+U16 = struct.Struct("=H")
+PORT = struct.Struct("!H")
+U64 = struct.Struct("=Q")
+TIMESPEC = struct.Struct("=qq")
+
+DECODE_CACHE_LIMIT = 65536
+
+# Id семейства назначается при загрузке модуля ядра, запоминается до ошибки
+_family_id = None
+# (тип атрибута, байты) -> значение: ключи, endpoint и allowed ips между опросами не меняются
+_decode_cache = {}
+# (длина пира, первый атрибут) -> раскладка пира (_peer_layout)
+_layout_cache = {}
+
+
+def encode_attr(attr_type, payload):
+    length = NLA_HEADER.size + len(payload)
+    return NLA_HEADER.pack(length, attr_type) + payload + b"\0" * (-length % 4)
+
+
+def split_attrs(data, unpack_from=NLA_HEADER.unpack_from):
+    """[(тип, значение)] атрибутов netlink подряд в data."""
+    attrs = []
+    offset = 0
+    end = len(data) - 3
+    while offset < end:
+        length, attr_type = unpack_from(data, offset)
+        if length < 4:
+            break
+        attrs.append((attr_type & NLA_TYPE_MASK, data[offset + 4:offset + length]))
+        offset += (length + 3) & ~3
+    return attrs
+
+
+def open_socket():
+    sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW | socket.SOCK_CLOEXEC, NETLINK_GENERIC)
+    sock.bind((0, 0))
+    return sock
+
+
+def request(sock, family, flags, cmd, version, attrs, seq):
+    """Отправляет запрос generic netlink; возвращает полезные нагрузки ответов.
+
+    Нагрузка — атрибуты после заголовка genl. Ошибка ядра — OSError с его errno.
+    """
+    payload = GENL_HEADER.pack(cmd, version, 0) + attrs
+    sock.send(
+        NLMSG_HEADER.pack(NLMSG_HEADER.size + len(payload), family, NLM_F_REQUEST | flags, seq, 0)
+        + payload
+    )
+    messages = []
+    while True:
+        data = sock.recv(RECV_BUFFER)
+        offset = 0
+        while offset + NLMSG_HEADER.size <= len(data):
+            length, msg_type, msg_flags, msg_seq, _ = NLMSG_HEADER.unpack_from(data, offset)
+            if length < NLMSG_HEADER.size:
+                raise OSError(errno.EBADMSG, "повреждённое сообщение netlink")
+            body = data[offset + NLMSG_HEADER.size:offset + length]
+            offset += (length + 3) & ~3
+            if msg_seq != seq:
+                continue
+            if msg_type == NLMSG_DONE:
+                return messages
+            if msg_type == NLMSG_ERROR:
+                error = struct.unpack_from("=i", body)[0]
+                if error:
+                    raise OSError(-error, os.strerror(-error))
+                return messages  # ACK
+            messages.append(body[GENL_HEADER.size:])
+            if not msg_flags & NLM_F_MULTI and not flags & NLM_F_DUMP:
+                return messages
+
+
+def resolve_family(sock, seq=1):
+    global _family_id
+    if _family_id is None:
+        attrs = encode_attr(CTRL_ATTR_FAMILY_NAME, WG_GENL_NAME.encode() + b"\0")
+        for message in request(sock, GENL_ID_CTRL, NLM_F_ACK, CTRL_CMD_GETFAMILY, 1, attrs, seq):
+            for attr_type, value in split_attrs(message):
+                if attr_type == CTRL_ATTR_FAMILY_ID:
+                    _family_id = U16.unpack(value[:2])[0]
+        if _family_id is None:
+            raise OSError(errno.ENOENT, "семейство netlink wireguard не найдено")
+    return _family_id
+
+
+def wireguard_interfaces(sys_class_net=SYS_CLASS_NET):
+    """Имена интерфейсов WireGuard: DEVTYPE=wireguard в uevent."""
+    names = []
+    try:
+        entries = os.listdir(sys_class_net)
+    except OSError:
+        return names
+    for name in sorted(entries):
+        try:
+            with open(os.path.join(sys_class_net, name, "uevent"), "rb") as f:
+                if b"DEVTYPE=wireguard\n" in f.read():
+                    names.append(name)
+        except OSError:
+            continue
+    return names
+
+
+def _format_endpoint(value):
+    family = U16.unpack_from(value)[0]
+    port = PORT.unpack_from(value, 2)[0]
+    if family == socket.AF_INET:
+        return f"{socket.inet_ntop(socket.AF_INET, value[4:8])}:{port}"
+    if family == socket.AF_INET6:
+        return f"[{socket.inet_ntop(socket.AF_INET6, value[8:24])}]:{port}"
+    return None
+
+
+def _allowed_ips(data):
+    result = []
+    for _, value in split_attrs(data):
+        family = address = cidr = None
+        for attr_type, item in split_attrs(value):
+            if attr_type == WGALLOWEDIP_A_IPADDR:
+                address = item
+            elif attr_type == WGALLOWEDIP_A_CIDR_MASK:
+                cidr = item[0]
+            elif attr_type == WGALLOWEDIP_A_FAMILY:
+                family = U16.unpack_from(item)[0]
+        if family is not None and address is not None and cidr is not None:
+            result.append(f"{socket.inet_ntop(family, address)}/{cidr}")
+    return result
+
+
+DECODERS = {
+    WGPEER_A_PUBLIC_KEY: lambda value: base64.b64encode(value).decode(),
+    WGPEER_A_ENDPOINT: _format_endpoint,
+    WGPEER_A_ALLOWEDIPS: lambda value: tuple(_allowed_ips(value)),
+}
+
+
+def _decode(cache, attr_type, value):
+    """Строковое значение атрибута пира через кэш; None, если атрибута нет."""
+    if value is None:
+        return None
+    cache_key = (attr_type, value)
+    decoded = cache.get(cache_key)
+    if decoded is None:
+        decoded = cache[cache_key] = DECODERS[attr_type](value)
+    return decoded
+
+
+def _peer_layout(data, offset, peer_end, cache):
+    """Разбор пира по всем атрибутам; возвращает раскладку для _layout_cache.
+
+    Раскладка: смещения рукопожатия и счётчиков от начала пира (None, если
+    атрибута нет), диапазоны и сырые байты endpoint и allowed ips, ключ и
+    разобранные значения.
+    """
+    header = NLA_HEADER.unpack_from
+    offsets = {}
+    raw = {WGPEER_A_PUBLIC_KEY: None, WGPEER_A_ENDPOINT: None, WGPEER_A_ALLOWEDIPS: None}
+    ranges = {WGPEER_A_ENDPOINT: (0, 0), WGPEER_A_ALLOWEDIPS: (0, 0)}
+    position = offset + 4
+    while position < peer_end - 3:
+        length, attr_type = header(data, position)
+        if length < 4:
+            break
+        attr_type &= NLA_TYPE_MASK
+        if attr_type in (WGPEER_A_LAST_HANDSHAKE_TIME, WGPEER_A_RX_BYTES, WGPEER_A_TX_BYTES):
+            offsets[attr_type] = position + 4 - offset
+        elif attr_type in raw:
+            raw[attr_type] = data[position + 4:position + length]
+            if attr_type in ranges:
+                ranges[attr_type] = (position + 4 - offset, position + length - offset)
+        position += (length + 3) & ~3
+    return (
+        offsets.get(WGPEER_A_LAST_HANDSHAKE_TIME),
+        offsets.get(WGPEER_A_RX_BYTES),
+        offsets.get(WGPEER_A_TX_BYTES),
+        ranges[WGPEER_A_ENDPOINT],
+        raw[WGPEER_A_ENDPOINT] or b"",
+        ranges[WGPEER_A_ALLOWEDIPS],
+        raw[WGPEER_A_ALLOWEDIPS] or b"",
+        _decode(cache, WGPEER_A_PUBLIC_KEY, raw[WGPEER_A_PUBLIC_KEY]),
+        _decode(cache, WGPEER_A_ENDPOINT, raw[WGPEER_A_ENDPOINT]),
+        _decode(cache, WGPEER_A_ALLOWEDIPS, raw[WGPEER_A_ALLOWEDIPS]) or (),
+    )
+
+
+def _parse_peers(data, peers, cache):
+    """Дописывает в peers пиры из атрибута WGDEVICE_A_PEERS.
+
+    Между опросами у пира меняются только рукопожатие и счётчики, а набор
+    и размеры атрибутов те же. Поэтому раскладка пира запоминается по его
+    длине и первому атрибуту (ключу), и при следующем опросе числа читаются
+    по известным смещениям. Раскладка используется, только если endpoint и
+    allowed ips побайтно совпали с запомненными.
+    """
+    header = NLA_HEADER.unpack_from
+    u64 = U64.unpack_from
+    timespec = TIMESPEC.unpack_from
+    layouts = _layout_cache
+    offset = 0
+    data_end = len(data) - 3
+    while offset < data_end:
+        peer_length = header(data, offset)[0]
+        if peer_length < 8:
+            break
+        first_length = header(data, offset + 4)[0]
+        layout_key = (peer_length, data[offset + 8:offset + 4 + first_length])
+        layout = layouts.get(layout_key)
+        if layout is not None:
+            endpoint_range, endpoint_raw = layout[3], layout[4]
+            allowed_range, allowed_raw = layout[5], layout[6]
+            if (
+                data[offset + endpoint_range[0]:offset + endpoint_range[1]] != endpoint_raw
+                or data[offset + allowed_range[0]:offset + allowed_range[1]] != allowed_raw
+            ):
+                layout = None
+        if layout is None:
+            layout = _peer_layout(data, offset, offset + peer_length, cache)
+            if len(layouts) >= DECODE_CACHE_LIMIT:
+                layouts.clear()
+            layouts[layout_key] = layout
+        handshake_at, received_at, sent_at = layout[0], layout[1], layout[2]
+        key, endpoint, allowed_ips = layout[7], layout[8], list(layout[9])
+        if received_at is None and peers and peers[-1][1] == key:
+            # Продолжение пира из прошлого сообщения: только allowed ips
+            peers[-1][3].extend(allowed_ips)
+        else:
+            peers.append(
+                [
+                    None,
+                    key,
+                    endpoint,
+                    allowed_ips,
+                    timespec(data, offset + handshake_at)[0] if handshake_at else 0,
+                    u64(data, offset + received_at)[0] if received_at else 0,
+                    u64(data, offset + sent_at)[0] if sent_at else 0,
+                ]
+            )
+        offset += (peer_length + 3) & ~3
+
+
+def parse_device_messages(messages):
+    """Сообщения одного устройства -> (интерфейс, пиры) в полях wg_collector.
+
+    Интерфейс: (name, public_key, listen_port); пир: (interface, public_key,
+    endpoint, allowed_ips, latest_handshake, received, sent).
+    """
+    name = public_key = None
+    listen_port = "0"
+    peers = []
+    cache = _decode_cache
+    if len(cache) >= DECODE_CACHE_LIMIT:
+        cache.clear()
+    for message in messages:
+        for attr_type, value in split_attrs(message):
+            if attr_type == WGDEVICE_A_PEERS:
+                _parse_peers(value, peers, cache)
+            elif attr_type == WGDEVICE_A_IFNAME:
+                name = value.split(b"\0", 1)[0].decode()
+            elif attr_type == WGDEVICE_A_PUBLIC_KEY:
+                public_key = base64.b64encode(value).decode()
+            elif attr_type == WGDEVICE_A_LISTEN_PORT:
+                listen_port = str(U16.unpack_from(value)[0])
+    for peer in peers:
+        peer[0] = name
+    return (name, public_key, listen_port), [tuple(peer) for peer in peers]
+
+
+def get_devices(interfaces=None, connect=open_socket):
+    """(интерфейсы, пиры) всех устройств WireGuard; OSError при ошибке netlink."""
+    global _family_id
+    if interfaces is None:
+        interfaces = wireguard_interfaces()
+        if not interfaces:
+            # Нет интерфейсов ядра: WireGuard выключен или работает в userspace (wireguard-go)
+            raise OSError(errno.ENODEV, "нет интерфейсов WireGuard в ядре")
+    result_interfaces = []
+    result_peers = []
+
+    sock = connect()
+    try:
+        try:
+            family = resolve_family(sock)
+        except OSError:
+            _family_id = None
+            raise
+        for seq, name in enumerate(interfaces, start=2):
+            attrs = encode_attr(WGDEVICE_A_IFNAME, name.encode() + b"\0")
+            try:
+                messages = request(
+                    sock, family, NLM_F_ACK | NLM_F_DUMP, WG_CMD_GET_DEVICE,
+                    WG_GENL_VERSION, attrs, seq,
+                )
+            except OSError as e:
+                if e.errno == errno.ENODEV:
+                    # Интерфейс удалён между чтением /sys и запросом
+                    continue
+                # Модуль перезагружен — id семейства мог смениться
+                _family_id = None
+                raise
+            interface, peers = parse_device_messages(messages)
+            result_interfaces.append(interface)
+            result_peers.extend(peers)
+    finally:
+        sock.close()
+    return result_interfaces, result_peers
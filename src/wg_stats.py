@@ -1,22 +1,49 @@
 #!/root/web/venv/bin/python
 """empty"""
 
-from datetime import datetime, timedelta
 import os
 import time
 import sqlite3
-import subprocess
+import sys
 import json
-import schedule
+import asyncio
+from collections import deque, namedtuple
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+if os.path.dirname(BASE_DIR) not in sys.path:
+    sys.path.insert(0, os.path.dirname(BASE_DIR))
+
+from src import periodic, storage, wg_collector, wg_config  # noqa: E402
+from src.runtime_state import write_state  # noqa: E402
+from src.migrations import WG_STATS_MIGRATIONS, migrate_database  # noqa: E402
+from src.stats_buckets import (  # noqa: E402
+    day_bucket,
+    hour_bucket,
+    month_bucket,
+)
+
 DB_PATH = os.path.join(BASE_DIR, "databases" , "wireguard_stats.db")
 SETTINGS_PATH = os.path.join(BASE_DIR, "settings.json")
 
-SAVE_TIME = "23:59"  # Время для фиксирования дневного трафика
-START_TIME = "00:00"  # Время для начала записи нового дня
-EVERY_TIME = 30  # Интервал сохранения дневного и общего трафика в секундах
-SYNS_TIME = 5  # Интервал синхронизации клиентов в минутах
+EVERY_TIME = 30  # Интервал сохранения статистики в секундах
+LIVE_SAMPLE_INTERVAL = 5  # Интервал опроса для скоростей по умолчанию, секунд
+RATE_WINDOW = 60  # Образцов скорости в кольцевом буфере пира (пик — по ним)
+RETENTION_INTERVAL = 3600  # Интервал очистки устаревшей статистики в секундах
+RETENTION_BATCH = 5000  # Строк в одной транзакции удаления
+RETENTION_TIMEOUT = 600  # Секунд на одну очистку
+RETENTION_JITTER = 60  # Случайный сдвиг очистки, секунд
+TICK_TIMEOUT = 20  # Секунд на опрос и запись одного тика
+METRICS_INTERVAL = 60  # Интервал публикации счётчиков планировщика в секундах
+METRICS_STATE_NAME = "wg_stats_jobs.json"
+
+PeerSample = namedtuple("PeerSample", ["peer", "client", "interface", "received", "sent"])
+# Снимок тика: время опроса (epoch), имена интерфейсов и кортеж PeerSample;
+# задачи тика его не меняют
+Snapshot = namedtuple("Snapshot", ["taken_at", "interfaces", "peers"])
+
+# (peer, interface) -> (received, sent) последнего снимка; None — ещё не загружены из БД
+_last_counters = None
+_last_saved = None  # Время снимка последнего сохранения в БД
 
 
 def get_stats_retention_days(default_days=365):
@@ -29,6 +56,22 @@ def get_stats_retention_days(default_days=365):
         return default_days
 
 
+def get_sample_interval(default=LIVE_SAMPLE_INTERVAL):
+    """Интервал опроса WireGuard из settings.json (wg_live_sample_interval, 1–30 с).
+
+    0 выключает быстрый опрос: снимок раз в EVERY_TIME. Читается при запуске.
+    """
+    try:
+        with open(SETTINGS_PATH, "r", encoding="utf-8") as settings_file:
+            settings_data = json.load(settings_file)
+        seconds = int(settings_data.get("wg_live_sample_interval", default))
+    except (FileNotFoundError, json.JSONDecodeError, ValueError, TypeError):
+        seconds = default
+    if seconds <= 0:
+        return EVERY_TIME
+    return min(seconds, EVERY_TIME)
+
+
 def get_retention_windows(total_days):
     hourly_days = max(1, round(total_days * 30 / 365))
     daily_days = max(hourly_days, round(total_days * 90 / 365))
@@ -38,597 +81,337 @@ def get_retention_windows(total_days):
 
 def init_db():
     """Инициализация базы данных"""
-    with sqlite3.connect(DB_PATH) as conn:
-        cursor = conn.cursor()
-
-        cursor.execute(
-            """
-            CREATE TABLE IF NOT EXISTS wg_daily_stats (
-                date TEXT NOT NULL,
-                peer TEXT NOT NULL,
-                client TEXT NOT NULL,
-                received INTEGER NOT NULL,
-                sent INTEGER NOT NULL,
-                interface TEXT NOT NULL,
-                PRIMARY KEY (date, peer, interface)
-            )
-        """
-        )
-
-        cursor.execute(
-            """
-            CREATE TABLE IF NOT EXISTS wg_intermediate (
-                peer TEXT NOT NULL,
-                interface TEXT NOT NULL,
-                last_received INTEGER NOT NULL,
-                last_sent INTEGER NOT NULL,
-                date TEXT NOT NULL,
-                PRIMARY KEY (peer, interface)
-            )
-        """
-        )
-
-        cursor.execute(
-            """
-            CREATE TABLE IF NOT EXISTS wg_total_stats (
-                peer TEXT NOT NULL,
-                client TEXT NOT NULL,
-                total_received INTEGER NOT NULL,
-                total_sent INTEGER NOT NULL,
-                interface TEXT NOT NULL,
-                PRIMARY KEY (peer, interface)
-            )
-        """
-        )
-
-        cursor.execute(
-            """
-            CREATE TABLE IF NOT EXISTS wg_hourly_stats (
-                hour TEXT NOT NULL,
-                peer TEXT NOT NULL,
-                client TEXT NOT NULL,
-                received INTEGER NOT NULL,
-                sent INTEGER NOT NULL,
-                interface TEXT NOT NULL,
-                PRIMARY KEY (hour, peer, interface)
-            )
-        """
-        )
-
-        cursor.execute(
-            """
-            CREATE TABLE IF NOT EXISTS wg_monthly_stats (
-                month TEXT NOT NULL,
-                peer TEXT NOT NULL,
-                client TEXT NOT NULL,
-                received INTEGER NOT NULL,
-                sent INTEGER NOT NULL,
-                interface TEXT NOT NULL,
-                PRIMARY KEY (month, peer, interface)
-            )
-        """
-        )
-        conn.commit()
-
-
-init_db()
-
-
-def convert_to_bytes(value):
-    """Преобразует значение в байты."""
-    units = {
-        "B": 1,
-        "KiB": 1024,
-        "MiB": 1024**2,
-        "GiB": 1024**3,
-        "TiB": 1024**4,
-        "KB": 1000,
-        "MB": 1000**2,
-        "GB": 1000**3,
-        "TB": 1000**4,
-    }
-
-    if isinstance(value, (int, float)):
-        return int(value)
-
-    if isinstance(value, str):
-        value = value.strip()
-
-        if not value or value in ("0 B", "0B"):
-            return 0
-
-        parts = value.split()
-        if len(parts) == 1:
-            if parts[0].isdigit():
-                return int(parts[0])
-            else:
-                return 0
-        elif len(parts) == 2:
-            num, unit = parts
-            if unit in units:
-                return int(float(num) * units[unit])
-            else:
-                return 0
-        else:
-            return 0
-    return 0
-
-
-def read_wg_config(file_path):
-    """Считывает клиентские данные из конфигурационного файла WireGuard."""
-    client_mapping = {}
-
-    try:
-        with open(file_path, "r", encoding="utf-8") as file:
-            current_client_name = None
-
-            for line in file:
-                line = line.strip()
-
-                # Если строка начинается с # Client =, то сохраняем имя клиента
-                if line.startswith("# Client ="):
-                    current_client_name = line.split("=", 1)[1].strip()
-
-                # Если строка начинается с [Peer], сбрасываем имя клиента
-                elif line.startswith("[Peer]"):
-                    # Проверяем, есть ли имя клиента, если нет, то оставляем 'N/A'
-                    current_client_name = current_client_name or "N/A"
-
-                # Если строка начинается с PublicKey =, сохраняем публичный ключ с именем клиента
-                elif line.startswith("PublicKey =") and current_client_name:
-                    public_key = line.split("=", 1)[1].strip()
-                    client_mapping[public_key] = current_client_name
-
-    except FileNotFoundError:
-        print(f"Конфигурационный файл {file_path} не найден.")
-    return client_mapping
-
-
-def get_wireguard_stats():
-    """Получение данных из wg show"""
-    try:
-        result = subprocess.run(
-            ["/usr/bin/wg", "show"], capture_output=True, text=True, check=True
-        )
-        return result.stdout
-    except subprocess.CalledProcessError as e:
-        print(f"Команда wg show завершилась с ошибкой: {e.stderr}")
-        return f"Ошибка выполнения команды: {e.stderr}"
-    except FileNotFoundError:
-        print(
-            "Команда wg не найдена. Убедитесь, что WireGuard установлен и доступен в системе."
-        )
-        return "Команда wg не найдена."
-
-
-def get_wg_intermediate(data="all"):
-    """Получение данных с таблицы wg_intermediate"""
-    with sqlite3.connect(DB_PATH) as conn:
-        cursor = conn.cursor()
+    migrate_database(DB_PATH, WG_STATS_MIGRATIONS)
 
-        if data == "all":
-            cursor.execute("""SELECT * from wg_intermediate""")
-            intermediate = cursor.fetchall()
-            return intermediate
 
-        if data == "date":
-            cursor.execute("""SELECT date from wg_intermediate""")
-            return [row[0] for row in cursor.fetchall()][0]
-
-        conn.commit()
+def get_connection():
+    """Подключение потока к wireguard_stats.db (WAL, переиспользуется),
+    при первом вызове применяет миграции."""
+    init_db()
+    return storage.get_connection(DB_PATH)
 
 
 def get_wg_daily_stats():
-    """Получение данных с таблицы wg_daily_stats"""
-    with sqlite3.connect(DB_PATH) as conn:
+    """Получение данных с таблицы wg_daily"""
+    with get_connection() as conn:
         cursor = conn.cursor()
-        cursor.execute("SELECT * FROM wg_daily_stats")
+        cursor.execute(
+            """SELECT d.bucket, p.public_key, p.client, d.received, d.sent, p.interface
+            FROM wg_daily AS d JOIN wg_peers AS p ON p.id = d.peer_id"""
+        )
         return cursor.fetchall()
 
 
 def get_wg_total_stats():
     """Получение данных с таблицы wg_total_stats"""
-    with sqlite3.connect(DB_PATH) as conn:
+    with get_connection() as conn:
         cursor = conn.cursor()
         cursor.execute("""SELECT * from wg_total_stats""")
         conn.commit()
         return cursor.fetchall()
 
 
-def clear_wg_total_stats():
-    """Очистка таблицы wg_total_stats от лишних записей"""
-    try:
-        output = get_wireguard_stats()
-        stats = parse_wireguard_stats(output)
-
-        with sqlite3.connect(DB_PATH) as conn:
-            cursor = conn.cursor()
-            current_peers = {(data["peer"], data["interface"]) for data in stats}
+def take_snapshot():
+    """Один опрос WireGuard за тик (имена клиентов из wg_config): Snapshot для всех задач тика."""
+    interfaces, peers = wg_collector.collect()
+    return build_snapshot(interfaces, peers)
 
-            cursor.execute("SELECT peer, interface FROM wg_total_stats")
-            db_peers = set(cursor.fetchall())
-
-            peers_to_remove = db_peers - current_peers
-            for peer, interface in peers_to_remove:
-                cursor.execute(
-                    "DELETE FROM wg_total_stats WHERE peer = ? AND interface = ?",
-                    (peer, interface),
-                )
-                conn.commit()
-                return True  # Успешное выполнение
 
-    except sqlite3.Error as e:
-        print(f"Ошибка SQLite при очистке таблицы: {e}")
-        return False
+async def take_snapshot_async():
+    """take_snapshot для event loop демона: `wg` не блокирует остальные задачи."""
+    interfaces, peers = await wg_collector.collect_async()
+    return build_snapshot(interfaces, peers)
 
 
-def parse_wireguard_stats(output):
-    """Парсинг вывода wg show, извлекаем только peer, client, received, sent, interface."""
-    stats = []
-    lines = output.strip().splitlines()
-    interface_name = None  # Текущий интерфейс
-    vpn_mapping = read_wg_config("/etc/wireguard/vpn.conf")
-    antizapret_mapping = read_wg_config("/etc/wireguard/antizapret.conf")
-    client_mapping = {**vpn_mapping, **antizapret_mapping}
-
-    for line in lines:
-        line = line.strip()
-        if line.startswith("interface:"):
-            interface_name = line.split(": ")[1]  # Запоминаем интерфейс
-        elif line.startswith("peer:"):
-            peer = line.split(": ")[1].strip()
-            client_name = client_mapping.get(peer, "Unknown")
-            stats.append(
-                {
-                    "peer": peer,
-                    "client": client_name,
-                    "received": "0 B",  # Заполняем, обновится ниже
-                    "sent": "0 B",
-                    "interface": interface_name if interface_name else "Unknown",
-                }
+def build_snapshot(interfaces, peers):
+    client_mapping = wg_config.client_mapping()
+    return Snapshot(
+        time.time(),
+        frozenset(interface.name for interface in interfaces),
+        tuple(
+            PeerSample(
+                peer.public_key,
+                client_mapping.get(peer.public_key, "Unknown"),
+                peer.interface,
+                peer.received,
+                peer.sent,
             )
-        elif line.startswith("transfer:") and stats:
-            transfer_data = line.split(":")[1].strip().split(", ")
-            stats[-1]["received"] = transfer_data[0].replace(" received", "").strip()
-            stats[-1]["sent"] = transfer_data[1].replace(" sent", "").strip()
-
-    return stats
+            for peer in peers
+        ),
+    )
 
 
-def save_wg_stats():
-    """Функция сохранения статистики"""
-    output = get_wireguard_stats()
-    stats = parse_wireguard_stats(output)
-
-    now = datetime.now().strftime("%H:%M:%S")
-    # print(f"Сохранение статистики: {now}")
-    clean_old_daily_stats(days=get_stats_retention_days(default_days=365))
+def load_last_counters(conn):
+    """Счётчики последнего снимка из wg_total_stats: (peer, interface) -> (received, sent)."""
+    return {
+        (peer, interface): (received, sent)
+        for peer, interface, received, sent in conn.execute(
+            "SELECT peer, interface, total_received, total_sent FROM wg_total_stats"
+        )
+    }
 
-    # if not stats:
-    #     print("❌ Нет данных для сохранения! Проверяем wg show...")
-    #     print(output)  # Посмотри, что возвращает wg
 
-    with sqlite3.connect(DB_PATH) as conn:
-        cursor = conn.cursor()
-        now = datetime.now()
-
-        for data in stats:
-            peer = data["peer"]
-            date = datetime.now().strftime("%Y-%m-%d")
-            client = data["client"]
-            received_now = convert_to_bytes(data["received"])
-            sent_now = convert_to_bytes(data["sent"])
-            interface = data["interface"]
-
-            if now.hour == 0 and now.minute == 0 and now.second == 1:
-                cursor.execute(
-                    """INSERT OR REPLACE INTO wg_intermediate 
-                    (peer, interface, last_received, last_sent, date) 
-                    VALUES (?, ?, ?, ?, ?)""",
-                    (peer, interface, received_now, sent_now, date),
-                )
-                conn.commit()
-            cursor.execute(
+def counter_deltas(samples, last_counters):
+    """Приращения счётчиков с прошлого снимка: [(sample, received, sent)].
+
+    Счётчик меньше прошлого — интерфейс или пир пересоздан, учитывается
+    весь текущий счётчик. Пир без прошлого значения (первый запуск, новый
+    пир) только задаёт точку отсчёта: его счётчик мог накопиться до
+    наблюдения и трафиком этого интервала не считается.
+    """
+    deltas = []
+    for sample in samples:
+        last = last_counters.get((sample.peer, sample.interface))
+        if last is None:
+            continue
+        if sample.received >= last[0] and sample.sent >= last[1]:
+            received, sent = sample.received - last[0], sample.sent - last[1]
+        else:
+            print(f"Обнаружен сброс счетчиков для {sample.peer} на {sample.interface}.")
+            received, sent = sample.received, sample.sent
+        if received or sent:
+            deltas.append((sample, received, sent))
+    return deltas
+
+
+def save_wg_stats(snapshot):
+    """Добавляет приращения снимка в часовые, дневные и месячные корзины.
+
+    Последние счётчики хранятся в памяти и в wg_total_stats: после перезапуска
+    (в том числе через полночь) трафик за простой попадает в текущий час.
+    Пустой снимок (ошибка опроса `wg`/netlink) не сохраняется, а точка
+    отсчёта пира удаляется, только когда пропал весь его интерфейс:
+    иначе следующий тик записал бы счётчики целиком как новый трафик.
+    """
+    global _last_counters
+    if not snapshot.peers:
+        return False
+    with get_connection() as conn:
+        try:
+            if _last_counters is None:
+                _last_counters = load_last_counters(conn)
+            deltas = counter_deltas(snapshot.peers, _last_counters)
+
+            current = {(sample.peer, sample.interface): sample for sample in snapshot.peers}
+            gone = [key for key in _last_counters if key[1] not in snapshot.interfaces]
+            conn.executemany(
+                "DELETE FROM wg_total_stats WHERE peer = ? AND interface = ?", gone
+            )
+            conn.executemany(
                 """INSERT OR REPLACE INTO wg_total_stats 
                 (peer, client, total_received, total_sent, interface)
-                VALUES (?, ?, ?, ?, ?)
-            """,
-                (peer, client, received_now, sent_now, interface),
+                VALUES (?, ?, ?, ?, ?)""",
+                [
+                    (sample.peer, sample.client, sample.received, sample.sent, sample.interface)
+                    for sample in snapshot.peers
+                    if _last_counters.get((sample.peer, sample.interface))
+                    != (sample.received, sample.sent)
+                ],
             )
-            conn.commit()
-
-
-def save_daily_stats(dailysave=False):
-    """Функция сохранения статистики за день"""
-    output = get_wireguard_stats()
-    stats = parse_wireguard_stats(output)
-    date = datetime.now().strftime("%Y-%m-%d")
-    now = datetime.now().strftime("%H:%M:%S")
-
-    with sqlite3.connect(DB_PATH) as conn:
-        cursor = conn.cursor()
 
-        if dailysave:
-            # Фиксирование дневной статистики в wg_intermediate
-            print(f"Фиксирование дневной статистики: {now}")
-            for data in stats:
-                try:
-                    cursor.execute(
-                        """INSERT OR REPLACE INTO wg_intermediate
-                        (peer, interface, last_received, last_sent, date) 
-                        VALUES (?, ?, ?, ?, ?)""",
-                        (
-                            data["peer"],
-                            data["interface"],
-                            convert_to_bytes(data["received"]),
-                            convert_to_bytes(data["sent"]),
-                            date,
-                        ),
+            if deltas:
+                conn.executemany(
+                    """INSERT INTO wg_peers (public_key, interface, client) VALUES (?, ?, ?)
+                    ON CONFLICT(public_key, interface) DO UPDATE SET client = excluded.client
+                    WHERE client != excluded.client""",
+                    [(sample.peer, sample.interface, sample.client) for sample, _, _ in deltas],
+                )
+                for table, bucket in (
+                    ("wg_hourly", hour_bucket(snapshot.taken_at)),
+                    ("wg_daily", day_bucket(snapshot.taken_at)),
+                    ("wg_monthly", month_bucket(snapshot.taken_at)),
+                ):
+                    conn.executemany(
+                        f"""INSERT INTO {table} (bucket, peer_id, received, sent)
+                        SELECT ?, id, ?, ? FROM wg_peers WHERE public_key = ? AND interface = ?
+                        ON CONFLICT(bucket, peer_id) DO UPDATE SET
+                            received = received + excluded.received,
+                            sent = sent + excluded.sent""",
+                        [
+                            (bucket, received, sent, sample.peer, sample.interface)
+                            for sample, received, sent in deltas
+                        ],
                     )
-                except sqlite3.Error as e:
-                    print(f"Ошибка при сохранении {data['peer']}: {e}")
-
             conn.commit()
-            return True
-
-        else:
-            # Ежедневное сохранение статистики в wg_daily_stats
-            try:
-                # Получаем текущие данные
-                current_stats = get_wg_total_stats()
-                intermediate_stats = get_wg_intermediate()
-
-                # Создаем словарь для быстрого поиска
-                intermediate_dict = {
-                    (row[0], row[1]): row for row in intermediate_stats
-                }
-
-                for stats_row in current_stats:
-                    peer, client = stats_row[0], stats_row[1]
-                    interface = stats_row[4]
-                    key = (peer, interface)
-
-                    if key in intermediate_dict:
-                        inter_row = intermediate_dict[key]
-                        # # Вычисляем разницу
-                        # received_diff = int(stats_row[2]) - int(inter_row[2])
-                        # sent_diff = int(stats_row[3]) - int(inter_row[3])
-
-                        # Вычисляем разницу с защитой от отрицательных значений
-                        # received_diff = max(0, int(stats_row[2]) - int(inter_row[2]))
-                        # sent_diff = max(0, int(stats_row[3]) - int(inter_row[3]))
-
-                        current_received = int(stats_row[2])
-                        current_sent = int(stats_row[3])
-                        last_received = int(inter_row[2])
-                        last_sent = int(inter_row[3])
-
-                        if (
-                            current_received >= last_received
-                            and current_sent >= last_sent
-                        ):
-                            # Обычная разница
-                            received_diff = current_received - last_received
-                            sent_diff = current_sent - last_sent
-                        else:
-                            # Сброс интерфейса - сохраняем всё что есть
-                            print(
-                                f"Обнаружен сброс счетчиков для {peer} на {interface}."
-                            )
-                            received_diff = current_received
-                            sent_diff = current_sent
-
-                        # Проверяем существование записи
-                        cursor.execute(
-                            """SELECT 1 FROM wg_daily_stats 
-                            WHERE date = ? AND peer = ? AND interface = ?""",
-                            (date, peer, interface),
-                        )
-                        exists = cursor.fetchone()
-
-                        if exists:
-                            cursor.execute(
-                                """UPDATE wg_daily_stats 
-                                SET received = ?, sent = ?, client = ?
-                                WHERE date = ? AND peer = ? AND interface = ?""",
-                                (
-                                    convert_to_bytes(received_diff),
-                                    convert_to_bytes(sent_diff),
-                                    client,
-                                    date,
-                                    peer,
-                                    interface,
-                                ),
-                            )
-                        else:
-                            cursor.execute(
-                                """INSERT INTO wg_daily_stats 
-                                (date, peer, client, received, sent, interface) 
-                                VALUES (?, ?, ?, ?, ?, ?)""",
-                                (
-                                    date,
-                                    peer,
-                                    client,
-                                    convert_to_bytes(received_diff),
-                                    convert_to_bytes(sent_diff),
-                                    interface,
-                                ),
-                            )
-
-                        hour = datetime.now().strftime("%Y-%m-%d %H:00")
-                        daily_rx = convert_to_bytes(received_diff)
-                        daily_tx = convert_to_bytes(sent_diff)
-                        cursor.execute(
-                            """SELECT COALESCE(SUM(received), 0), COALESCE(SUM(sent), 0)
-                            FROM wg_hourly_stats
-                            WHERE peer = ? AND interface = ?
-                              AND substr(hour, 1, 10) = ? AND hour != ?""",
-                            (peer, interface, date, hour),
-                        )
-                        prev_rx, prev_tx = cursor.fetchone()
-                        cursor.execute(
-                            """INSERT OR REPLACE INTO wg_hourly_stats
-                            (hour, peer, client, received, sent, interface)
-                            VALUES (?, ?, ?, ?, ?, ?)""",
-                            (
-                                hour,
-                                peer,
-                                client,
-                                max(0, daily_rx - prev_rx),
-                                max(0, daily_tx - prev_tx),
-                                interface,
-                            ),
-                        )
-
-                conn.commit()
-                return True
-
-            except Exception as e:
-                print(f"Ошибка при ежедневном сохранении: {e}")
-                conn.rollback()
-                return False
-
-
-def sync_new_peers():
-    """Добавляет новые peer+interface из wg_total_stats в wg_intermediate"""
-    # Очистка wg_total_stats от лишних записей
-    if clear_wg_total_stats():
-
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        try:
-            # Получаем текущую дату
-            date = datetime.now().strftime("%Y-%m-%d")
-
-            # Находим новые комбинации peer+interface, которых нет в wg_intermediate
-            cursor.execute(
-                """
-                SELECT t.peer, t.interface 
-                FROM wg_total_stats t
-                LEFT JOIN wg_intermediate i 
-                ON t.peer = i.peer AND t.interface = i.interface
-                WHERE i.peer IS NULL
-                GROUP BY t.peer, t.interface
-            """
-            )
+        except sqlite3.Error as e:
+            print(f"Ошибка при сохранении статистики: {e}")
+            conn.rollback()
+            return False
+
+    counters = {key: value for key, value in _last_counters.items() if key[1] in snapshot.interfaces}
+    counters.update((key, (sample.received, sample.sent)) for key, sample in current.items())
+    _last_counters = counters
+    return True
+
+
+class RateBuffer:
+    """Скорости пиров по последним RATE_WINDOW образцам счётчиков, только в памяти.
+
+    На каждый пир — последние счётчики и кольцевые буферы скоростей приёма и
+    передачи между соседними снимками; пик — максимум по буферу.
+    """
+
+    def __init__(self, size=RATE_WINDOW):
+        self.size = size
+        # (peer, interface) -> [время, received, sent, deque скоростей приёма, deque передачи]
+        self.peers = {}
+
+    def add(self, snapshot):
+        now = snapshot.taken_at
+        current = set()
+        for sample in snapshot.peers:
+            key = (sample.peer, sample.interface)
+            current.add(key)
+            state = self.peers.get(key)
+            if state is None:
+                self.peers[key] = [
+                    now, sample.received, sample.sent,
+                    deque(maxlen=self.size), deque(maxlen=self.size),
+                ]
+                continue
+            elapsed = now - state[0]
+            if elapsed <= 0:
+                continue
+            # Сброс счётчиков: интервал со сбросом пропускается
+            if sample.received >= state[1] and sample.sent >= state[2]:
+                state[3].append((sample.received - state[1]) / elapsed)
+                state[4].append((sample.sent - state[2]) / elapsed)
+            state[0], state[1], state[2] = now, sample.received, sample.sent
+        for key in self.peers.keys() - current:
+            del self.peers[key]
+
+    def rates(self):
+        """{интерфейс: {ключ: [приём, передача, пик приёма, пик передачи]}} в байт/с."""
+        result = {}
+        for (peer, interface), state in self.peers.items():
+            received_rates, sent_rates = state[3], state[4]
+            if received_rates:
+                rates = [
+                    round(received_rates[-1]), round(sent_rates[-1]),
+                    round(max(received_rates)), round(max(sent_rates)),
+                ]
+            else:
+                rates = [0, 0, 0, 0]
+            result.setdefault(interface, {})[peer] = rates
+        return result
 
-            new_combinations = cursor.fetchall()
-
-            # Добавляем новые записи
-            for peer, interface in new_combinations:
-                cursor.execute(
-                    """
-                    INSERT INTO wg_intermediate 
-                    (peer, interface, last_received, last_sent, date) 
-                    VALUES (?, ?, 0, 0, ?)
-                """,
-                    (peer, interface, date),
-                )
 
-            conn.commit()
+live_rates = RateBuffer()
 
-        except sqlite3.Error as e:
-            print(f"Ошибка при синхронизации новых клиентов wg_intermediate: {e}")
-            conn.rollback()
 
-        finally:
-            conn.close()
+def publish_rates(snapshot):
+    """Скорости для веб-интерфейса и бота через runtime_state (wg_collector.read_live_rates)."""
+    live_rates.add(snapshot)
+    write_state(
+        wg_collector.RATES_STATE_NAME,
+        {"updated": snapshot.taken_at, "interval": SAMPLE_INTERVAL, "peers": live_rates.rates()},
+    )
 
 
-# Запуск таймеров
+def save_due(snapshot):
+    """Пора ли записать снимок в БД: раз в EVERY_TIME."""
+    global _last_saved
+    if _last_saved is None or snapshot.taken_at - _last_saved >= EVERY_TIME:
+        _last_saved = snapshot.taken_at
+        return True
+    return False
 
-# Обновление статистики за день
-timer_1 = schedule.every(EVERY_TIME).seconds.do(save_daily_stats)
-# Обновление общей статистики
-timer_2 = schedule.every(EVERY_TIME).seconds.do(save_wg_stats)
-# Обновление новых клиентов в wg_intermediate
-timer_3 = schedule.every(SYNS_TIME).minutes.do(sync_new_peers)
 
+def tick():
+    """Тик сборщика: один снимок для скоростей и, раз в EVERY_TIME, для статистики в БД"""
+    snapshot = take_snapshot()
+    publish_rates(snapshot)
+    if save_due(snapshot):
+        save_wg_stats(snapshot)
+    return snapshot
 
-def start_timers():
-    """Запуск таймеров"""
-    global timer_1, timer_2, timer_3
-    timer_1 = schedule.every(EVERY_TIME).seconds.do(save_daily_stats)
-    timer_2 = schedule.every(EVERY_TIME).seconds.do(save_wg_stats)
-    timer_3 = schedule.every(SYNS_TIME).minutes.do(sync_new_peers)
 
+async def tick_async():
+    """tick для демона: опрос в event loop, запись в БД — в потоке планировщика."""
+    snapshot = await take_snapshot_async()
+    publish_rates(snapshot)
+    if save_due(snapshot):
+        await _scheduler.run_blocking(save_wg_stats, snapshot)
 
-def stop_timers():
-    """Остановка таймеров на время фиксирования ежедневной статистики"""
-    schedule.cancel_job(timer_1)
-    schedule.cancel_job(timer_2)
-    schedule.cancel_job(timer_3)
-    time.sleep(2)
-    save_daily_stats(True)
 
+def delete_before(conn, table, cutoff, batch=RETENTION_BATCH):
+    """Удаляет строки table с bucket < cutoff пачками по batch; возвращает число строк.
 
-timer_stop = schedule.every().day.at(SAVE_TIME).do(stop_timers)
-timer_start = schedule.every().day.at(START_TIME).do(start_timers)
+    Каждая пачка — отдельная транзакция, блокировка записи не держится долго.
+    """
+    deleted = 0
+    while True:
+        cursor = conn.execute(
+            f"""DELETE FROM {table} WHERE (bucket, peer_id) IN (
+                SELECT bucket, peer_id FROM {table} WHERE bucket < ? ORDER BY bucket LIMIT ?
+            )""",
+            (cutoff, batch),
+        )
+        conn.commit()
+        deleted += cursor.rowcount
+        if cursor.rowcount < batch:
+            return deleted
 
 
 def clean_old_daily_stats(days=365):
-    """Агрегация и удаление старых записей из всех таблиц статистики WG."""
+    """Удаление старых записей из всех таблиц статистики WG; возвращает {таблица: строк}."""
     hourly_days, daily_days, monthly_days = get_retention_windows(days)
-
-    with sqlite3.connect(DB_PATH) as conn:
-        cursor = conn.cursor()
+    now_ts = time.time()
+    cutoffs = (
+        ("wg_hourly", day_bucket(now_ts - hourly_days * 86400)),
+        ("wg_daily", day_bucket(now_ts - daily_days * 86400)),
+        ("wg_monthly", month_bucket(now_ts - monthly_days * 86400)),
+    )
+
+    deleted = {}
+    with get_connection() as conn:
         try:
-            cursor.execute(
-                """
-                INSERT INTO wg_monthly_stats (month, peer, client, received, sent, interface)
-                SELECT substr(date, 1, 7), peer, MAX(client),
-                       SUM(received), SUM(sent), interface
-                FROM wg_daily_stats
-                GROUP BY peer, interface, substr(date, 1, 7)
-                ON CONFLICT(month, peer, interface) DO UPDATE SET
-                    received = excluded.received,
-                    sent = excluded.sent,
-                    client = excluded.client
-                """
-            )
+            for table, cutoff in cutoffs:
+                deleted[table] = delete_before(conn, table, cutoff)
+        except sqlite3.Error as e:
+            print(f"Ошибка при очистке: {e}")
+            conn.rollback()
+    return deleted
 
-            thirty_days_ago = (datetime.now() - timedelta(days=hourly_days)).strftime("%Y-%m-%d")
-            cursor.execute(
-                "DELETE FROM wg_hourly_stats WHERE hour < ?", (thirty_days_ago,)
-            )
 
-            ninety_days_ago = (datetime.now() - timedelta(days=daily_days)).strftime("%Y-%m-%d")
-            cursor.execute(
-                "DELETE FROM wg_daily_stats WHERE date < ?", (ninety_days_ago,)
-            )
+def retention_job():
+    """Очистка по сроку хранения из настроек с отчётом о затронутых строках."""
+    started = time.monotonic()
+    deleted = clean_old_daily_stats(days=get_stats_retention_days(default_days=365))
+    print(
+        "Очистка статистики WireGuard: "
+        + ", ".join(f"{table} {count}" for table, count in deleted.items())
+        + f" строк за {time.monotonic() - started:.2f} с"
+    )
+    return deleted
 
-            one_year_ago = (datetime.now() - timedelta(days=monthly_days)).strftime("%Y-%m")
-            cursor.execute(
-                "DELETE FROM wg_monthly_stats WHERE month < ?", (one_year_ago,)
-            )
 
-            conn.commit()
-        except sqlite3.Error as e:
-            print(f"Ошибка при очистке/агрегации: {e}")
-            conn.rollback()
+SAMPLE_INTERVAL = get_sample_interval()
+_scheduler = None
 
 
-def main():
-    """Основная функция"""
+def publish_metrics():
+    """Счётчики планировщика (пропущенные тики, длительности задач) через runtime_state."""
+    write_state(METRICS_STATE_NAME, {"updated": time.time(), "jobs": _scheduler.metrics()})
 
-    print("Сохранение статистики Wireguard запущено!")
 
-    try:
-        inter_date = get_wg_intermediate("date")
-    except IndexError:
-        inter_date = datetime.now().strftime("%Y-%m-%d")
-        save_daily_stats(True)
-        time.sleep(3)
-
-    today_date = datetime.now().strftime("%Y-%m-%d")
-    if inter_date != today_date:
-        save_daily_stats(True)
-        clean_old_daily_stats(days=get_stats_retention_days(default_days=365))
-        time.sleep(3)
+def create_scheduler():
+    """Задачи демона: опрос, очистка и публикация счётчиков; SQLite — в одном потоке планировщика."""
+    global _scheduler
+    _scheduler = periodic.Scheduler(thread_name="wg-stats-db")
+    _scheduler.add("tick", tick_async, SAMPLE_INTERVAL, timeout=TICK_TIMEOUT)
+    _scheduler.add(
+        "retention", retention_job, RETENTION_INTERVAL,
+        timeout=RETENTION_TIMEOUT, jitter=RETENTION_JITTER,
+    )
+    _scheduler.add("metrics", publish_metrics, METRICS_INTERVAL, run_at_start=False)
+    return _scheduler
 
-    while True:
-        schedule.run_pending()
-        time.sleep(1)
+
+def main():
+    """Основная функция"""
+    print("Сохранение статистики Wireguard запущено!")
+    asyncio.run(create_scheduler().run())
 
 
 if __name__ == "__main__":
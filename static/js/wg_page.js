@@ -637,8 +637,18 @@ async function updateStats() {
                     <td>${peer.latest_handshake || "N/A"}</td>
                     <td>${peer.daily_received || "0.0"}</td>
                     <td>${peer.daily_sent || "0.0"}</td>
-                    <td>${peer.received || "0.0"}</td>
-                    <td>${peer.sent || "0.0"}</td>
+                    <td>
+                        ${peer.received || "0.0"}
+                        ${peer.received_speed && peer.received_speed !== "-"
+                            ? `<span class="ovpn-speed" title="Пик: ${peer.peak_received_speed}">↓ ${peer.received_speed}</span>`
+                            : ""}
+                    </td>
+                    <td>
+                        ${peer.sent || "0.0"}
+                        ${peer.sent_speed && peer.sent_speed !== "-"
+                            ? `<span class="ovpn-speed" title="Пик: ${peer.peak_sent_speed}">↑ ${peer.sent_speed}</span>`
+                            : ""}
+                    </td>
                     ${isWarp ? '<td class="text-center actions-cell"></td>' : buildWgActionsCell(peer, iface.interface, isEnabled)}
                 `;
 